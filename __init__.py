@@ -31,6 +31,7 @@ from .nodes import (
     ShotByTextManualPlacementNode,
     ShotByTextManualPaddingNode,
     ShotByTextCustomCoordinatesNode,
+    ShotMultiPlacementNode,
     AttributionByImageNode,
     RemoveVideoBackgroundNode,
     GreenScreenVideoNode,
@@ -45,8 +46,13 @@ from .nodes import (
     FIBOEditNode,
     FIBOEditStructuredInstructionNode,
     BriaMultiImageSelect,
-    ProductIntegrateNode
+    ProductIntegrateNode,
+    BriaCollectNode,
+    submit_node,
 )
+from .nodes.utils.telemetry import register_metrics_route
+
+register_metrics_route()
 
 # Map the node class to a name used internally by ComfyUI
 NODE_CLASS_MAPPINGS = {
@@ -69,6 +75,7 @@ NODE_CLASS_MAPPINGS = {
     "ShotByImageCustomCoordinates": ShotByImageCustomCoordinatesNode,
     "ShotByImageManualPadding": ShotByImageManualPaddingNode,
     "ShotByImageAutomaticAspectRatio": ShotByImageAutomaticAspectRatioNode,
+    "ShotMultiPlacement": ShotMultiPlacementNode,
     "BriaTailoredGen": TailoredGenNode,
     "TailoredModelInfoNode": TailoredModelInfoNode,
     "TailoredPortraitNode": TailoredPortraitNode,
@@ -96,7 +103,8 @@ NODE_CLASS_MAPPINGS = {
     "FIBOEditNode": FIBOEditNode,
     "FIBOEditStructuredInstructionNode": FIBOEditStructuredInstructionNode,
     "BriaMultiImageSelect":BriaMultiImageSelect,
-    "ProductIntegrateNode": ProductIntegrateNode
+    "ProductIntegrateNode": ProductIntegrateNode,
+    "BriaCollectNode": BriaCollectNode,
 
 }
 # Map the node display name to the one shown in the ComfyUI node interface
@@ -120,6 +128,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "ShotByImageCustomCoordinates": "Shot by Image - Custom Coordinates",
     "ShotByImageManualPadding": "Shot by Image - Manual Padding",
     "ShotByImageAutomaticAspectRatio": "Shot by Image - Automatic Aspect Ratio",
+    "ShotMultiPlacement": "Shot - Multi Placement",
     "BriaTailoredGen": "Bria Tailored Gen",
     "TailoredModelInfoNode": "Bria Tailored Model Info",
     "TailoredPortraitNode": "Bria Restyle Portrait",
@@ -147,8 +156,15 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "FIBOEditNode": "FIBO - Edit",
     "FIBOEditStructuredInstructionNode": "FIBO - Edit - Structured Instruction",
     "BriaMultiImageSelect":"Bria Multi Image Select",
-    "ProductIntegrateNode": "Bria Product Integrate"
+    "ProductIntegrateNode": "Bria Product Integrate",
+    "BriaCollectNode": "Bria Collect",
 
 }
 
+# Every API node also gets a "Submit" twin that returns a BRIA_JOB handle without waiting.
+_LOCAL_NODES = ("LoadVideoFramesNode", "PreviewVideoURLNode", "BriaMultiImageSelect", "BriaCollectNode")
+for _name in [name for name in NODE_CLASS_MAPPINGS if name not in _LOCAL_NODES]:
+    NODE_CLASS_MAPPINGS[f"{_name}Submit"] = submit_node(NODE_CLASS_MAPPINGS[_name])
+    NODE_DISPLAY_NAME_MAPPINGS[f"{_name}Submit"] = f"{NODE_DISPLAY_NAME_MAPPINGS[_name]} (Submit)"
+
 WEB_DIRECTORY = "./web"
@@ -0,0 +1,94 @@
+"""
+Measures how long importing the node package takes and fails when it exceeds a budget.
+
+Every ComfyUI start imports all custom nodes, so their import time adds to each cold start.
+Each measurement runs in a fresh interpreter. ComfyUI has already imported torch, numpy, PIL and
+aiohttp by the time it loads custom nodes, so those are imported before the clock starts
+(``--cold`` includes them). The slowest modules imported on behalf of the package are listed, to
+show what to defer when the budget is exceeded.
+
+Example:
+    python benchmarks/import_time.py --comfyui ~/ComfyUI --budget-ms 300
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST_MODULES = ("torch", "numpy", "PIL.Image", "aiohttp")
+
+_MEASURE = """
+import importlib.util, os, sys, time
+for name in {preload!r}:
+    __import__(name)
+import folder_paths
+sys.stderr.write("IMPORT_START\\n")
+sys.stderr.flush()
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location(
+    "comfyui_bria_api", os.path.join({root!r}, "__init__.py"), submodule_search_locations=[{root!r}]
+)
+package = importlib.util.module_from_spec(spec)
+sys.modules["comfyui_bria_api"] = package
+spec.loader.exec_module(package)
+print("IMPORT_SECONDS", time.perf_counter() - started, len(package.NODE_CLASS_MAPPINGS))
+"""
+
+
+def measure(comfyui_path, cold, importtime=False):
+    """Import the package once in a new interpreter; returns ``(seconds, node_count, stderr)``."""
+    env = dict(os.environ)
+    if comfyui_path:
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [comfyui_path, env.get("PYTHONPATH")]))
+    code = _MEASURE.format(preload=() if cold else HOST_MODULES, root=REPO_ROOT)
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("IMPORT_SECONDS"):
+            _, seconds, nodes = line.split()
+            return float(seconds), int(nodes), completed.stderr
+    sys.exit(f"Importing the package failed:\n{completed.stderr[-4000:]}")
+
+
+def slowest_modules(importtime_log, count):
+    """The ``count`` modules with the largest self time in a ``-X importtime`` log, after the clock started."""
+    _, _, log = importtime_log.partition("IMPORT_START\n")
+    entries = []
+    for line in log.splitlines():
+        if line.startswith("import time:"):
+            self_us, _, name = line[len("import time:"):].split("|")
+            entries.append((int(self_us), name.strip()))
+    return sorted(entries, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the Bria node package")
+    parser.add_argument("--comfyui", help="Path to a ComfyUI checkout (defaults to $COMFYUI_PATH)")
+    parser.add_argument("--budget-ms", type=float, default=300.0, help="Maximum median import time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cold", action="store_true", help="Also count torch, numpy, PIL and aiohttp")
+    args = parser.parse_args()
+    comfyui_path = args.comfyui or os.environ.get("COMFYUI_PATH")
+
+    samples = []
+    for _ in range(max(1, args.repeat)):
+        seconds, nodes, _ = measure(comfyui_path, args.cold)
+        samples.append(seconds)
+    median_ms = statistics.median(samples) * 1000
+    print(
+        f"Imported {nodes} nodes in {median_ms:.0f} ms (median of {len(samples)}, "
+        f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms); budget {args.budget_ms:.0f} ms"
+    )
+
+    if median_ms > args.budget_ms:
+        _, _, log = measure(comfyui_path, args.cold, importtime=True)
+        print("Slowest modules imported with the package (self time):")
+        for self_us, name in slowest_modules(log, 15):
+            print(f"  {self_us / 1000:8.1f} ms  {name}")
+        sys.exit(f"Import time {median_ms:.0f} ms is over the budget of {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Local stand-in for the Bria API, used by the benchmarks.
+
+Speaks the same protocols the nodes use:
+
+- v2 async endpoints: ``POST /v2/...`` answers 202 with a ``status_url``; ``GET /v2/status/<id>``
+  reports IN_PROGRESS until the job duration has elapsed, then COMPLETED with result URLs.
+- v1 sync endpoints: ``POST /v1/...`` answers after the job duration with the v1 result layout.
+- presigned uploads: ``POST /upload-image|upload-video/anonymous/presigned-url`` + ``PUT /uploads/...``.
+- results: ``GET /results/<id>.png`` (a generated PNG) and ``GET /results/<id>.mp4``.
+
+``GET /__stats`` returns request and byte counters, ``POST /__reset`` clears them.
+
+Run standalone with ``python benchmarks/mock_bria_server.py --port 8765`` or start it in-process
+with ``start_server(...)``.
+"""
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+
+class MockSettings:
+    def __init__(self, latency=0.02, jitter=0.01, failure_rate=0.0, job_seconds=1.0, result_size=1024, video_mb=4.0):
+        self.latency = latency  # seconds added to every request (network round trip)
+        self.jitter = jitter  # +/- seconds of random variation on latency and job duration
+        self.failure_rate = failure_rate  # share of submits answered with 503
+        self.job_seconds = job_seconds  # time from submit to COMPLETED (v2) or to the response (v1)
+        self.result_size = result_size  # edge of the square result PNG
+        self.video_mb = video_mb  # size of the result video body
+
+
+class MockState:
+    def __init__(self, settings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.jobs = {}  # request_id -> {"done_at", "kind", "seed"}
+        self.reset()
+        noise = (np.random.default_rng(0).random((settings.result_size, settings.result_size, 3)) * 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(noise).save(buffer, format="PNG", compress_level=1)
+        self.result_png = buffer.getvalue()
+        self.result_video = bytes(int(settings.video_mb * 1024 * 1024))
+
+    def reset(self):
+        with self.lock:
+            self.counters = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "failures": 0, "by_route": {}}
+
+    def count(self, route, bytes_in, bytes_out):
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["bytes_in"] += bytes_in
+            self.counters["bytes_out"] += bytes_out
+            self.counters["by_route"][route] = self.counters["by_route"].get(route, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.counters))
+
+    def jittered(self, seconds):
+        return max(0.0, seconds + random.uniform(-self.settings.jitter, self.settings.jitter))
+
+
+def _route_name(path):
+    path = path.split("?", 1)[0]
+    if path.startswith("/v2/status/"):
+        return "v2 status"
+    if path.startswith("/results/"):
+        return "result download"
+    if path.startswith("/uploads/"):
+        return "upload PUT"
+    return re.sub(r"/[0-9a-f-]{32,}.*$", "", path)
+
+
+class MockBriaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_handler
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body, content_type="application/json", bytes_in=0):
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.count(_route_name(self.path), bytes_in, len(body))
+
+    def _latency(self):
+        time.sleep(self.state.jittered(self.state.settings.latency))
+
+    def do_GET(self):
+        if self.path == "/__stats":
+            return self._send(200, self.state.snapshot())
+        self._latency()
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/v2/status/"):
+            return self._status(path.rsplit("/", 1)[-1])
+        if path.startswith("/results/"):
+            if path.endswith(".mp4"):
+                return self._send(200, self.state.result_video, "video/mp4")
+            return self._send(200, self.state.result_png, "image/png")
+        return self._send(404, {"error": f"unknown path {path}"})
+
+    def do_PUT(self):
+        body = self._read_body()
+        self._latency()
+        if self.path.startswith("/uploads/"):
+            return self._send(200, b"", "text/plain", bytes_in=len(body))
+        return self._send(404, {"error": f"unknown path {self.path}"}, bytes_in=len(body))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/__reset":
+            self.state.reset()
+            return self._send(200, {"ok": True})
+        self._latency()
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return self._send(400, {"error": "invalid JSON"}, bytes_in=len(body))
+
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/presigned-url"):
+            return self._presigned(path, payload, len(body))
+        if random.random() < self.state.settings.failure_rate:
+            with self.state.lock:
+                self.state.counters["failures"] += 1
+            return self._send(503, {"error": "simulated failure"}, bytes_in=len(body))
+        if path.startswith("/v2/"):
+            return self._submit_v2(path, payload, len(body))
+        if path.startswith("/v1/"):
+            return self._sync_v1(path, payload, len(body))
+        return self._send(404, {"error": f"unknown path {path}"}, bytes_in=len(body))
+
+    def _presigned(self, path, payload, bytes_in):
+        name = f"{uuid.uuid4().hex}_{payload.get('file_name', 'upload')}"
+        url = f"{self.base_url}/uploads/{name}"
+        key = "video_url" if "upload-video" in path else "image_url"
+        return self._send(200, {key: url, "upload_url": url}, bytes_in=bytes_in)
+
+    def _submit_v2(self, path, payload, bytes_in):
+        request_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.jobs[request_id] = {
+                "done_at": time.monotonic() + self.state.jittered(self.state.settings.job_seconds),
+                "kind": "video" if "/video/" in path else "image",
+                "seed": payload.get("seed", random.randint(0, 2**31)),
+            }
+        return self._send(
+            202,
+            {"request_id": request_id, "status_url": f"{self.base_url}/v2/status/{request_id}"},
+            bytes_in=bytes_in,
+        )
+
+    def _status(self, request_id):
+        with self.state.lock:
+            job = self.state.jobs.get(request_id)
+        if job is None:
+            return self._send(404, {"error": "unknown request_id"})
+        if time.monotonic() < job["done_at"]:
+            return self._send(200, {"request_id": request_id, "status": "IN_PROGRESS"})
+        if job["kind"] == "video":
+            result = {"video_url": f"{self.base_url}/results/{request_id}.mp4"}
+        else:
+            result = {
+                "image_url": f"{self.base_url}/results/{request_id}.png",
+                "seed": job["seed"],
+                "structured_prompt": json.dumps({"short_description": "mock result"}),
+                "structured_instruction": json.dumps({"edit_instruction": "mock"}),
+            }
+        return self._send(200, {"request_id": request_id, "status": "COMPLETED", "result": result})
+
+    def _sync_v1(self, path, payload, bytes_in):
+        time.sleep(self.state.jittered(self.state.settings.job_seconds))
+        seed = payload.get("seed", random.randint(0, 2**31))
+
+        def result_url():
+            return f"{self.base_url}/results/{uuid.uuid4().hex}.png"
+
+        if "lifestyle_shot" in path:
+            count = 7 if payload.get("placement_type") == "automatic" else int(payload.get("num_results", 1))
+            body = {"result": [[result_url(), seed, uuid.uuid4().hex] for _ in range(count)]}
+        elif "restyle_portrait" in path:
+            body = {"image_res": result_url()}
+        else:
+            count = int(payload.get("num_results", 1))
+            body = {"result": [{"urls": [result_url()], "seed": seed} for _ in range(count)]}
+        return self._send(200, body, bytes_in=bytes_in)
+
+
+def start_server(settings=None, host="127.0.0.1", port=0):
+    """Start the mock server on a background thread; returns ``(server, base_url)``."""
+    state = MockState(settings or MockSettings())
+    handler = type("BoundMockBriaHandler", (MockBriaHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Bria API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--job-seconds", type=float, default=1.0)
+    parser.add_argument("--result-size", type=int, default=1024)
+    parser.add_argument("--video-mb", type=float, default=4.0)
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        failure_rate=args.failure_rate,
+        job_seconds=args.job_seconds,
+        result_size=args.result_size,
+        video_mb=args.video_mb,
+    )
+    server, base_url = start_server(settings, args.host, args.port)
+    print(f"Mock Bria API listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+End-to-end benchmarks for the Bria nodes against the local mock API.
+
+The node package is imported the way ComfyUI imports custom nodes, so ComfyUI itself must be
+importable (``--comfyui /path/to/ComfyUI`` or ``COMFYUI_PATH``) for ``folder_paths``. All traffic
+for the Bria production hosts is redirected to the mock server by mounting an adapter on the
+shared HTTP session; nothing reaches the live service.
+
+Example:
+    python benchmarks/run_benchmarks.py --comfyui ~/ComfyUI --batch-sizes 1,4,16 --repeat 3
+
+For each scenario and batch size it reports throughput (items/s), p50/p99 latency per node call,
+request body bytes sent and received, and the peak RSS of the process.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import torch
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_bria_server import MockSettings, start_server  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BRIA_HOSTS = ("https://engine.prod.bria-api.com", "https://platform.prod.bria-api.com")
+API_KEY = "benchmark-key"
+
+
+def load_package(comfyui_path):
+    """Import the repository as a custom-node package and return its ``nodes`` subpackage."""
+    if comfyui_path:
+        sys.path.insert(0, comfyui_path)
+    try:
+        import folder_paths  # noqa: F401
+    except ImportError:
+        sys.exit("ComfyUI is not importable: pass --comfyui /path/to/ComfyUI or set COMFYUI_PATH.")
+    spec = importlib.util.spec_from_file_location(
+        "comfyui_bria_api", os.path.join(REPO_ROOT, "__init__.py"), submodule_search_locations=[REPO_ROOT]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["comfyui_bria_api"] = package
+    spec.loader.exec_module(package)
+    return sys.modules["comfyui_bria_api.nodes"]
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends requests for the Bria production hosts to the mock server instead."""
+
+    def __init__(self, target, **kwargs):
+        super().__init__(**kwargs)
+        self.target = urlsplit(target)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = url._replace(scheme=self.target.scheme, netloc=self.target.netloc).geturl()
+        return super().send(request, **kwargs)
+
+
+def redirect_to_mock(common, base_url):
+    session = common.get_http_session()
+    settings = common._http_settings
+    adapter = RedirectAdapter(
+        base_url, pool_connections=settings["pool_connections"], pool_maxsize=settings["pool_maxsize"]
+    )
+    for host in BRIA_HOSTS:
+        session.mount(host, adapter)
+
+
+class PeakRss:
+    """Samples the resident set size of this process while a scenario runs."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            # Not Linux: fall back to the lifetime peak reported by getrusage (KiB on Linux, bytes on macOS)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def _images(batch, size):
+    return torch.rand((batch, size, size, 3), dtype=torch.float32)
+
+
+def _concurrently(batch, call):
+    """Run ``call()`` ``batch`` times in parallel, like independent nodes in one workflow; returns latencies."""
+    def timed(_):
+        started = time.perf_counter()
+        call()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=batch) as executor:
+        return list(executor.map(timed, range(batch)))
+
+
+def _timed(call):
+    started = time.perf_counter()
+    call()
+    return [time.perf_counter() - started]
+
+
+def build_scenarios(nodes, image_size, video_path):
+    """Scenario name -> function(batch) returning the latencies of the node calls it made."""
+
+    def rmbg(batch):
+        images = _images(batch, image_size)
+        return _timed(lambda: nodes.RmbgNode().execute(images, False, False, True, API_KEY))
+
+    def generate(batch):
+        images = _images(batch, image_size)
+        node = nodes.GenerateImageNodeV2()
+        return _timed(lambda: node.execute(API_KEY, "a product photo", "FIBO", "", "1:1", 50, 5, "1", images=images))
+
+    def shot_text(batch):
+        image = _images(1, image_size)
+        return _concurrently(
+            batch,
+            lambda: nodes.ShotByTextAutomaticNode().execute(image, "on a marble table", "fast", "1000, 1000", API_KEY),
+        )
+
+    def shot_image(batch):
+        image, ref_image = _images(1, image_size), _images(1, image_size)
+        return _concurrently(batch, lambda: nodes.ShotByImageOriginalNode().execute(image, ref_image, API_KEY))
+
+    def video(batch):
+        return _concurrently(batch, lambda: nodes.RemoveVideoBackgroundNode().execute(API_KEY, video_path))
+
+    return {"rmbg": rmbg, "generate": generate, "shot_text": shot_text, "shot_image": shot_image, "video": video}
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def isolate(cache_dir):
+    """
+    Keep the run away from the user's on-disk Bria state and make every node call a real request.
+
+    Scenarios issue identical calls in parallel; with coalescing, the job journal and the upload
+    caches those would collapse into a single request, so all of them are turned off and any
+    state is written to ``cache_dir``. Must be called before the package is imported.
+    """
+    os.environ["BRIA_CACHE_DIR"] = cache_dir
+    os.environ["BRIA_JOB_JOURNAL"] = "0"
+    os.environ["BRIA_REFERENCE_UPLOADS"] = "0"
+    os.environ["BRIA_VIDEO_UPLOAD_CACHE"] = "0"
+    os.environ["BRIA_RESULT_CACHE"] = "0"
+    os.environ["BRIA_COALESCE"] = "0"
+
+
+def run(args):
+    cache_dir = tempfile.TemporaryDirectory(prefix="bria-benchmark-")
+    isolate(cache_dir.name)
+    nodes = load_package(args.comfyui or os.environ.get("COMFYUI_PATH"))
+    common = sys.modules["comfyui_bria_api.nodes.common"]
+    # The package may have been imported before isolate() ran (e.g. by a test harness)
+    common.configure_coalescing(False)
+    common.configure_job_journal(enabled=False)
+    common.configure_result_cache(enabled=False)
+    common.configure_reference_uploads(enabled=False)
+    sys.modules["comfyui_bria_api.nodes.video_nodes.video_utils"].configure_video_upload_cache(enabled=False)
+
+    if args.server:
+        base_url = args.server.rstrip("/")
+    else:
+        settings = MockSettings(
+            latency=args.latency_ms / 1000.0,
+            jitter=args.jitter_ms / 1000.0,
+            failure_rate=args.failure_rate,
+            job_seconds=args.job_seconds,
+            result_size=args.result_size,
+            video_mb=args.video_mb,
+        )
+        _, base_url = start_server(settings)
+    redirect_to_mock(common, base_url)
+
+    video_file = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    video_file.write(os.urandom(int(args.video_mb * 1024 * 1024)))
+    video_file.close()
+
+    scenarios = build_scenarios(nodes, args.image_size, video_file.name)
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    results = []
+    try:
+        for name in selected:
+            for batch in batch_sizes:
+                requests.post(f"{base_url}/__reset")
+                latencies = []
+                with PeakRss() as rss:
+                    started = time.perf_counter()
+                    for _ in range(args.repeat):
+                        latencies.extend(scenarios[name](batch))
+                    wall = time.perf_counter() - started
+                stats = requests.get(f"{base_url}/__stats").json()
+                results.append({
+                    "scenario": name,
+                    "batch": batch,
+                    "items": batch * args.repeat,
+                    "throughput": batch * args.repeat / wall,
+                    "p50": statistics.median(latencies),
+                    "p99": _percentile(latencies, 0.99),
+                    "requests": stats["requests"],
+                    "bytes_sent": stats["bytes_in"],
+                    "bytes_received": stats["bytes_out"],
+                    "peak_rss_mb": rss.peak / (1024 * 1024),
+                })
+                print(_format_row(results[-1]), flush=True)
+    finally:
+        os.remove(video_file.name)
+        cache_dir.cleanup()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+def _format_row(row):
+    return (
+        f"{row['scenario']:<11} batch={row['batch']:<4} {row['throughput']:8.2f} items/s  "
+        f"p50={row['p50']:7.3f}s p99={row['p99']:7.3f}s  requests={row['requests']:<5} "
+        f"sent={row['bytes_sent'] / 1e6:8.2f} MB recv={row['bytes_received'] / 1e6:8.2f} MB  "
+        f"peak_rss={row['peak_rss_mb']:8.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Bria nodes against a local mock API")
+    parser.add_argument("--comfyui", help="Path to a ComfyUI checkout (defaults to $COMFYUI_PATH)")
+    parser.add_argument("--server", help="Base URL of an already running mock server; by default one is started in-process")
+    parser.add_argument("--scenarios", default="rmbg,generate,shot_text,shot_image,video")
+    parser.add_argument("--batch-sizes", default="1,4,16")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image-size", type=int, default=1024, help="Edge of the square input images")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--job-seconds", type=float, default=1.0)
+    parser.add_argument("--result-size", type=int, default=1024)
+    parser.add_argument("--video-mb", type=float, default=4.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
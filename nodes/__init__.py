@@ -32,6 +32,7 @@ from .shot_by_image_custom_coordinates_node import ShotByImageCustomCoordinatesN
 from .shot_by_image_node import ShotByImageOriginalNode
 from .shot_by_image_manual_placement_node import ShotByImageManualPlacementNode
 from .shot_by_image_manual_padding_node import ShotByImageManualPaddingNode
+from .shot_multi_placement_node import ShotMultiPlacementNode
 from .attribution_by_image_node import AttributionByImageNode
 from .video_nodes.remove_video_background_node import RemoveVideoBackgroundNode
 from .video_nodes.green_screen_video_node import GreenScreenVideoNode
@@ -47,3 +48,4 @@ from .fibo_edit_node import FIBOEditNode
 from .fibo_edit_structured_instruction_node import FIBOEditStructuredInstructionNode
 from .multi_image_select import BriaMultiImageSelect
 from .product_integrate_node import ProductIntegrateNode
+from .bria_job_nodes import BriaCollectNode, submit_node
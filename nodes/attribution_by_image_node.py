@@ -1,13 +1,14 @@
-import requests
 
 from .common import (
-    bria_json_headers,
+    async_node,
     image_to_base64,
     normalize_images_input,
-    poll_status_until_completed,
+    run_batch,
+    run_job,
     to_pil_safe,
 )
 
+@async_node
 class AttributionByImageNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -32,37 +33,20 @@ class AttributionByImageNode():
             raise Exception("Please insert a valid API key.")
         images = normalize_images_input(images)
 
-        batch_results = []
+        def process_image(idx, pil_image):
+            payload = {
+                "image": image_to_base64(pil_image, endpoint=self.api_url),
+                "model_version": model_version,
+            }
 
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
+            final_response = run_job(self.api_url, payload, api_key)
+            return str(final_response.get("result", {}).get("content", ""))
 
-                payload = {
-                    "image": image_base64,
-                    "model_version": model_version,
-                }
+        def on_error(idx, pil_image, error):
+            print(f"[AttributionByImageNode] Skipping image {idx} due to error: {error}")
+            return ""
 
-                headers = bria_json_headers(api_key)
-
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                # Poll until completion
-                response_dict = response.json()
-                status_url = response_dict.get('status_url')
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                final_response = poll_status_until_completed(status_url, api_key)
-                content = str(final_response.get("result", {}).get("content", ""))
-                batch_results.append(content)
-
-            except Exception as e:
-                print(f"[AttributionByImageNode] Skipping image {idx} due to error: {e}")
-                batch_results.append("")
+        batch_results = run_batch(images, process_image, on_error)
 
         # Join all responses with a delimiter
         combined_response = "\n---\n".join(batch_results)
@@ -0,0 +1,136 @@
+import json
+
+import torch
+
+from .common import async_node, failed_submit_count, submit_node_job
+
+MAX_COLLECT_JOBS = 16
+BATCH_OUTPUT = "all_images"
+
+
+def _submit_key(node_cls, unique_id):
+    return f"{node_cls.__name__}:{unique_id}"
+
+
+def submit_node(node_cls):
+    """
+    Build the "submit" twin of an API node.
+
+    The twin takes the same inputs as ``node_cls`` but returns a ``BRIA_JOB`` handle as soon as
+    the API accepted the job, while the node keeps polling in the background. Feed the handles
+    into ``BriaCollectNode`` to get the outputs, so a workflow that starts dozens of jobs waits
+    roughly as long as its slowest one.
+    """
+
+    class SubmitNode:
+        RETURN_TYPES = ("BRIA_JOB",)
+        RETURN_NAMES = ("job",)
+        CATEGORY = "API Nodes/Submit"
+        FUNCTION = "submit"
+
+        @classmethod
+        def INPUT_TYPES(cls):
+            input_types = dict(node_cls.INPUT_TYPES())
+            input_types["hidden"] = {**input_types.get("hidden", {}), "unique_id": "UNIQUE_ID"}
+            return input_types
+
+        @classmethod
+        def IS_CHANGED(cls, unique_id=None, **kwargs):
+            # A handle whose job failed must not be served from ComfyUI's cache on the next run;
+            # counted per node, so only the failed one is submitted (and billed) again.
+            return failed_submit_count(_submit_key(node_cls, unique_id))
+
+        def submit(self, unique_id=None, **kwargs):
+            return (submit_node_job(node_cls(), kwargs, key=_submit_key(node_cls, unique_id)),)
+
+    SubmitNode.__name__ = SubmitNode.__qualname__ = f"{node_cls.__name__}Submit"
+    SubmitNode.__doc__ = f"Submit {node_cls.__name__} in the background and return a BRIA_JOB handle."
+    return SubmitNode
+
+
+def _image_list(value):
+    """Flatten an IMAGE output (a (B,H,W,C) tensor or a list of tensors) into (H,W,C) tensors."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [image for item in value for image in _image_list(item)]
+    if value.ndim == 3:
+        return [value]
+    return list(value)
+
+
+def _join_images(images):
+    if not images:
+        return None
+    if len({tuple(image.shape) for image in images}) == 1:
+        return torch.stack(images)
+    # Different sizes cannot share a batch tensor; hand them on as a list of (H,W,C) images, like RmbgNode does.
+    return list(images)
+
+
+@async_node
+class BriaCollectNode:
+    """
+    Waits for one or more BRIA_JOB handles and gathers their outputs.
+
+    All image outputs are joined into one batch, the result URLs of video jobs are listed one per
+    line, and the first text output of every other job (e.g. its structured prompt) is returned
+    one job per line. ``metadata`` is a JSON list with every job's node, request IDs and non-image outputs.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        optional = {f"job_{i}": ("BRIA_JOB",) for i in range(2, MAX_COLLECT_JOBS + 1)}
+        optional["on_error"] = (["raise", "skip"], {"default": "raise"})
+        return {
+            "required": {
+                "job": ("BRIA_JOB",),
+            },
+            "optional": optional,
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("images", "text", "video_urls", "metadata")
+    CATEGORY = "API Nodes"
+    FUNCTION = "execute"
+
+    def execute(self, job, on_error="raise", **more_jobs):
+        handles = [job] + [more_jobs[f"job_{i}"] for i in range(2, MAX_COLLECT_JOBS + 1) if more_jobs.get(f"job_{i}")]
+
+        images, texts, video_urls, metadata, errors = [], [], [], [], []
+        # The jobs are already running; waiting on them in turn costs as long as the slowest one.
+        for handle in handles:
+            try:
+                outputs = handle.result()
+            except Exception as e:
+                errors.append(f"{handle.node}: {e}")
+                metadata.append({"node": handle.node, "request_ids": handle.request_ids, "error": str(e)})
+                continue
+            if isinstance(outputs, dict):
+                outputs = outputs.get("result", ())
+
+            entry = {"node": handle.node, "request_ids": handle.request_ids, "outputs": {}}
+            job_texts = []
+            # Nodes that also return all their images as one batch are collected from that output only.
+            batch_only = BATCH_OUTPUT in handle.return_names
+            for kind, name, value in zip(handle.return_types, handle.return_names, outputs):
+                if kind == "IMAGE":
+                    if name == BATCH_OUTPUT or not batch_only:
+                        images.extend(_image_list(value))
+                    continue
+                entry["outputs"][name] = value
+                if kind == "STRING" and "url" in name.lower():
+                    video_urls.append(str(value))
+                elif value is not None:
+                    job_texts.append(str(value))
+            if job_texts:
+                texts.append(job_texts[0])
+            metadata.append(entry)
+
+        if errors:
+            message = f"{len(errors)} of {len(handles)} Bria jobs failed: " + "; ".join(errors)
+            if on_error == "raise":
+                raise Exception(message)
+            print(message)
+
+        return (_join_images(images), "\n".join(texts), "\n".join(video_urls), json.dumps(metadata, default=str))
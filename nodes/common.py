@@ -3,14 +3,457 @@ from PIL import Image
 import io
 import torch
 import base64
-from torchvision.transforms import ToPILImage
 import requests
 import time
 import os
+import sys
+import random
+import email.utils
 import uuid
+import sqlite3
+import threading
+import asyncio
+import contextvars
+import functools
+import json
+import weakref
+import heapq
+import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from .utils.job_journal import JobJournal
+from .utils.mask_crop import crop, feather_weights, mask_crop_box, paste_patch
+from .utils.image_codec import ImageEncoding, array_to_pil, decode_image, tensor_to_uint8
+from .utils.rate_limit import RateLimiter, endpoint_family, parse_limits
+from .utils.reference_store import ReferenceStore
+from .utils.retry import CircuitBreakers, RetryPolicy, is_idempotent
+from .utils.result_cache import ResultCache, request_fingerprint
+from .utils.singleflight import SingleFlight, call_key
+from .utils.telemetry import current_tags, link_result_urls, span, tagged, url_tags
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp ships with ComfyUI; only the async helpers need it
+    aiohttp = None
 
 BRIA_COMFYUI_USER_AGENT = "bria/ComfyUI"
 
+
+def _env_int(name, default):
+    value = os.environ.get(name, "").strip()
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.environ.get(name, "").strip()
+    return float(value) if value else default
+
+
+# Shared HTTP client settings. Every request to the Bria engine, the platform upload
+# endpoints and the S3/temp result hosts goes through one process-wide session so
+# TCP+TLS connections are kept alive and reused between submits, polls and downloads.
+_http_settings = {
+    "pool_connections": _env_int("BRIA_HTTP_POOL_CONNECTIONS", 16),  # number of per-host pools kept
+    "pool_maxsize": _env_int("BRIA_HTTP_POOL_MAXSIZE", 32),  # keep-alive connections per host
+    "connect_timeout": _env_float("BRIA_HTTP_CONNECT_TIMEOUT", 10.0),
+    "read_timeout": _env_float("BRIA_HTTP_READ_TIMEOUT", 300.0),
+}
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def configure_http(pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+    """
+    Update the shared HTTP client settings.
+
+    Pool size changes take effect by rebuilding the session on next use; timeouts apply
+    to every subsequent request.
+    """
+    global _http_session
+    with _http_session_lock:
+        if pool_connections is not None:
+            _http_settings["pool_connections"] = int(pool_connections)
+        if pool_maxsize is not None:
+            _http_settings["pool_maxsize"] = int(pool_maxsize)
+        if connect_timeout is not None:
+            _http_settings["connect_timeout"] = float(connect_timeout)
+        if read_timeout is not None:
+            _http_settings["read_timeout"] = float(read_timeout)
+        if (pool_connections is not None or pool_maxsize is not None) and _http_session is not None:
+            _http_session.close()
+            _http_session = None
+
+
+def get_http_session():
+    """Return the process-wide ``requests.Session`` with per-host keep-alive pools."""
+    global _http_session
+    session = _http_session
+    if session is not None:
+        return session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_http_settings["pool_connections"],
+                pool_maxsize=_http_settings["pool_maxsize"],
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+
+# Requests per API key are paced and capped per endpoint family (v1, v2 image, v2 video, upload,
+# status) so concurrent nodes and batches sharing one key stay under its quota.
+_rate_limiter = RateLimiter(
+    parse_limits(os.environ.get("BRIA_RATE_LIMITS", "")),
+    enabled=os.environ.get("BRIA_RATE_LIMIT", "").strip().lower() not in ("0", "false", "no", "off"),
+)
+
+
+def configure_rate_limits(family=None, rate=None, max_in_flight=None, enabled=None):
+    """
+    Update the request governor at runtime.
+
+    ``family`` is one of ``v1``, ``v2_image``, ``v2_video``, ``upload`` or ``status``; ``rate`` is
+    in requests per second and ``max_in_flight`` caps concurrent requests (``0`` lifts either limit).
+    """
+    if enabled is not None:
+        _rate_limiter.enabled = bool(enabled)
+    if family is not None:
+        _rate_limiter.configure(family, rate=rate, max_in_flight=max_in_flight)
+
+
+def get_rate_limiter():
+    return _rate_limiter
+
+
+def _api_token(headers):
+    return (headers or {}).get("api_token")
+
+
+# Transient failures (5xx, 429, dropped connections, timeouts) are retried with exponential
+# backoff. Submits are only repeated when the job certainly was not started (see retry.py), and
+# an endpoint that keeps failing is cut off by its circuit breaker instead of being hammered.
+_retry_policy = RetryPolicy(
+    attempts=_env_int("BRIA_RETRY_ATTEMPTS", 4),
+    base_delay=_env_float("BRIA_RETRY_BACKOFF", 0.5),
+)
+_circuit_breakers = CircuitBreakers(
+    failure_threshold=_env_int("BRIA_CIRCUIT_FAILURES", 5),
+    reset_timeout=_env_float("BRIA_CIRCUIT_RESET_SECONDS", 30.0),
+)
+
+
+def configure_retries(attempts=None, base_delay=None, max_delay=None, failure_threshold=None, reset_timeout=None):
+    """Update the retry policy (``attempts`` counts the first try) and the circuit breaker settings."""
+    if attempts is not None:
+        _retry_policy.attempts = max(1, int(attempts))
+    if base_delay is not None:
+        _retry_policy.base_delay = float(base_delay)
+    if max_delay is not None:
+        _retry_policy.max_delay = float(max_delay)
+    _circuit_breakers.configure(failure_threshold, reset_timeout)
+
+
+def circuit_breaker_states():
+    """Current breaker state (``closed``, ``open`` or ``half-open``) per endpoint."""
+    return _circuit_breakers.states()
+
+
+def _check_breaker(url):
+    key, breaker = _circuit_breakers.for_url(url)
+    wait = breaker.allow()
+    if wait is not None:
+        raise Exception(f"{key} is failing repeatedly; not sending requests for another {wait:.1f}s (circuit open)")
+    return breaker
+
+
+def _record_status(breaker, status_code):
+    if status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()  # any 2xx-4xx answer shows the endpoint is up
+
+
+def _never_sent(error):
+    """True when the connection could not be opened, so the server cannot have seen the request."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), ConnectTimeoutError)
+    return False
+
+
+_RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+def http_request(method, url, **kwargs):
+    """
+    Send a request through the shared session with the default timeouts, rate limits and retries.
+
+    Returns the last response, so a non-retryable or still failing status is reported by the
+    caller as before; raises if the endpoint's circuit is open or the connection keeps failing.
+    """
+    kwargs.setdefault("timeout", (_http_settings["connect_timeout"], _http_settings["read_timeout"]))
+    family = endpoint_family(url)
+    api_key = _api_token(kwargs.get("headers"))
+    idempotent = is_idempotent(method, url)
+    # A streamed body (e.g. a FileUploadStream) is rewound before every retry.
+    body = kwargs.get("data")
+    start = body.tell() if hasattr(body, "seek") and hasattr(body, "tell") else None
+    for attempt in range(_retry_policy.attempts):
+        last_attempt = attempt + 1 >= _retry_policy.attempts
+        breaker = _check_breaker(url)
+        if attempt and start is not None:
+            body.seek(start)
+        try:
+            with _rate_limiter.limit(api_key, family):
+                _report_dispatch(family)
+                response = get_http_session().request(method, url, **kwargs)
+        except _RETRYABLE_ERRORS as e:
+            breaker.record_failure()
+            if last_attempt or not (idempotent or _never_sent(e)):
+                raise
+            delay = _retry_policy.delay(attempt)
+            print(f"{method} {url} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        _record_status(breaker, response.status_code)
+        retry_after = _retry_after_seconds(response)
+        if response.status_code == 429:
+            _rate_limiter.throttled(api_key, family, retry_after or 1.0)
+        if last_attempt or not _retry_policy.should_retry_status(response.status_code, idempotent):
+            return response
+        delay = _retry_policy.delay(attempt, retry_after)
+        print(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+        response.close()
+        time.sleep(delay)
+
+
+def http_get(url, **kwargs):
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url, **kwargs):
+    return http_request("POST", url, **kwargs)
+
+
+def http_put(url, **kwargs):
+    return http_request("PUT", url, **kwargs)
+
+
+# Result downloads are streamed rather than buffered by ``requests``: the size is capped, each
+# chunk must arrive within ``chunk_timeout`` seconds and progress is shown on the running node.
+_download_settings = {
+    "max_mb": _env_float("BRIA_DOWNLOAD_MAX_MB", 1024.0),
+    "chunk_timeout": _env_float("BRIA_DOWNLOAD_CHUNK_TIMEOUT", 60.0),
+    "chunk_size": 1024 * 1024,
+}
+
+
+def configure_downloads(max_mb=None, chunk_timeout=None):
+    """Update the default download size limit and per-chunk timeout."""
+    if max_mb is not None:
+        _download_settings["max_mb"] = float(max_mb)
+    if chunk_timeout is not None:
+        _download_settings["chunk_timeout"] = float(chunk_timeout)
+
+
+class _TransferProgress:
+    """Reports download or upload progress to ComfyUI's progress bar when running inside ComfyUI."""
+
+    def __init__(self, total):
+        self.bar = None
+        self.total = total
+        self.reported = 0
+        self.transferred = 0
+        self._lock = threading.Lock()
+        if not total or total < _download_settings["chunk_size"]:
+            return  # nothing worth showing for small results
+        try:
+            from comfy.utils import ProgressBar
+            self.bar = ProgressBar(total)
+        except Exception:
+            self.bar = None
+
+    def update(self, received):
+        if self.bar is None:
+            return
+        # At most ~100 updates per download
+        if (received - self.reported) * 100 >= self.total or received == self.total:
+            self.reported = received
+            try:
+                self.bar.update_absolute(received, self.total)
+            except Exception:
+                self.bar = None
+
+    def advance(self, count):
+        """Add ``count`` bytes; safe to call from several threads (e.g. parallel upload parts)."""
+        with self._lock:
+            self.transferred += count
+            self.update(self.transferred)
+
+
+def _download_limit(url, total, max_bytes):
+    if max_bytes is not None and total is not None and total > max_bytes:
+        raise Exception(f"Download of {url} is {total} bytes, over the {max_bytes} byte limit")
+
+
+def open_download(url, chunk_timeout=None, **kwargs):
+    """Start a streamed GET and return the response once its headers are in; raises on HTTP errors."""
+    timeout = (_http_settings["connect_timeout"], chunk_timeout or _download_settings["chunk_timeout"])
+    response = http_get(url, stream=True, timeout=timeout, **kwargs)
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"Failed to download {url}: {response.status_code}")
+    return response
+
+
+def read_download(response, max_bytes=None, path=None, progress=True):
+    """
+    Stream the body of an ``open_download`` response.
+
+    Returns a ``bytearray`` (allocated once at the announced size, so it goes to the decoder
+    without further copies) or, with ``path``, writes the body to that file and returns its size.
+    The default size limit guards memory, so a body streamed to ``path`` is only capped by an
+    explicit ``max_bytes``.
+    """
+    if not max_bytes and not path:
+        max_bytes = int(_download_settings["max_mb"] * 1024 * 1024)
+    length = response.headers.get("Content-Length")
+    total = int(length) if length and length.isdigit() else None
+    try:
+        _download_limit(response.url, total, max_bytes)
+    except Exception:
+        response.close()
+        raise
+    reporter = _TransferProgress(total) if progress else None
+
+    with span("download", **url_tags(response.url)) as record:
+        buffer = None if path else bytearray(total or 0)
+        out = open(path, "wb") if path else None
+        received = 0
+        try:
+            for chunk in response.iter_content(chunk_size=_download_settings["chunk_size"]):
+                if not chunk:
+                    continue
+                end = received + len(chunk)
+                if max_bytes and end > max_bytes:
+                    raise Exception(f"Download of {response.url} exceeded the {max_bytes} byte limit")
+                if out is not None:
+                    out.write(chunk)
+                elif total is not None and end <= total:
+                    buffer[received:end] = chunk
+                else:
+                    del buffer[received:]
+                    buffer += chunk
+                received = end
+                if reporter is not None:
+                    reporter.update(received)
+        except BaseException:
+            if out is not None:
+                out.close()
+                os.remove(path)  # never leave a truncated file behind
+                out = None
+            raise
+        finally:
+            response.close()
+            if out is not None:
+                out.close()
+        record["bytes"] = received
+
+    if path:
+        return received
+    if received < len(buffer):
+        del buffer[received:]  # body shorter than announced (e.g. decoded transfer encoding)
+    return buffer
+
+
+def download(url, max_bytes=None, path=None, chunk_timeout=None, progress=True):
+    """
+    Download ``url`` in chunks into memory (returns a ``bytearray``) or into the file at ``path``.
+
+    A transfer that breaks off midway is started again from the beginning.
+    """
+    for attempt in range(_retry_policy.attempts):
+        response = open_download(url, chunk_timeout)
+        try:
+            return read_download(response, max_bytes=max_bytes, path=path, progress=progress)
+        except _RETRYABLE_ERRORS as e:
+            if attempt + 1 >= _retry_policy.attempts:
+                raise
+            delay = _retry_policy.delay(attempt)
+            print(f"Download of {url} was interrupted ({type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+# Uploads are streamed from disk in fixed-size reads, so a multi-gigabyte video never has to fit in memory.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class FileUploadStream:
+    """
+    Read-only view of ``length`` bytes of a file from ``offset``, used as a streamed request body.
+
+    ``len()`` gives ``requests`` the ``Content-Length`` (presigned S3 PUTs do not accept chunked
+    transfer encoding), reads never return more than ``UPLOAD_CHUNK_SIZE`` bytes and every read
+    advances ``progress`` (a ``_TransferProgress``). ``seek`` lets a retried request start over.
+    """
+
+    def __init__(self, path, offset=0, length=None, progress=None):
+        self._file = open(path, "rb")
+        self.offset = offset
+        self.length = os.fstat(self._file.fileno()).st_size - offset if length is None else length
+        self.progress = progress
+        self._position = 0
+        self._file.seek(offset)
+
+    def __len__(self):
+        return self.length  # requests subtracts tell() to get the bytes still to send
+
+    def read(self, size=-1):
+        remaining = self.length - self._position
+        if size is None or size < 0 or size > UPLOAD_CHUNK_SIZE:
+            size = UPLOAD_CHUNK_SIZE
+        chunk = self._file.read(min(size, remaining))
+        self._position += len(chunk)
+        if self.progress is not None and chunk:
+            self.progress.advance(len(chunk))
+        return chunk
+
+    def tell(self):
+        return self._position
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_END:
+            position += self.length
+        elif whence == os.SEEK_CUR:
+            position += self._position
+        if self.progress is not None and position < self._position:
+            self.progress.advance(position - self._position)  # a retry sends these bytes again
+        self._position = max(0, min(position, self.length))
+        self._file.seek(self.offset + self._position)
+        return self._position
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def upload_progress(total):
+    """Progress reporter for an upload of ``total`` bytes, shown on the running node."""
+    return _TransferProgress(total)
+
+
 def bria_json_headers(api_token: str) -> dict:
     """Headers for JSON POST requests to Bria API."""
     return {
@@ -19,26 +462,125 @@ def bria_json_headers(api_token: str) -> dict:
         "User-Agent": BRIA_COMFYUI_USER_AGENT,
     }
 def postprocess_image(image):
-    result_image = Image.open(io.BytesIO(image))
-    result_image = result_image.convert("RGB")
-    result_image = np.array(result_image).astype(np.float32) / 255.0
-    result_image = torch.from_numpy(result_image)[None,]
-    return result_image
-
-def image_to_base64(pil_image):
-    # Convert a PIL image to a base64-encoded string
-    buffered = io.BytesIO()
-    pil_image.save(buffered, format="PNG")  # Save the image to the buffer in PNG format
-    buffered.seek(0)  # Rewind the buffer to the beginning
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+    # Decode straight into a float32 (1,H,W,3) tensor
+    return decode_image(image, channels=3)[None,]
+
+# Wire encoding of input images. The default is a fast lossless PNG level; endpoints can be given
+# their own encoding (for example lossless WebP or high-quality JPEG for large photos) by matching
+# a fragment of their URL, e.g. BRIA_IMAGE_ENCODING_BY_ENDPOINT="edit/enhance=webp;remove_background=jpeg:92".
+_image_encodings = {None: ImageEncoding.parse(os.environ.get("BRIA_IMAGE_ENCODING", "").strip() or "png:1")}
+for _rule in os.environ.get("BRIA_IMAGE_ENCODING_BY_ENDPOINT", "").split(";"):
+    if "=" in _rule:
+        _fragment, _spec = _rule.split("=", 1)
+        _image_encodings[_fragment.strip()] = ImageEncoding.parse(_spec)
+
+
+def configure_image_encoding(spec, endpoint=None):
+    """Set the input encoding (``png[:level]``, ``webp`` or ``jpeg[:quality]``) by default or for URLs containing ``endpoint``."""
+    _image_encodings[endpoint] = spec if isinstance(spec, ImageEncoding) else ImageEncoding.parse(spec)
+
+
+def image_encoding_for(endpoint=None):
+    """Return the ``ImageEncoding`` for an endpoint URL; the longest matching fragment wins."""
+    if endpoint:
+        matches = [fragment for fragment in _image_encodings if fragment and fragment in endpoint]
+        if matches:
+            return _image_encodings[max(matches, key=len)]
+    return _image_encodings[None]
+
+
+def image_to_base64(pil_image, endpoint=None):
+    """Encode a PIL image (or ComfyUI tensor) for ``endpoint`` and return it as a base64 string."""
+    with tagged(endpoint=endpoint):
+        encoded = image_encoding_for(endpoint).encode(pil_image)
+    return base64.b64encode(encoded.data).decode('utf-8')
+
+
+# Largest input (in megapixels) worth uploading per endpoint. The services work at a much lower
+# internal resolution, so bigger inputs only cost transfer and decode time; they are downscaled
+# before encoding. Configured like the encodings above, e.g.
+# BRIA_MAX_INPUT_MP_BY_ENDPOINT="remove_background=8;expand=0" (0 = no limit).
+_max_input_megapixels = {
+    None: _env_float("BRIA_MAX_INPUT_MP", 0.0),
+    "edit/remove_background": 4.0,
+    "edit/replace_background": 4.0,
+    "edit/expand": 4.0,
+}
+for _rule in os.environ.get("BRIA_MAX_INPUT_MP_BY_ENDPOINT", "").split(";"):
+    if "=" in _rule:
+        _fragment, _megapixels = _rule.split("=", 1)
+        _max_input_megapixels[_fragment.strip()] = float(_megapixels)
+
+
+def configure_max_input_resolution(megapixels, endpoint=None):
+    """Set the largest input sent by default or to URLs containing ``endpoint``; 0 removes the limit."""
+    _max_input_megapixels[endpoint] = float(megapixels)
+
+
+def max_input_megapixels_for(endpoint=None):
+    """Return the input limit for an endpoint URL in megapixels (0: none); the longest matching fragment wins."""
+    if endpoint:
+        matches = [fragment for fragment in _max_input_megapixels if fragment and fragment in endpoint]
+        if matches:
+            return _max_input_megapixels[max(matches, key=len)]
+    return _max_input_megapixels[None]
+
+
+def limit_input_resolution(pil_image, endpoint=None, output_size=None):
+    """
+    Downscale ``pil_image`` to the endpoint's input limit; returns ``(image, scale)``.
+
+    ``scale`` is 1.0 when the image is sent as is, otherwise the factor applied to both sides.
+    With ``output_size`` = (width, height), e.g. an explicit expand canvas, the limit applies to
+    that requested output instead of the image itself.
+    """
+    megapixels = max_input_megapixels_for(endpoint)
+    width, height = output_size or pil_image.size
+    pixels = width * height
+    if megapixels <= 0 or pixels <= megapixels * 1_000_000:
+        return pil_image, 1.0
+    scale = (megapixels * 1_000_000 / pixels) ** 0.5
+    size = (max(1, int(pil_image.width * scale)), max(1, int(pil_image.height * scale)))
+    print(f"Downscaling {pil_image.width}x{pil_image.height} input to {size[0]}x{size[1]} for upload")
+    with span("resize", endpoint=endpoint):
+        return pil_image.resize(size, Image.LANCZOS, reducing_gap=3.0), scale
+
+
+def restore_resolution(result, size):
+    """Resize an (h,w,C) result tensor of a downscaled request back to ``size`` = (width, height)."""
+    width, height = size
+    resized = torch.nn.functional.interpolate(
+        result.permute(2, 0, 1)[None], size=(height, width), mode="bicubic", align_corners=False
+    )
+    return resized[0].permute(1, 2, 0).clamp_(0.0, 1.0)
+
+
+def apply_alpha_to_original(original, result, keep_alpha=False):
+    """
+    Full-resolution RGBA from the ``original`` PIL image and the alpha of a downscaled ``result``.
+
+    ``result`` is an (h,w,C) tensor; its alpha matte is upsampled to the original size and put on
+    the original pixels. With ``keep_alpha`` an alpha channel of the original is kept as well: the
+    matte is capped by it, so transparent input areas stay transparent at full resolution. A result
+    without alpha is simply resized.
+    """
+    if result.shape[2] < 4:
+        return restore_resolution(result, original.size)
+    size = (original.height, original.width)
+    matte = result.permute(2, 0, 1)[None, 3:4]
+    alpha = torch.nn.functional.interpolate(matte, size=size, mode="bilinear", align_corners=False)[0, 0].clamp_(0.0, 1.0)
+    if keep_alpha and "A" in original.getbands():
+        original_alpha = torch.from_numpy(np.array(original.getchannel("A"))).float().div_(255.0)
+        alpha = torch.minimum(alpha, original_alpha)
+    rgb = torch.from_numpy(np.array(original.convert("RGB"))).float().div_(255.0)
+    return torch.cat([rgb, alpha[:, :, None]], dim=2)
+
 
 def preprocess_image(image):
     if isinstance(image, torch.Tensor):
-        # Print image shape for debugging
         if image.dim() == 4:  # (batch_size, height, width, channels)
-            image = image.squeeze(0)  # Remove the batch dimension (1)
-            # Convert to PIL after permuting to (height, width, channels)
-            image = ToPILImage()(image.permute(2, 0, 1))  # (height, width, channels)
+            # First image of the batch, converted to uint8 in one vectorized pass
+            image = array_to_pil(tensor_to_uint8(image[0]))
         else:
             print("Unexpected image dimensions. Expected 4D tensor.")
     return image
@@ -48,109 +590,364 @@ def to_pil_safe(image):
     Converts a single image tensor or numpy array (H,W,C) to PIL Image.
     Handles float32 in 0-1 and uint8.
     """
-    if isinstance(image, torch.Tensor):
-        image = image.detach().cpu().numpy()
-
-    # If image is empty, replace with 1x1 black
-    if image.size == 0:
-        image = np.zeros((1,1,3), dtype=np.uint8)
-
-    # Ensure float images are scaled 0-255
-    if image.dtype in [np.float32, np.float64]:
-        if image.max() <= 1.0:
-            image = (image * 255).astype(np.uint8)
-        else:
-            image = image.astype(np.uint8)
-
-    # Handle grayscale images
-    if image.ndim == 2:
-        return Image.fromarray(image, mode="L")
-    elif image.shape[2] == 3:
-        return Image.fromarray(image, mode="RGB")
-    elif image.shape[2] == 4:
-        return Image.fromarray(image, mode="RGBA")
-    else:
-        raise ValueError(f"Cannot convert image with shape {image.shape} to PIL")
+    return array_to_pil(tensor_to_uint8(image))
 
 
 def preprocess_mask(mask):
     if isinstance(mask, torch.Tensor):
         # Print mask shape for debugging
         if mask.dim() == 3:  # (batch_size, height, width)
-            mask = mask.squeeze(0)  # Remove the batch dimension (1)
             # Convert to PIL (grayscale mask)
-            mask = ToPILImage()(mask)  # No permute needed for grayscale
+            mask = array_to_pil(tensor_to_uint8(mask[0]))
         else:
             print("Unexpected mask dimensions. Expected 3D tensor.")
     return mask
 
 
-def process_request(api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation):
-    if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
-        raise Exception("Please insert a valid API key.")
-
+def _mask_edit_payload(api_url, image, mask, visual_input_content_moderation, visual_output_content_moderation):
     # Check if image and mask are tensors, if so, convert to NumPy arrays
     if isinstance(image, torch.Tensor):
         image = preprocess_image(image)
     if isinstance(mask, torch.Tensor):
         mask = preprocess_mask(mask)
 
-    # Convert the image and mask directly to Base64 strings
-    image_base64 = image_to_base64(image)
-    mask_base64 = image_to_base64(mask)
-
-    # Prepare the API request payload for v2 API
-    payload = {
-        "image": image_base64,
-        "mask": mask_base64,
+    # Convert the image and mask directly to Base64 strings, then prepare the v2 API payload
+    return {
+        "image": image_to_base64(image, endpoint=api_url),
+        "mask": image_to_base64(mask),
         "visual_input_content_moderation":visual_input_content_moderation,
         "visual_output_content_moderation":visual_output_content_moderation
     }
 
-    headers = bria_json_headers(api_key)
+
+def _rgba_result_to_tensor(content):
+    return decode_image(content, channels=4)[None,]
+
+
+def mask_crop_region(image, mask, margin):
+    """
+    Crop box for sending only the masked part of ``image`` (see ``mask_crop_box``), or ``None``.
+
+    ``None`` means the full image should be sent: the inputs are not tensors, their sizes differ,
+    the mask is empty or it covers most of the image.
+    """
+    if not (isinstance(image, torch.Tensor) and isinstance(mask, torch.Tensor)):
+        return None
+    if tuple(mask.shape[-2:]) != tuple(image.shape[1:3]):
+        print(f"Mask size {tuple(mask.shape[-2:])} differs from image size {tuple(image.shape[1:3])}, sending the full image")
+        return None
+    box = mask_crop_box(mask, margin)
+    if box is not None:
+        x0, y0, x1, y1 = box
+        print(f"Sending the {x1 - x0}x{y1 - y0} crop around the mask instead of the {image.shape[2]}x{image.shape[1]} image")
+    return box
+
+
+def paste_mask_result(image, mask, box, result, feather):
+    """Blend the ``result`` of a cropped request ((1,h,w,C)) back into the first image of ``image``."""
+    if box is None:
+        return result
+    _, crop_mask = crop(image, mask, box)
+    return paste_patch(image[0], result[0], box, feather_weights(crop_mask, feather))[None,]
+
+
+def process_request(api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+                    crop_to_mask=False, crop_margin=64, crop_feather=8):
+    if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
+        raise Exception("Please insert a valid API key.")
+
+    box = mask_crop_region(image, mask, crop_margin) if crop_to_mask else None
+    image_in, mask_in = crop(image, mask, box) if box is not None else (image, mask)
+    payload = _mask_edit_payload(api_url, image_in, mask_in, visual_input_content_moderation, visual_output_content_moderation)
 
     try:
-        response = requests.post(api_url, json=payload, headers=headers) 
-        if response.status_code == 200 or response.status_code == 202:
-            print('Initial request successful, polling for completion...')
-            response_dict = response.json()
-            status_url = response_dict.get('status_url')
-            request_id = response_dict.get('request_id')
-            
-            if not status_url:
-                raise Exception("No status_url returned from API")
-            
-            print(f"Request ID: {request_id}, Status URL: {status_url}")
-            
-            final_response = poll_status_until_completed(status_url, api_key)
-            result_image_url = final_response['result']['image_url']
-            
-            # Download and process the result image
-            image_response = requests.get(result_image_url)
-            result_image = Image.open(io.BytesIO(image_response.content))
-            result_image = result_image.convert("RGBA")
-            result_image = np.array(result_image).astype(np.float32) / 255.0
-            result_image = torch.from_numpy(result_image)[None,]
-            # image_tensor = image_tensor = ToTensor()(output_image)
-            # image_tensor = image_tensor.permute(1, 2, 0) / 255.0  # Shape now becomes [1, 2200, 1548, 3]
-            # print(f"output tensor shape is: {image_tensor.shape}")
-            return (result_image,)  
-        else:
-            raise Exception(f"Error: API request failed with status code {response.status_code} {response.text}")
+        # run_job shares the job with identical concurrent requests
+        final_response = run_job(api_url, payload, api_key)
+        result_image_url = final_response['result']['image_url']
+
+        # Download and process the result image
+        result = _rgba_result_to_tensor(download(result_image_url))
+        return (paste_mask_result(image, mask, box, result, crop_feather),)
 
     except Exception as e:
         raise Exception(f"{e}")
 
 
-def poll_status_until_completed(status_url, api_key, timeout=360, check_interval=2):
+async def async_process_request(api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+                                crop_to_mask=False, crop_margin=64, crop_feather=8):
+    """Coroutine version of ``process_request`` built on the async HTTP helpers."""
+    if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
+        raise Exception("Please insert a valid API key.")
+
+    box = mask_crop_region(image, mask, crop_margin) if crop_to_mask else None
+    image_in, mask_in = crop(image, mask, box) if box is not None else (image, mask)
+    payload = await asyncio.to_thread(
+        _mask_edit_payload, api_url, image_in, mask_in, visual_input_content_moderation, visual_output_content_moderation
+    )
+    final_response = await async_run_job(api_url, payload, api_key)
+    image_bytes = await async_download(final_response['result']['image_url'])
+    result = await asyncio.to_thread(_rgba_result_to_tensor, image_bytes)
+    return (await asyncio.to_thread(paste_mask_result, image, mask, box, result, crop_feather),)
+
+
+_completion_times = {}  # endpoint -> smoothed seconds from submit to COMPLETED
+_completion_times_lock = threading.Lock()
+
+
+def record_completion_time(endpoint, seconds, smoothing=0.3):
+    """Fold an observed job duration into the endpoint's running estimate."""
+    if not endpoint:
+        return
+    with _completion_times_lock:
+        previous = _completion_times.get(endpoint)
+        _completion_times[endpoint] = seconds if previous is None else previous + smoothing * (seconds - previous)
+
+
+def expected_completion_time(endpoint):
+    """Return the learned typical duration of a job on ``endpoint`` in seconds, or None."""
+    with _completion_times_lock:
+        return _completion_times.get(endpoint)
+
+
+_ETA_FIELDS = ("eta", "eta_seconds", "estimated_time_remaining", "estimated_time")
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _eta_seconds(response_dict):
+    for field in _ETA_FIELDS:
+        value = response_dict.get(field) if response_dict else None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return max(0.0, float(value))
+    return None
+
+
+class PollingPolicy:
+    """
+    Decides when a job's status is checked next.
+
+    The first check comes after ``first_delay`` seconds, or close to the endpoint's learned typical
+    completion time once a few jobs have finished. Later checks start at ``interval`` and back off
+    by ``multiplier`` up to ``max_delay``, with +/- ``jitter`` (a fraction) so many jobs do not poll
+    in lockstep. A ``Retry-After`` header is always honored, and an ETA in the status payload is
+    used as the next delay when present.
+    """
+
+    def __init__(self, first_delay=0.5, interval=1.0, multiplier=1.5, max_delay=8.0, jitter=0.2, learned_fraction=0.8):
+        self.first_delay = first_delay
+        self.interval = interval
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.learned_fraction = learned_fraction
+
+    @classmethod
+    def fixed(cls, check_interval):
+        """A policy that checks every ``check_interval`` seconds, like the original fixed polling loop."""
+        return cls(first_delay=0, interval=check_interval, multiplier=1.0, max_delay=check_interval, jitter=0, learned_fraction=0)
+
+    def _jittered(self, delay):
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(max(delay, 0.0), self.max_delay)
+
+    def first_delay_for(self, endpoint=None):
+        expected = expected_completion_time(endpoint) if self.learned_fraction else None
+        if expected is None:
+            return self.first_delay
+        return min(max(self.first_delay, expected * self.learned_fraction), self.max_delay)
+
+    def next_delay(self, attempt, response=None, response_dict=None):
+        """Delay before check number ``attempt + 1``, given the response to check number ``attempt``."""
+        delay = self.interval * (self.multiplier ** max(0, attempt - 1))
+        eta = _eta_seconds(response_dict)
+        if eta is not None:
+            delay = max(eta, self.first_delay)
+        delay = self._jittered(delay)
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+# Image jobs usually finish within seconds, video jobs within minutes.
+IMAGE_POLLING_POLICY = PollingPolicy(first_delay=0.5, interval=1.0, multiplier=1.5, max_delay=8.0)
+VIDEO_POLLING_POLICY = PollingPolicy(first_delay=5.0, interval=5.0, multiplier=1.5, max_delay=30.0)
+
+
+class StatusPoller:
+    """
+    Tracks many status URLs from a single scheduler thread.
+
+    Each tracked job gets a ``concurrent.futures.Future`` that resolves with the final status
+    payload once the job is COMPLETED, or fails when it reports ERROR, a status check fails or
+    the timeout is reached. The scheduler keeps one queue of due checks ordered by time and hands
+    each due check to a small fixed pool, so hundreds of long-running jobs cost a handful of
+    threads instead of one sleeping thread per job.
+    """
+
+    def __init__(self, max_parallel_checks=8):
+        self._max_parallel_checks = max_parallel_checks
+        self._queue = []  # heap of (due_time, sequence, job)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._scheduler = None
+        self._checks = None
+
+    def track(self, status_url, api_key, timeout=360, policy=None, endpoint=None):
+        """
+        Start polling ``status_url`` and return a Future for its final status payload.
+
+        ``policy`` (default ``IMAGE_POLLING_POLICY``) spaces the checks; ``endpoint`` names the API the
+        job was submitted to, so its completion time feeds the learned per-endpoint first delay.
+        """
+        job = _new_poll_job(status_url, api_key, timeout, policy, endpoint)
+        job["future"] = Future()
+        self._schedule(job, job["started"] + job["policy"].first_delay_for(endpoint))
+        return job["future"]
+
+    def pending(self):
+        """Number of jobs currently waiting for their next status check."""
+        with self._condition:
+            return len(self._queue)
+
+    def _schedule(self, job, due_time):
+        with self._condition:
+            heapq.heappush(self._queue, (due_time, next(self._sequence), job))
+            if self._scheduler is None:
+                self._checks = ThreadPoolExecutor(
+                    max_workers=self._max_parallel_checks, thread_name_prefix="bria-status-check"
+                )
+                self._scheduler = threading.Thread(target=self._run, name="bria-status-poller", daemon=True)
+                self._scheduler.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    wait = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(wait)
+                _, _, job = heapq.heappop(self._queue)
+            if not job["future"].cancelled():
+                self._checks.submit(self._check, job)
+
+    def _check(self, job):
+        future = job["future"]
+        try:
+            if time.monotonic() >= job["deadline"]:
+                raise Exception(f"Timeout reached after {job['timeout']} seconds")
+            try:
+                response = http_get(job["status_url"], headers=job["headers"])
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Error checking status: {e}")
+            final_response, next_delay = _handle_status_response(job, response)
+            if final_response is not None:
+                _resolve(future, result=final_response)
+            else:
+                self._schedule(job, time.monotonic() + next_delay)
+        except Exception as e:
+            _resolve(future, error=e)
+
+
+def _new_poll_job(status_url, api_key, timeout, policy, endpoint):
+    now = time.monotonic()
+    return {
+        "status_url": status_url,
+        "headers": bria_json_headers(api_key),
+        "timeout": timeout,
+        "started": now,
+        "last_pending": now,
+        "deadline": now + timeout,
+        "policy": policy or IMAGE_POLLING_POLICY,
+        "endpoint": endpoint,
+        "attempt": 0,
+        "status": None,
+    }
+
+
+def _handle_status_response(job, response):
+    """
+    Interpret one status check for ``job``.
+
+    Returns ``(final_response, None)`` once the job is COMPLETED, otherwise ``(None, delay)`` with
+    the seconds to wait before the next check. Raises if the job failed or the check was rejected.
+    """
+    job["attempt"] += 1
+    policy = job["policy"]
+
+    if response.status_code in (429, 503) and _retry_after_seconds(response) is not None:
+        # Throttled status check: come back when the server asks us to.
+        return None, policy.next_delay(job["attempt"], response)
+    if response.status_code not in (200, 202):
+        raise Exception(f"Status check failed with status code {response.status_code}")
+
+    response_dict = response.json()
+    status = response_dict.get("status", "").upper()
+    if status == "COMPLETED":
+        # The job finished somewhere between the previous check and this one.
+        finished = (job["last_pending"] + time.monotonic()) / 2
+        record_completion_time(job["endpoint"], finished - job["started"])
+        return response_dict, None
+    if status == "ERROR":
+        raise Exception(f"Request failed: {response_dict}")
+
+    if status != job["status"]:
+        print(f"Status: {status}, waiting...")
+        job["status"] = status
+    job["last_pending"] = time.monotonic()
+    return None, policy.next_delay(job["attempt"], response, response_dict)
+
+
+def _resolve(future, result=None, error=None):
+    if future.cancelled() or future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+_status_poller = None
+_status_poller_lock = threading.Lock()
+
+
+def get_status_poller():
+    """Return the process-wide ``StatusPoller`` shared by all nodes."""
+    global _status_poller
+    with _status_poller_lock:
+        if _status_poller is None:
+            _status_poller = StatusPoller(max_parallel_checks=_env_int("BRIA_POLL_MAX_PARALLEL_CHECKS", 8))
+        return _status_poller
+
+
+def poll_status_until_completed(status_url, api_key, timeout=360, check_interval=None, policy=None, endpoint=None):
     """
     Poll a status URL until the status is COMPLETED or timeout is reached.
+
+    The status checks are made by the shared ``StatusPoller``; this call only waits for the
+    job's future.
     
     Args:
         status_url (str): The status URL to poll
         api_key (str): API token for authentication
         timeout (int): Maximum time to wait in seconds (default: 360)
-        check_interval (int): Time between checks in seconds (default: 2)
+        check_interval (int): Fixed time between checks in seconds; overrides ``policy`` when given
+        policy (PollingPolicy): Adaptive polling policy (default: IMAGE_POLLING_POLICY)
+        endpoint (str): API URL the job was submitted to, used to learn typical completion times
     
     Returns:
         dict: The final response containing the result
@@ -158,30 +955,737 @@ def poll_status_until_completed(status_url, api_key, timeout=360, check_interval
     Raises:
         Exception: If timeout is reached or API request fails
     """
-    start_time = time.time()
-    headers = bria_json_headers(api_key)
-    
-    while time.time() - start_time < timeout:
+    if check_interval is not None:
+        policy = PollingPolicy.fixed(check_interval)
+    with span("queue", endpoint=endpoint):
+        final_response = get_status_poller().track(status_url, api_key, timeout, policy, endpoint).result()
+    link_result_urls(final_response.get("result"), endpoint=endpoint, request_id=final_response.get("request_id"))
+    return final_response
+
+
+def submit_job(api_url, payload, api_key):
+    """
+    Submit an asynchronous (v2) request and return the parsed acceptance response.
+
+    Raises:
+        Exception: If the API rejects the request or does not return a status_url
+    """
+    with span("submit", endpoint=api_url) as record:
+        response = http_post(api_url, json=payload, headers=bria_json_headers(api_key))
+        if response.status_code not in (200, 202):
+            raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+
+        response_dict = response.json()
+        record["request_id"] = response_dict.get("request_id")
+        if not response_dict.get("status_url"):
+            raise Exception("No status_url returned from API")
+        return response_dict
+
+
+# Identical calls (same endpoint, payload and API key) that are in flight at the same time share
+# one submission and one result, e.g. two branches removing the background of the same image.
+_coalesce_settings = {
+    "enabled": os.environ.get("BRIA_COALESCE", "").strip().lower() not in ("0", "false", "no", "off"),
+}
+_singleflight = SingleFlight()
+
+
+def configure_coalescing(enabled=None):
+    if enabled is not None:
+        _coalesce_settings["enabled"] = bool(enabled)
+
+
+def coalesce(kind, api_url, payload, api_key, fn, *args, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` once for all concurrent callers making the same call; returns its result.
+
+    ``kind`` names what ``fn`` produces (``"job"``, ``"image"``, ...) so that different operations
+    on the same request are not mixed up; sync and async callers of one kind share a result.
+    """
+    if not _coalesce_settings["enabled"]:
+        return fn(*args, **kwargs)
+    return _singleflight.do(f"{kind}:{call_key(api_url, payload, api_key)}", fn, *args, **kwargs)
+
+
+async def async_coalesce(kind, api_url, payload, api_key, fn, *args, **kwargs):
+    """Coroutine version of ``coalesce`` for a coroutine function ``fn``."""
+    if not _coalesce_settings["enabled"]:
+        return await fn(*args, **kwargs)
+    return await _singleflight.do_async(f"{kind}:{call_key(api_url, payload, api_key)}", fn, *args, **kwargs)
+
+
+def run_job(api_url, payload, api_key, **poll_kwargs):
+    """Submit a v2 request and block until its status is COMPLETED; returns the final status payload."""
+    return run_journaled_job(api_url, payload, lambda: payload, api_key, **poll_kwargs)
+
+
+def bria_cache_dir():
+    """Directory for on-disk Bria state: ``BRIA_CACHE_DIR``, else ComfyUI's user directory, else ``~/.cache``."""
+    directory = os.environ.get("BRIA_CACHE_DIR", "").strip()
+    if not directory:
         try:
-            response = requests.get(status_url, headers=headers)            
-            if response.status_code == 200 or response.status_code == 202:
-                response_dict = response.json()
-                status = response_dict.get("status", "").upper()
-                
-                if status == "COMPLETED":
-                    return response_dict
-                elif status == "ERROR":
-                    raise Exception(f"Request failed: {response_dict}")
-                else:
-                    print(f"Status: {status}, waiting...")
-                    time.sleep(check_interval)
-            else:
-                raise Exception(f"Status check failed with status code {response.status_code}")
-                
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Error checking status: {e}")
-    
-    raise Exception(f"Timeout reached after {timeout} seconds")
+            import folder_paths
+            directory = os.path.join(folder_paths.get_user_directory(), "bria")
+        except (ImportError, AttributeError):
+            directory = os.path.join(os.path.expanduser("~"), ".cache", "comfyui-bria-api")
+    return directory
+
+
+# Result cache for deterministic (seeded) requests. Off by default: a hit skips the API entirely,
+# so it is only worth enabling for workflows that are re-queued with unchanged inputs.
+_result_cache_settings = {
+    "enabled": os.environ.get("BRIA_RESULT_CACHE", "").strip().lower() in ("1", "true", "yes", "on"),
+    "directory": os.environ.get("BRIA_RESULT_CACHE_DIR", "").strip() or None,
+    "max_mb": _env_float("BRIA_RESULT_CACHE_MAX_MB", 1024.0),
+    "ttl_hours": _env_float("BRIA_RESULT_CACHE_TTL_HOURS", 168.0),
+}
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def configure_result_cache(enabled=None, directory=None, max_mb=None, ttl_hours=None):
+    """Update the result cache settings; the cache is reopened with them on next use."""
+    global _result_cache
+    with _result_cache_lock:
+        if enabled is not None:
+            _result_cache_settings["enabled"] = bool(enabled)
+        if directory is not None:
+            _result_cache_settings["directory"] = directory
+        if max_mb is not None:
+            _result_cache_settings["max_mb"] = float(max_mb)
+        if ttl_hours is not None:
+            _result_cache_settings["ttl_hours"] = float(ttl_hours)
+        _result_cache = None
+
+
+def get_result_cache():
+    """Return the shared ``ResultCache``, or None while caching is disabled."""
+    global _result_cache
+    if not _result_cache_settings["enabled"]:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                _result_cache_settings["directory"] or os.path.join(bria_cache_dir(), "results"),
+                max_bytes=int(_result_cache_settings["max_mb"] * 1024 * 1024),
+                ttl=_result_cache_settings["ttl_hours"] * 3600,
+            )
+        return _result_cache
+
+
+# Submitted jobs are journaled on disk (request_id + status_url per input hash), so a job that
+# is still running when ComfyUI restarts is picked up again instead of being paid for twice.
+_journal_settings = {
+    "enabled": os.environ.get("BRIA_JOB_JOURNAL", "").strip().lower() not in ("0", "false", "no", "off"),
+    "max_hours": _env_float("BRIA_JOB_JOURNAL_MAX_HOURS", 24.0),
+}
+_job_journal = None
+_job_journal_lock = threading.Lock()
+
+
+def configure_job_journal(enabled=None, max_hours=None):
+    """Update the job journal settings; the journal is reopened with them on next use."""
+    global _job_journal
+    with _job_journal_lock:
+        if enabled is not None:
+            _journal_settings["enabled"] = bool(enabled)
+        if max_hours is not None:
+            _journal_settings["max_hours"] = float(max_hours)
+        _job_journal = None
+
+
+def get_job_journal():
+    """Return the shared ``JobJournal``, or None while it is disabled or cannot be opened."""
+    global _job_journal
+    if not _journal_settings["enabled"]:
+        return None
+    with _job_journal_lock:
+        if _job_journal is None:
+            try:
+                _job_journal = JobJournal(
+                    os.path.join(bria_cache_dir(), "jobs.sqlite3"), max_age=_journal_settings["max_hours"] * 3600
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"Bria job journal unavailable, jobs will not survive a restart: {e}")
+                _journal_settings["enabled"] = False
+                return None
+        return _job_journal
+
+
+def _journal_call(method, *args):
+    # The journal only protects against restarts; a failing journal must never fail the job.
+    journal = get_job_journal()
+    if journal is None:
+        return None
+    try:
+        return getattr(journal, method)(*args)
+    except sqlite3.Error as e:
+        print(f"Bria job journal {method} failed: {e}")
+        return None
+
+
+def _journal_submit(key, api_url, response_dict):
+    _journal_call(
+        "record_submit", key, api_url, response_dict.get("request_id"), response_dict["status_url"],
+        current_tags().get("node"),
+    )
+
+
+def _print_resume(entry):
+    minutes = (time.time() - entry["submitted_at"]) / 60
+    print(
+        f"Resuming Bria job {entry['request_id']} submitted {minutes:.0f} min ago "
+        f"(status URL {entry['status_url']}) instead of submitting it again"
+    )
+
+
+def run_journaled_job(api_url, inputs, make_payload, api_key, **poll_kwargs):
+    """
+    Like ``run_job``, but the job is identified by ``inputs`` rather than by its payload.
+
+    ``make_payload()`` is only called when a new job has to be submitted, so work such as uploading
+    the input video is skipped when a job with the same ``inputs`` (e.g. the local file's identity
+    plus the node parameters) is still in flight from before a restart.
+    """
+    return coalesce(
+        "job", api_url, inputs, api_key, _run_journaled_job, api_url, inputs, make_payload, api_key, **poll_kwargs
+    )
+
+
+def _run_journaled_job(api_url, inputs, make_payload, api_key, **poll_kwargs):
+    key = call_key(api_url, inputs, api_key)
+    entry = _journal_call("in_flight", key)
+    if entry is not None:
+        _print_resume(entry)
+        response_dict = entry
+    else:
+        response_dict = submit_job(api_url, make_payload(), api_key)
+        _journal_submit(key, api_url, response_dict)
+        print(f"Bria job {response_dict.get('request_id')} submitted to {api_url}, polling for completion...")
+    _report_job(response_dict)
+
+    poll_kwargs.setdefault("endpoint", api_url)
+    try:
+        with tagged(request_id=response_dict.get("request_id")):
+            final_response = poll_status_until_completed(response_dict["status_url"], api_key, **poll_kwargs)
+    except Exception:
+        _journal_call("finish", key, "failed")
+        raise
+    _journal_call("finish", key, "completed")
+    return final_response
+
+
+def run_image_job(api_url, payload, api_key, **poll_kwargs):
+    """
+    Run a v2 image request and download its result image.
+
+    Returns ``(result, image_bytes)`` where ``result`` is the ``result`` object of the final status
+    payload (``structured_prompt``, ``seed``, ...). With the result cache enabled, a request with
+    the same endpoint and payload (reference images compared by content, see ``result_cache_key``)
+    is answered from disk without any network call.
+    """
+    return coalesce("image", api_url, payload, api_key, _run_image_job, api_url, payload, api_key, **poll_kwargs)
+
+
+def _run_image_job(api_url, payload, api_key, **poll_kwargs):
+    cache = get_result_cache()
+    key = result_cache_key(api_url, payload) if cache is not None else None
+    if cache is not None:
+        hit = cache.get(key)
+        if hit is not None:
+            print(f"Bria result cache hit for {api_url}")
+            return hit
+
+    with tagged(endpoint=api_url):
+        final_response = run_job(api_url, payload, api_key, **poll_kwargs)
+        result = final_response.get("result", {})
+        image_bytes = download(result["image_url"])
+    if cache is not None:
+        try:
+            cache.put(key, result, image_bytes)
+        except OSError as e:
+            print(f"Could not write Bria result cache entry: {e}")
+    return result, image_bytes
+
+
+_batch_settings = {
+    "max_in_flight": _env_int("BRIA_BATCH_MAX_IN_FLIGHT", 8),
+    # Raise instead of substituting a node's fallback result (e.g. for unattended batch runs).
+    "strict": os.environ.get("BRIA_BATCH_STRICT", "").strip().lower() in ("1", "true", "yes", "on"),
+}
+
+
+def configure_batch(max_in_flight=None, strict=None):
+    """Update the default number of jobs a batch node keeps in flight at once and whether failures raise."""
+    if max_in_flight is not None:
+        _batch_settings["max_in_flight"] = max(1, int(max_in_flight))
+    if strict is not None:
+        _batch_settings["strict"] = bool(strict)
+
+
+def run_batch(items, process_item, on_error, max_in_flight=None):
+    """
+    Run ``process_item(idx, item)`` for every item concurrently and return the results in input order.
+
+    At most ``max_in_flight`` items are being submitted, polled or downloaded at the same time.
+    If an item raises, ``on_error(idx, item, error)`` supplies its result instead, so one failed
+    image never fails the whole batch; in strict mode (``configure_batch(strict=True)``) the
+    error is raised instead.
+    """
+    items = list(items)
+    limit = max_in_flight or _batch_settings["max_in_flight"]
+
+    def run_one(idx, item):
+        try:
+            return process_item(idx, item)
+        except Exception as e:
+            if _batch_settings["strict"]:
+                raise
+            return on_error(idx, item, e)
+
+    if len(items) <= 1 or limit <= 1:
+        return [run_one(idx, item) for idx, item in enumerate(items)]
+
+    with ThreadPoolExecutor(max_workers=min(limit, len(items))) as executor:
+        # Each worker runs in a copy of the caller's context so its spans keep the node tags.
+        futures = [
+            executor.submit(contextvars.copy_context().run, run_one, idx, item) for idx, item in enumerate(items)
+        ]
+        return [future.result() for future in futures]
+
+
+_job_handle = contextvars.ContextVar("bria_job_handle", default=None)
+
+
+class BriaJob:
+    """
+    Handle to a node execution running in the background (the ``BRIA_JOB`` socket type).
+
+    A submit node returns it once the API accepted the node's first job, so ``request_id`` and
+    ``status_url`` are set and the job is in the journal, where it can be resumed after a restart.
+    Nodes that start several jobs (batches, two-step refines) add the others as they are submitted.
+    Synchronous v1 endpoints only answer when the result is ready, so for them the handle is
+    returned as soon as the first request is sent, without a ``request_id``.
+    If the node finishes without submitting a job of its own (a result cache hit, or sharing an
+    identical in-flight request), the handle is returned when the node is done. ``result()``
+    waits for the node's output tuple, whose slots are described by ``return_types`` and ``return_names``.
+    """
+
+    def __init__(self, node, return_types, return_names):
+        self.node = node
+        self.return_types = tuple(return_types)
+        self.return_names = tuple(return_names or return_types)
+        self.submitted_at = time.time()
+        self.future = Future()
+        self._lock = threading.Lock()
+        self._jobs = []  # (request_id, status_url) of every API job the node started
+        self._accepted = threading.Event()  # set by the first submitted job or sent v1 request, or when the node ends
+
+    def _record(self, response_dict):
+        with self._lock:
+            self._jobs.append((response_dict.get("request_id"), response_dict.get("status_url")))
+        self._accepted.set()
+
+    @property
+    def request_ids(self):
+        with self._lock:
+            return [request_id for request_id, _ in self._jobs]
+
+    @property
+    def status_urls(self):
+        with self._lock:
+            return [status_url for _, status_url in self._jobs]
+
+    @property
+    def request_id(self):
+        request_ids = self.request_ids
+        return request_ids[0] if request_ids else None
+
+    @property
+    def status_url(self):
+        status_urls = self.status_urls
+        return status_urls[0] if status_urls else None
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def __repr__(self):
+        state = "done" if self.future.done() else "running"
+        return f"BriaJob({self.node}, request_id={self.request_id}, {state})"
+
+
+def _report_job(response_dict):
+    """Let the ``BriaJob`` whose node is running in this context know about a submitted job."""
+    handle = _job_handle.get()
+    if handle is not None:
+        handle._record(response_dict)
+
+
+def _report_dispatch(family):
+    """Count a synchronous (v1) request as accepted by the running ``BriaJob`` once it is sent."""
+    if family == "v1":
+        handle = _job_handle.get()
+        if handle is not None:
+            handle._accepted.set()
+
+
+_submit_executor = None
+_submit_executor_lock = threading.Lock()
+_failed_submits = {}  # submit key (e.g. node class and id) -> number of background executions that failed
+
+
+def _get_submit_executor():
+    global _submit_executor
+    with _submit_executor_lock:
+        if _submit_executor is None:
+            _submit_executor = ThreadPoolExecutor(
+                max_workers=_env_int("BRIA_SUBMIT_MAX_WORKERS", 32), thread_name_prefix="bria-submit"
+            )
+        return _submit_executor
+
+
+def submit_node_job(node, inputs, key=None):
+    """
+    Start ``node.execute(**inputs)`` on the shared submit pool and return its ``BriaJob``.
+
+    Returns as soon as the API accepted the node's first job (see ``BriaJob``), so a workflow can
+    start many jobs and wait for all of them at once (see ``BriaCollectNode``). An error before
+    that, such as a rejected v2 request, is raised here; v1 errors arrive with the result. The worker runs in a copy of the caller's
+    context with the handle attached, so the submitted jobs' request IDs are recorded on the
+    handle. Failures are counted under ``key`` (default: the node's class name).
+    """
+    node_name = type(node).__name__
+    key = key or node_name
+    handle = BriaJob(node_name, node.RETURN_TYPES, getattr(node, "RETURN_NAMES", None))
+
+    def run():
+        _job_handle.set(handle)
+        try:
+            result = node.execute(**inputs)
+        except BaseException as e:
+            with _submit_executor_lock:
+                _failed_submits[key] = _failed_submits.get(key, 0) + 1
+            print(f"Background {node_name} job failed: {e}")
+            handle.future.set_exception(e)
+        else:
+            handle.future.set_result(result)
+        finally:
+            handle._accepted.set()
+
+    _get_submit_executor().submit(contextvars.copy_context().run, run)
+    handle._accepted.wait()
+    if not handle.request_ids and handle.future.done() and handle.future.exception() is not None:
+        raise handle.future.exception()
+    return handle
+
+
+def failed_submit_count(key):
+    """How many background executions counted under ``key`` (see ``submit_node_job``) have failed so far."""
+    return _failed_submits.get(key, 0)
+
+
+class AsyncHttpResponse:
+    """The parts of a ``requests.Response`` the nodes rely on, read from an aiohttp response."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+_async_http_sessions = weakref.WeakKeyDictionary()  # event loop -> aiohttp.ClientSession
+
+
+def get_async_http_session():
+    """Return the ``aiohttp.ClientSession`` for the running event loop, sharing the pool settings."""
+    if aiohttp is None:
+        raise Exception("The async Bria helpers require aiohttp (installed with ComfyUI).")
+    loop = asyncio.get_running_loop()
+    session = _async_http_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=_http_settings["pool_connections"] * _http_settings["pool_maxsize"],
+            limit_per_host=_http_settings["pool_maxsize"],
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=_http_settings["connect_timeout"], sock_read=_http_settings["read_timeout"]
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _async_http_sessions[loop] = session
+    return session
+
+
+def _async_retryable_errors():
+    return (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+async def async_http_request(method, url, json=None, data=None, headers=None):
+    """Async counterpart of ``http_request``; the body is read fully before returning."""
+    session = get_async_http_session()
+    family = endpoint_family(url)
+    api_key = _api_token(headers)
+    idempotent = is_idempotent(method, url)
+    for attempt in range(_retry_policy.attempts):
+        last_attempt = attempt + 1 >= _retry_policy.attempts
+        breaker = _check_breaker(url)
+        try:
+            async with _rate_limiter.limit_async(api_key, family):
+                _report_dispatch(family)
+                async with session.request(method, url, json=json, data=data, headers=headers) as response:
+                    content = await response.read()
+                    result = AsyncHttpResponse(response.status, response.headers, content)
+        except _async_retryable_errors() as e:
+            breaker.record_failure()
+            if last_attempt or not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                raise
+            delay = _retry_policy.delay(attempt)
+            print(f"{method} {url} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        _record_status(breaker, result.status_code)
+        retry_after = _retry_after_seconds(result)
+        if result.status_code == 429:
+            _rate_limiter.throttled(api_key, family, retry_after or 1.0)
+        if last_attempt or not _retry_policy.should_retry_status(result.status_code, idempotent):
+            return result
+        delay = _retry_policy.delay(attempt, retry_after)
+        print(f"{method} {url} returned {result.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def async_http_get(url, **kwargs):
+    return await async_http_request("GET", url, **kwargs)
+
+
+async def async_http_post(url, **kwargs):
+    return await async_http_request("POST", url, **kwargs)
+
+
+async def async_http_put(url, **kwargs):
+    return await async_http_request("PUT", url, **kwargs)
+
+
+async def _async_download_once(url, max_bytes, timeout, progress, breaker):
+    async with get_async_http_session().get(url, timeout=timeout) as response:
+        _record_status(breaker, response.status)
+        if response.status != 200:
+            raise _AsyncDownloadStatus(response.status, _retry_after_seconds(response))
+        total = response.content_length
+        _download_limit(url, total, max_bytes)
+        reporter = _TransferProgress(total) if progress else None
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(_download_settings["chunk_size"]):
+            if len(buffer) + len(chunk) > max_bytes:
+                raise Exception(f"Download of {url} exceeded the {max_bytes} byte limit")
+            buffer += chunk
+            if reporter is not None:
+                reporter.update(len(buffer))
+        return buffer
+
+
+class _AsyncDownloadStatus(Exception):
+    def __init__(self, status, retry_after):
+        super().__init__(status)
+        self.status = status
+        self.retry_after = retry_after
+
+
+async def async_download(url, max_bytes=None, chunk_timeout=None, progress=True):
+    """Coroutine version of ``download`` (in-memory mode); returns a ``bytearray``."""
+    max_bytes = max_bytes or int(_download_settings["max_mb"] * 1024 * 1024)
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=_http_settings["connect_timeout"],
+        sock_read=chunk_timeout or _download_settings["chunk_timeout"],
+    )
+    with span("download", **url_tags(url)) as record:
+        for attempt in range(_retry_policy.attempts):
+            last_attempt = attempt + 1 >= _retry_policy.attempts
+            breaker = _check_breaker(url)
+            try:
+                buffer = await _async_download_once(url, max_bytes, timeout, progress, breaker)
+                break
+            except _AsyncDownloadStatus as e:
+                if last_attempt or not _retry_policy.should_retry_status(e.status, True):
+                    raise Exception(f"Failed to download {url}: {e.status}")
+                delay = _retry_policy.delay(attempt, e.retry_after)
+                print(f"Download of {url} returned {e.status}, retrying in {delay:.1f}s")
+            except _async_retryable_errors() as e:
+                breaker.record_failure()
+                if last_attempt:
+                    raise
+                delay = _retry_policy.delay(attempt)
+                print(f"Download of {url} was interrupted ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        record["bytes"] = len(buffer)
+    return buffer
+
+
+async def async_submit_job(api_url, payload, api_key):
+    """Coroutine version of ``submit_job``."""
+    with span("submit", endpoint=api_url) as record:
+        response = await async_http_post(api_url, json=payload, headers=bria_json_headers(api_key))
+        if response.status_code not in (200, 202):
+            raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+
+        response_dict = response.json()
+        record["request_id"] = response_dict.get("request_id")
+        if not response_dict.get("status_url"):
+            raise Exception("No status_url returned from API")
+        return response_dict
+
+
+async def async_poll_status_until_completed(status_url, api_key, timeout=360, policy=None, endpoint=None):
+    """Coroutine version of ``poll_status_until_completed``; waits with ``asyncio.sleep`` between checks."""
+    job = _new_poll_job(status_url, api_key, timeout, policy, endpoint)
+    with span("queue", endpoint=endpoint):
+        await asyncio.sleep(job["policy"].first_delay_for(endpoint))
+        while time.monotonic() < job["deadline"]:
+            try:
+                response = await async_http_get(status_url, headers=job["headers"])
+            except aiohttp.ClientError as e:
+                raise Exception(f"Error checking status: {e}")
+            final_response, next_delay = _handle_status_response(job, response)
+            if final_response is not None:
+                link_result_urls(
+                    final_response.get("result"), endpoint=endpoint, request_id=final_response.get("request_id")
+                )
+                return final_response
+            await asyncio.sleep(next_delay)
+
+        raise Exception(f"Timeout reached after {timeout} seconds")
+
+
+async def async_run_job(api_url, payload, api_key, **poll_kwargs):
+    """Coroutine version of ``run_job``."""
+    return await async_coalesce(
+        "job", api_url, payload, api_key, _async_run_journaled_job, api_url, payload, lambda: payload, api_key,
+        **poll_kwargs
+    )
+
+
+async def _async_run_journaled_job(api_url, inputs, make_payload, api_key, **poll_kwargs):
+    key = call_key(api_url, inputs, api_key)
+    entry = await asyncio.to_thread(_journal_call, "in_flight", key)
+    if entry is not None:
+        _print_resume(entry)
+        response_dict = entry
+    else:
+        response_dict = await async_submit_job(api_url, make_payload(), api_key)
+        await asyncio.to_thread(_journal_submit, key, api_url, response_dict)
+        print(f"Bria job {response_dict.get('request_id')} submitted to {api_url}, polling for completion...")
+    _report_job(response_dict)
+
+    poll_kwargs.setdefault("endpoint", api_url)
+    try:
+        with tagged(request_id=response_dict.get("request_id")):
+            final_response = await async_poll_status_until_completed(response_dict["status_url"], api_key, **poll_kwargs)
+    except Exception:
+        await asyncio.to_thread(_journal_call, "finish", key, "failed")
+        raise
+    await asyncio.to_thread(_journal_call, "finish", key, "completed")
+    return final_response
+
+
+async def async_run_image_job(api_url, payload, api_key, **poll_kwargs):
+    """Coroutine version of ``run_image_job``; cache reads and writes run in a worker thread."""
+    return await async_coalesce(
+        "image", api_url, payload, api_key, _async_run_image_job, api_url, payload, api_key, **poll_kwargs
+    )
+
+
+async def _async_run_image_job(api_url, payload, api_key, **poll_kwargs):
+    cache = get_result_cache()
+    key = result_cache_key(api_url, payload) if cache is not None else None
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.get, key)
+        if hit is not None:
+            print(f"Bria result cache hit for {api_url}")
+            return hit
+
+    with tagged(endpoint=api_url):
+        final_response = await async_run_job(api_url, payload, api_key, **poll_kwargs)
+        result = final_response.get("result", {})
+        image_bytes = await async_download(result["image_url"])
+    if cache is not None:
+        try:
+            await asyncio.to_thread(cache.put, key, result, image_bytes)
+        except OSError as e:
+            print(f"Could not write Bria result cache entry: {e}")
+    return result, image_bytes
+
+
+async def async_run_batch(items, process_item, on_error, max_in_flight=None):
+    """Coroutine version of ``run_batch``; ``process_item`` is a coroutine function."""
+    semaphore = asyncio.Semaphore(max_in_flight or _batch_settings["max_in_flight"])
+
+    async def run_one(idx, item):
+        async with semaphore:
+            try:
+                return await process_item(idx, item)
+            except Exception as e:
+                if _batch_settings["strict"]:
+                    raise
+                return on_error(idx, item, e)
+
+    return list(await asyncio.gather(*(run_one(idx, item) for idx, item in enumerate(items))))
+
+
+def _async_nodes_enabled():
+    setting = os.environ.get("BRIA_ASYNC_NODES", "").strip().lower()
+    if setting in ("0", "false", "no", "off"):
+        return False
+    if setting in ("1", "true", "yes", "on"):
+        return True
+    # Only ComfyUI builds whose executor awaits coroutine node functions can take an async FUNCTION.
+    execution = sys.modules.get("execution")
+    return execution is not None and hasattr(execution, "_async_map_node_over_list")
+
+
+def _tag_node(method, node_name):
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with tagged(node=node_name):
+                return await method(self, *args, **kwargs)
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with tagged(node=node_name):
+                return method(self, *args, **kwargs)
+    return wrapper
+
+
+def async_node(node_cls):
+    """
+    Class decorator giving an API node an ``execute_async`` coroutine.
+
+    Nodes that define their own ``execute_async`` run natively on the async helpers above; for the
+    rest the synchronous ``execute`` runs in a worker thread. When the running ComfyUI awaits node
+    functions, ``FUNCTION`` points at the coroutine so independent Bria nodes overlap their network
+    waits instead of running back to back.
+    """
+    if "execute_async" not in node_cls.__dict__:
+        async def execute_async(self, *args, **kwargs):
+            return await asyncio.to_thread(self.execute, *args, **kwargs)
+
+        node_cls.execute_async = execute_async
+    # Tag every span opened while the node runs with its class name.
+    node_cls.execute = _tag_node(node_cls.execute, node_cls.__name__)
+    node_cls.execute_async = _tag_node(node_cls.execute_async, node_cls.__name__)
+    if _async_nodes_enabled():
+        node_cls.FUNCTION = "execute_async"
+    return node_cls
 
 
 def normalize_images_input(images):
@@ -268,7 +1772,7 @@ def upload_pil_image_to_temp(pil_image, api_token, file_name=None):
     to_save.save(buf, format=pil_format, **save_kwargs)
     buf.seek(0)
     image_bytes = buf.read()
-    response = requests.post(api_url, json=payload, headers=headers)
+    response = http_post(api_url, json=payload, headers=headers)
     if response.status_code != 200:
         raise Exception(f"Failed to get image presigned URL: {response.status_code} {response.text}")
 
@@ -279,12 +1783,88 @@ def upload_pil_image_to_temp(pil_image, api_token, file_name=None):
     if not image_url or not upload_url:
         raise Exception(f"Invalid response from image presigned URL API: {response_data}")
 
-    upload_response = requests.put(
-        upload_url,
-        data=image_bytes,
-        headers={"Content-Type": content_type},
-    )
-    if upload_response.status_code not in (200, 204):
-        raise Exception(f"Failed to upload image to S3: {upload_response.status_code}")
+    with span("upload", bytes=len(image_bytes)):
+        upload_response = http_put(
+            upload_url,
+            data=image_bytes,
+            headers={"Content-Type": content_type},
+        )
+        if upload_response.status_code not in (200, 204):
+            raise Exception(f"Failed to upload image to S3: {upload_response.status_code}")
+
+    return image_url
+
+
+# Reference images (brand references, style images) are typically reused across many calls.
+# Instead of inlining their base64 in every payload they are uploaded once to the temp bucket
+# and the URL is sent while it is still valid.
+_reference_settings = {
+    "enabled": os.environ.get("BRIA_REFERENCE_UPLOADS", "").strip().lower() not in ("0", "false", "no", "off"),
+    "ttl_minutes": _env_float("BRIA_REFERENCE_TTL_MINUTES", 60.0),
+}
+_reference_store = None
+_reference_store_lock = threading.Lock()
+
+
+def configure_reference_uploads(enabled=None, ttl_minutes=None):
+    """Update the reference upload settings; the store is reopened with them on next use."""
+    global _reference_store
+    with _reference_store_lock:
+        if enabled is not None:
+            _reference_settings["enabled"] = bool(enabled)
+        if ttl_minutes is not None:
+            _reference_settings["ttl_minutes"] = float(ttl_minutes)
+        _reference_store = None
+
 
-    return image_url
\ No newline at end of file
+def get_reference_store():
+    """Return the shared ``ReferenceStore`` (persisted under ``bria_cache_dir()``)."""
+    global _reference_store
+    with _reference_store_lock:
+        if _reference_store is None:
+            _reference_store = ReferenceStore(
+                ttl=_reference_settings["ttl_minutes"] * 60,
+                path=os.path.join(bria_cache_dir(), "references.json"),
+            )
+        return _reference_store
+
+
+def _with_reference_digests(value, store):
+    if isinstance(value, str):
+        digest = store.digest_for(value)
+        return value if digest is None else {"reference_digest": digest}
+    if isinstance(value, dict):
+        return {key: _with_reference_digests(item, store) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_with_reference_digests(item, store) for item in value]
+    return value
+
+
+def result_cache_key(api_url, payload):
+    """
+    ``request_fingerprint`` of a request, with uploaded reference URLs replaced by the image digest.
+
+    A reference is re-uploaded to a new temp URL once per TTL; keying on the content keeps the same
+    request a cache hit across uploads.
+    """
+    if _reference_settings["enabled"]:
+        payload = _with_reference_digests(payload, get_reference_store())
+    return request_fingerprint(api_url, payload)
+
+
+def reference_image_input(pil_image, api_token):
+    """
+    Return what to send for a reference image: its temp URL, uploaded at most once per TTL.
+
+    Falls back to inline base64 when reference uploads are disabled or the upload fails, so the
+    request itself never fails because of the upload path.
+    """
+    if _reference_settings["enabled"]:
+        try:
+            return get_reference_store().url_for(
+                pil_image,
+                lambda image: upload_pil_image_to_temp(image, api_token, file_name=f"{uuid.uuid4()}_reference.png"),
+            )
+        except Exception as e:
+            print(f"Reference upload failed, sending the image inline: {e}")
+    return image_to_base64(pil_image)
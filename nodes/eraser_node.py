@@ -1,5 +1,6 @@
-from .common import process_request
+from .common import async_process_request, process_request, async_node
 
+@async_node
 class EraserNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -12,6 +13,9 @@ class EraserNode():
             "optional": {
                 "visual_input_content_moderation": ("BOOLEAN", {"default": False}), 
                 "visual_output_content_moderation": ("BOOLEAN", {"default": False}), 
+                "crop_to_mask": ("BOOLEAN", {"default": False}),  # Send only the area around the mask
+                "crop_margin": ("INT", {"default": 64, "min": 0, "max": 2048}),
+                "crop_feather": ("INT", {"default": 8, "min": 0, "max": 256}),
             }
         }
 
@@ -24,6 +28,16 @@ class EraserNode():
         self.api_url = "https://engine.prod.bria-api.com/v2/image/edit/erase"  # Eraser API URL
 
     # Define the execute method as expected by ComfyUI
-    def execute(self, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation):
-        return process_request(self.api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation)
-    
\ No newline at end of file
+    def execute(self, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+                crop_to_mask=False, crop_margin=64, crop_feather=8):
+        return process_request(
+            self.api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+            crop_to_mask, crop_margin, crop_feather,
+        )
+
+    async def execute_async(self, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+                            crop_to_mask=False, crop_margin=64, crop_feather=8):
+        return await async_process_request(
+            self.api_url, image, mask, api_key, visual_input_content_moderation, visual_output_content_moderation,
+            crop_to_mask, crop_margin, crop_feather,
+        )
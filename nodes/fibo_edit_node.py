@@ -1,16 +1,18 @@
-import requests
+import asyncio
 import torch
 
 from .common import (
-    bria_json_headers,
+    async_node,
+    async_run_image_job,
     image_to_base64,
-    poll_status_until_completed,
     preprocess_image,
     preprocess_mask,
     postprocess_image,
+    run_image_job,
 )
 
 
+@async_node
 class FIBOEditNode:
     """FIBO Edit Node - Edit images with instructions"""
 
@@ -75,7 +77,7 @@ class FIBOEditNode:
             processed_images = images
 
         payload = {
-            "images": [image_to_base64(processed_images)],
+            "images": [image_to_base64(processed_images, endpoint=self.api_url)],
             "steps_num": steps_num,
             "guidance_scale": guidance_scale,
             "seed": seed,
@@ -124,39 +126,36 @@ class FIBOEditNode:
             guidance_scale,
             seed,
         )
-        headers = bria_json_headers(api_token)
+        print(f"Requesting edit from {self.api_url}...")
+        result, image_bytes = run_image_job(self.api_url, payload, api_token)
+        result_image = postprocess_image(image_bytes)
 
-        try:
-            response = requests.post(self.api_url, json=payload, headers=headers)
+        return (result_image, result.get("structured_prompt", ""), result.get("seed"))
 
-            if response.status_code in (200, 202):
-                print(
-                    f"Initial request successful to {self.api_url}, polling for completion..."
-                )
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                request_id = response_dict.get("request_id")
-
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-
-                result = final_response.get("result", {})
-                result_image_url = result.get("image_url")
-                structured_prompt = result.get("structured_prompt", "")
-                used_seed = result.get("seed")
-
-                image_response = requests.get(result_image_url)
-                result_image = postprocess_image(image_response.content)
-
-                return (result_image, structured_prompt, used_seed)
-
-            raise Exception(
-                f"Error: API request failed with status code {response.status_code} {response.text}"
-            )
-
-        except Exception as e:
-            raise Exception(f"{e}")
\ No newline at end of file
+    async def execute_async(
+        self,
+        api_token,
+        instruction,
+        images,
+        mask=None,
+        structured_instruction=None,
+        negative_prompt=None,
+        steps_num=50,
+        guidance_scale=5,
+        seed=123456,
+    ):
+        self._validate_token(api_token)
+        payload = await asyncio.to_thread(
+            self._build_payload,
+            instruction,
+            images,
+            mask,
+            structured_instruction,
+            negative_prompt,
+            steps_num,
+            guidance_scale,
+            seed,
+        )
+        result, image_bytes = await async_run_image_job(self.api_url, payload, api_token)
+        result_image = await asyncio.to_thread(postprocess_image, image_bytes)
+        return (result_image, result.get("structured_prompt", ""), result.get("seed"))
@@ -1,12 +1,13 @@
-import requests
 from .common import (
-    bria_json_headers,
+    async_node,
     image_to_base64,
     normalize_images_input,
-    poll_status_until_completed,
+    run_batch,
+    run_job,
 )
 
 
+@async_node
 class FIBOEditStructuredInstructionNode:
     """FIBO Edit Structured Instruction Node - Generate structured instructions for image editing"""
 
@@ -34,7 +35,7 @@ class FIBOEditStructuredInstructionNode:
     def _build_payload(self, processed_image, instruction):
         payload = {
             "instruction": instruction,
-            "images": [image_to_base64(processed_image)],
+            "images": [image_to_base64(processed_image, endpoint=self.api_url)],
         }
         return payload
 
@@ -43,32 +44,19 @@ class FIBOEditStructuredInstructionNode:
         # Normalize input to list of PIL images
         images = normalize_images_input(images)
 
-        batch_results = []
+        def process_image(idx, pil_image):
+            payload = self._build_payload(pil_image, instruction)
 
-        for idx, pil_image in enumerate(images):
-            try:
-                payload = self._build_payload(pil_image, instruction)
-                headers = bria_json_headers(api_token)
+            print(f"FIBOEditStructuredInstructionNode - Requesting image {idx}...")
+            final_response = run_job(self.api_url, payload, api_token)
+            result = final_response.get("result", {})
+            return result.get("structured_instruction", "")
 
-                response = requests.post(self.api_url, json=payload, headers=headers)
+        def on_error(idx, pil_image, error):
+            print(f"[FIBOEditStructuredInstructionNode] Skipping image {idx} due to error: {error}")
+            return ""
 
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                print(f"Initial request successful for image {idx}, polling for completion...")
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-                result = final_response.get("result", {})
-                structured_instruction = result.get("structured_instruction", "")
-                batch_results.append(structured_instruction)
-
-            except Exception as e:
-                print(f"[FIBOEditStructuredInstructionNode] Skipping image {idx} due to error: {e}")
-                batch_results.append("")
+        batch_results = run_batch(images, process_image, on_error)
 
         combined_instructions = "\n---\n".join(batch_results)
         return (combined_instructions,)
\ No newline at end of file
@@ -1,12 +1,14 @@
-import requests
 import torch
 from .common import (
-    bria_json_headers,
+    async_node,
+    download,
     image_to_base64,
     normalize_images_input,
-    poll_status_until_completed,
     postprocess_image,
+    run_batch,
+    run_job,
 )
+@async_node
 class GenerateImageLiteNodeV2:
     """Lite Image Generation Node (multi-image compatible)"""
 
@@ -64,7 +66,7 @@ class GenerateImageLiteNodeV2:
         if structured_prompt:
             payload["structured_prompt"] = structured_prompt
         if processed_image is not None:
-            payload["images"] = [image_to_base64(processed_image)]
+            payload["images"] = [image_to_base64(processed_image, endpoint=self.api_url)]
         return payload
 
     def execute(
@@ -100,55 +102,37 @@ class GenerateImageLiteNodeV2:
         if len(seed_values) < len(images_list):
             seed_values += [seed_values[-1]] * (len(images_list) - len(seed_values))
 
-        batch_results = []
-        batch_structured_prompts = []
-        batch_seeds = []
-
-        for idx, ref_image in enumerate(images_list):
-            try:
-
-                payload = self._build_payload(
-                    prompt,
-                    model_version,
-                    structured_prompts_list[idx],
-                    aspect_ratio,
-                    steps_num,
-                    guidance_scale,
-                    seed_values[idx],
-                    ref_image,
-                )
-
-                headers = bria_json_headers(api_token)
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(
-                        f"API request failed with status code {response.status_code}: {response.text}"
-                    )
-
-                print(f"GenerateImageLiteNodeV2 - Initial request successful for image {idx}, polling for completion...")
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-                result = final_response.get("result", {})
-                result_image_url = result.get("image_url")
-                structured_prompt_result = result.get("structured_prompt", "")
-                used_seed = result.get("seed", seed_values[idx])
-
-                image_response = requests.get(result_image_url)
-                result_image = postprocess_image(image_response.content)
-
-                batch_results.append(result_image)
-                batch_structured_prompts.append(structured_prompt_result)
-                batch_seeds.append(str(used_seed))
-
-            except Exception as e:
-                print(f"[GenerateImageLiteNodeV2] Skipping iteration {idx} due to error: {e}")
-                batch_results.append(torch.zeros((1, 512, 512, 3), dtype=torch.float32))
-                batch_structured_prompts.append("")
-                batch_seeds.append(str(seed_values[idx]))
+        def process_image(idx, ref_image):
+            payload = self._build_payload(
+                prompt,
+                model_version,
+                structured_prompts_list[idx],
+                aspect_ratio,
+                steps_num,
+                guidance_scale,
+                seed_values[idx],
+                ref_image,
+            )
+
+            print(f"GenerateImageLiteNodeV2 - Requesting image {idx}...")
+            final_response = run_job(self.api_url, payload, api_token)
+            result = final_response.get("result", {})
+            result_image_url = result.get("image_url")
+            structured_prompt_result = result.get("structured_prompt", "")
+            used_seed = result.get("seed", seed_values[idx])
+
+            image_bytes = download(result_image_url)
+            result_image = postprocess_image(image_bytes)
+            return result_image, structured_prompt_result, str(used_seed)
+
+        def on_error(idx, ref_image, error):
+            print(f"[GenerateImageLiteNodeV2] Skipping iteration {idx} due to error: {error}")
+            return torch.zeros((1, 512, 512, 3), dtype=torch.float32), "", str(seed_values[idx])
+
+        outcomes = run_batch(images_list, process_image, on_error)
+        batch_results = [result for result, _, _ in outcomes]
+        batch_structured_prompts = [structured_prompt_result for _, structured_prompt_result, _ in outcomes]
+        batch_seeds = [used_seed for _, _, used_seed in outcomes]
 
         output_batch = torch.cat(batch_results, dim=0)
         combined_structured_prompts = "\n---\n".join(batch_structured_prompts)
@@ -1,13 +1,14 @@
-import requests
 
 from .common import (
-    bria_json_headers,
+    async_node,
     image_to_base64,
     normalize_images_input,
-    poll_status_until_completed,
+    run_batch,
+    run_job,
 )
 
 
+@async_node
 class GenerateStructuredPromptNodeV2:
     """Structured Prompt Generation Node (multi-image compatible)"""
 
@@ -41,7 +42,7 @@ class GenerateStructuredPromptNodeV2:
         if structured_prompt:
             payload["structured_prompt"] = structured_prompt
         if processed_image is not None:
-            payload["images"] = [image_to_base64(processed_image)]
+            payload["images"] = [image_to_base64(processed_image, endpoint=self.api_url)]
         return payload
 
     def execute(self, api_token, prompt, seed, structured_prompt, images=None):
@@ -66,46 +67,28 @@ class GenerateStructuredPromptNodeV2:
         if len(structured_prompts_list) < len(images_list):
             structured_prompts_list += [structured_prompts_list[-1]] * (len(images_list) - len(structured_prompts_list))
 
-        batch_structured_prompts = []
-        batch_seeds = []
-
-        for idx, image in enumerate(images_list):
-            try:
-
-                payload = self._build_payload(
-                    prompt,
-                    seed_values[idx],
-                    structured_prompts_list[idx],
-                    image
-                )
-
-                headers = bria_json_headers(api_token)
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(
-                        f"API request failed with status code {response.status_code}: {response.text}"
-                    )
-
-                response_dict = response.json()
-                print(f"GenerateStructuredPromptNodeV2 - Initial request successful for image {idx}, polling for completion...")
-
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-
-                result = final_response.get("result", {})
-                structured_prompt_result = result.get("structured_prompt", "")
-                used_seed = result.get("seed", seed_values[idx])
-
-                batch_structured_prompts.append(structured_prompt_result)
-                batch_seeds.append(str(used_seed))  # Keep as string for passing between nodes
-
-            except Exception as e:
-                print(f"[GenerateStructuredPromptNodeV2] Skipping iteration {idx} due to error: {e}")
-                batch_structured_prompts.append("")
-                batch_seeds.append(str(seed_values[idx]))
+        def process_image(idx, image):
+            payload = self._build_payload(
+                prompt,
+                seed_values[idx],
+                structured_prompts_list[idx],
+                image,
+            )
+
+            print(f"GenerateStructuredPromptNodeV2 - Requesting image {idx}...")
+            final_response = run_job(self.api_url, payload, api_token)
+            result = final_response.get("result", {})
+            structured_prompt_result = result.get("structured_prompt", "")
+            used_seed = result.get("seed", seed_values[idx])
+            return structured_prompt_result, str(used_seed)  # Keep seed as string for passing between nodes
+
+        def on_error(idx, image, error):
+            print(f"[GenerateStructuredPromptNodeV2] Skipping iteration {idx} due to error: {error}")
+            return "", str(seed_values[idx])
+
+        outcomes = run_batch(images_list, process_image, on_error)
+        batch_structured_prompts = [structured_prompt_result for structured_prompt_result, _ in outcomes]
+        batch_seeds = [used_seed for _, used_seed in outcomes]
 
         # Return combined structured prompts and seeds as strings
         combined_prompts = "\n---\n".join(batch_structured_prompts)
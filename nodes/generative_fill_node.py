@@ -1,18 +1,23 @@
-import numpy as np
-import requests
-from PIL import Image
-import io
+import asyncio
 import torch
 
 from .common import (
-    bria_json_headers,
+    async_download,
+    async_node,
+    async_run_job,
+    download,
     image_to_base64,
-    poll_status_until_completed,
+    mask_crop_region,
+    paste_mask_result,
+    postprocess_image,
     preprocess_image,
     preprocess_mask,
+    run_job,
 )
+from .utils.mask_crop import crop
 
 
+@async_node
 class GenFillNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -28,8 +33,9 @@ class GenFillNode():
                 "prompt_content_moderation": ("BOOLEAN", {"default": True}), 
                 "visual_input_content_moderation": ("BOOLEAN", {"default": False}), 
                 "visual_output_content_moderation": ("BOOLEAN", {"default": False}), 
-
-
+                "crop_to_mask": ("BOOLEAN", {"default": False}),  # Send only the area around the mask
+                "crop_margin": ("INT", {"default": 64, "min": 0, "max": 2048}),
+                "crop_feather": ("INT", {"default": 8, "min": 0, "max": 256}),
             }
         }
 
@@ -41,10 +47,7 @@ class GenFillNode():
     def __init__(self):
         self.api_url = "https://engine.prod.bria-api.com/v2/image/edit/gen_fill"
 
-    # Define the execute method as expected by ComfyUI
-    def execute(self, image, mask, prompt, api_key, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation):
-        if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
-            raise Exception("Please insert a valid API key.")
+    def _build_payload(self, image, mask, prompt, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation):
         # Check if image and mask are tensors, if so, convert to NumPy arrays
         if isinstance(image, torch.Tensor):
             image = preprocess_image(image)
@@ -52,11 +55,11 @@ class GenFillNode():
             mask = preprocess_mask(mask)
 
         # Convert the image and mask directly to Base64 strings
-        image_base64 = image_to_base64(image)
+        image_base64 = image_to_base64(image, endpoint=self.api_url)
         mask_base64 = image_to_base64(mask)
 
         # Prepare the API request payload
-        payload = {
+        return {
             "image": image_base64,
             "mask": mask_base64,
             "prompt": prompt,
@@ -68,33 +71,38 @@ class GenFillNode():
             "version": 2
         }
 
-        headers = bria_json_headers(api_key)
+    # Define the execute method as expected by ComfyUI
+    def execute(self, image, mask, prompt, api_key, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation,
+                crop_to_mask=False, crop_margin=64, crop_feather=8):
+        if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
+            raise Exception("Please insert a valid API key.")
+        box = mask_crop_region(image, mask, crop_margin) if crop_to_mask else None
+        image_in, mask_in = crop(image, mask, box) if box is not None else (image, mask)
+        payload = self._build_payload(
+            image_in, mask_in, prompt, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation
+        )
 
         try:
-            # Send initial request to get status URL
-            response = requests.post(self.api_url, json=payload, headers=headers)
-            
-            if response.status_code == 200 or response.status_code == 202:
-                print('Initial genfill request successful, polling for completion...')
-                response_dict = response.json()
-                status_url = response_dict.get('status_url')
-                request_id = response_dict.get('request_id')
-                
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-                
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-                
-                final_response = poll_status_until_completed(status_url, api_key)                
-                result_image_url = final_response['result']['image_url']
-                image_response = requests.get(result_image_url)
-                result_image = Image.open(io.BytesIO(image_response.content))
-                result_image = result_image.convert("RGB")
-                result_image = np.array(result_image).astype(np.float32) / 255.0
-                result_image = torch.from_numpy(result_image)[None,]
-                return (result_image,)
-            else:
-                raise Exception(f"Error: API request failed with status code {response.status_code} {response.text}")
+            # run_job journals the job and shares it with identical concurrent requests
+            final_response = run_job(self.api_url, payload, api_key)
+            result_image_url = final_response['result']['image_url']
+            image_bytes = download(result_image_url)
+            return (paste_mask_result(image, mask, box, postprocess_image(image_bytes), crop_feather),)
 
         except Exception as e:
             raise Exception(f"{e}")
+
+    async def execute_async(self, image, mask, prompt, api_key, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation,
+                            crop_to_mask=False, crop_margin=64, crop_feather=8):
+        if api_key.strip() == "" or api_key.strip() == "BRIA_API_TOKEN":
+            raise Exception("Please insert a valid API key.")
+        box = mask_crop_region(image, mask, crop_margin) if crop_to_mask else None
+        image_in, mask_in = crop(image, mask, box) if box is not None else (image, mask)
+        payload = await asyncio.to_thread(
+            self._build_payload,
+            image_in, mask_in, prompt, seed, prompt_content_moderation, visual_input_content_moderation, visual_output_content_moderation,
+        )
+        final_response = await async_run_job(self.api_url, payload, api_key)
+        image_bytes = await async_download(final_response['result']['image_url'])
+        result = await asyncio.to_thread(postprocess_image, image_bytes)
+        return (await asyncio.to_thread(paste_mask_result, image, mask, box, result, crop_feather),)
@@ -1,16 +1,16 @@
-import io
-import requests
 import numpy as np
-from PIL import Image
 import torch
 
 from .common import (
-    bria_json_headers,
+    async_node,
+    decode_image,
     image_to_base64,
     normalize_images_input,
-    poll_status_until_completed,
+    run_batch,
+    run_image_job,
 )
 
+@async_node
 class ImageEnhanceNode():
     @classmethod
     def INPUT_TYPES(cls):
@@ -54,56 +54,33 @@ class ImageEnhanceNode():
         # Normalize input to list of PIL images
         images = normalize_images_input(images)
 
-        batch_results = []
-        batch_seeds = []
-
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
-
-                payload = {
-                    "image": image_base64,
-                    "visual_input_content_moderation": visual_input_content_moderation,
-                    "visual_output_content_moderation": visual_output_content_moderation,
-                    "seed": seed,
-                    "steps_num": steps_num,
-                    "resolution": resolution,
-                    "preserve_alpha": preserve_alpha
-                }
-
-                headers = bria_json_headers(api_key)
-
-                # Send request
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                # Poll until completion
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
+        def process_image(idx, pil_image):
+            payload = {
+                "image": image_to_base64(pil_image, endpoint=self.api_url),
+                "visual_input_content_moderation": visual_input_content_moderation,
+                "visual_output_content_moderation": visual_output_content_moderation,
+                "seed": seed,
+                "steps_num": steps_num,
+                "resolution": resolution,
+                "preserve_alpha": preserve_alpha
+            }
 
-                print(f"ImageEnhanceNode - Initial request successful for image {idx}, polling for completion...")
-                final_response = poll_status_until_completed(status_url, api_key)
-                result_image_url = final_response["result"]["image_url"]
-                used_seed = final_response["result"].get("seed", seed)
+            print(f"ImageEnhanceNode - Requesting image {idx}...")
+            result, image_bytes = run_image_job(self.api_url, payload, api_key)
+            used_seed = result.get("seed", seed)
 
-                # Download and process image
-                image_response = requests.get(result_image_url)
-                result_image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-                result_array = np.array(result_image).astype(np.float32) / 255.0
-                result_tensor = torch.from_numpy(result_array)  # shape: (H,W,C)
+            # Decode the downloaded (or cached) image
+            return decode_image(image_bytes), used_seed  # shape: (H,W,C)
 
-                batch_results.append(result_tensor)
-                batch_seeds.append(used_seed)
+        def on_error(idx, pil_image, error):
+            print(f"[ImageEnhanceNode] Skipping image {idx} due to error: {error}")
+            # Fallback tensor with same size as input
+            fallback_array = np.array(pil_image).astype(np.float32) / 255.0
+            return torch.from_numpy(fallback_array), seed
 
-            except Exception as e:
-                print(f"[ImageEnhanceNode] Skipping image {idx} due to error: {e}")
-                # Append fallback tensor with same size as input
-                fallback_array = np.array(pil_image).astype(np.float32) / 255.0
-                batch_results.append(torch.from_numpy(fallback_array))
-                batch_seeds.append(seed)
+        outcomes = run_batch(images, process_image, on_error)
+        batch_results = [result for result, _ in outcomes]
+        batch_seeds = [used_seed for _, used_seed in outcomes]
 
         # Return list of tensors (not concatenated) + comma-separated seeds
         combined_seeds = ",".join(map(str, batch_seeds))
@@ -1,15 +1,19 @@
-import io
-import requests
 import numpy as np
-from PIL import Image
 import torch
+from PIL import Image
 
 from .common import (
-    bria_json_headers,
+    async_node,
+    decode_image,
+    download,
     image_to_base64,
+    limit_input_resolution,
     normalize_images_input,
-    poll_status_until_completed,
+    restore_resolution,
+    run_batch,
+    run_job,
 )
+@async_node
 class ImageExpansionNode():
     @classmethod
     def INPUT_TYPES(cls):
@@ -41,6 +45,32 @@ class ImageExpansionNode():
     def __init__(self):
         self.api_url = "https://engine.prod.bria-api.com/v2/image/edit/expand"
 
+    @staticmethod
+    def _restore_canvas(result, pil_image, canvas_size, original_image_size, original_image_location):
+        """
+        Bring the result of a downscaled request back to the requested canvas size.
+
+        The generated canvas is upsampled and the original full-resolution pixels are pasted back
+        where the image was placed, so only the new areas are upscaled.
+        """
+        width, height = canvas_size
+        result = restore_resolution(result, canvas_size)
+        if len(original_image_location) != 2:
+            return result
+
+        size = tuple(original_image_size) if len(original_image_size) == 2 else pil_image.size
+        original = pil_image.convert("RGB")
+        if original.size != size:
+            original = original.resize(size, Image.LANCZOS)
+        pixels = torch.from_numpy(np.array(original)).float().div_(255.0)
+        x, y = original_image_location
+        # Clip the pasted area to the canvas
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(width, x + size[0]), min(height, y + size[1])
+        if x1 > x0 and y1 > y0:
+            result[y0:y1, x0:x1, :3] = pixels[y0 - y:y1 - y, x0 - x:x1 - x]
+        return result
+
     def execute(
         self,
         images,
@@ -72,62 +102,64 @@ class ImageExpansionNode():
         if not negative_prompt:
             negative_prompt = " "
 
-        batch_results = []
-
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
-
-                if aspect_ratio and aspect_ratio != "None":
-                    payload = {
-                        "image": image_base64,
-                        "aspect_ratio": aspect_ratio,
-                        "prompt": prompt,
-                        "negative_prompt": negative_prompt,
-                        "seed": seed_values[idx],
-                        "prompt_content_moderation": prompt_content_moderation,
-                        "preserve_alpha": preserve_alpha,
-                        "visual_input_content_moderation": visual_input_content_moderation,
-                        "visual_output_content_moderation": visual_output_content_moderation
-                    }
+        def process_image(idx, pil_image):
+            # Large requests are sent downscaled, with the canvas geometry scaled to match. An explicit
+            # canvas decides by its own size; the result is brought back to the full-resolution size.
+            use_aspect_ratio = aspect_ratio and aspect_ratio != "None"
+            output_size = canvas_size if not use_aspect_ratio and len(canvas_size) == 2 else None
+            sent_image, scale = limit_input_resolution(pil_image, self.api_url, output_size=output_size)
+            image_base64 = image_to_base64(sent_image, endpoint=self.api_url)
+            def scaled(values):
+                return [round(v * scale) for v in values]
+
+            if use_aspect_ratio:
+                payload = {
+                    "image": image_base64,
+                    "aspect_ratio": aspect_ratio,
+                    "prompt": prompt,
+                    "negative_prompt": negative_prompt,
+                    "seed": seed_values[idx],
+                    "prompt_content_moderation": prompt_content_moderation,
+                    "preserve_alpha": preserve_alpha,
+                    "visual_input_content_moderation": visual_input_content_moderation,
+                    "visual_output_content_moderation": visual_output_content_moderation
+                }
+            else:
+                payload = {
+                    "image": image_base64,
+                    "original_image_size": scaled(original_image_size),
+                    "original_image_location": scaled(original_image_location),
+                    "canvas_size": scaled(canvas_size),
+                    "prompt": prompt,
+                    "negative_prompt": negative_prompt,
+                    "seed": seed_values[idx],
+                    "prompt_content_moderation": prompt_content_moderation,
+                    "preserve_alpha": preserve_alpha,
+                    "visual_input_content_moderation": visual_input_content_moderation,
+                    "visual_output_content_moderation": visual_output_content_moderation
+                }
+
+            print(f"ImageExpansionNode - Requesting image {idx}...")
+            final_response = run_job(self.api_url, payload, api_key)
+            result_image_url = final_response["result"]["image_url"]
+
+            image_bytes = download(result_image_url)
+            result = decode_image(image_bytes)
+            if scale < 1.0:
+                if output_size:
+                    result = self._restore_canvas(
+                        result, pil_image, canvas_size, original_image_size, original_image_location
+                    )
                 else:
-                    payload = {
-                        "image": image_base64,
-                        "original_image_size": original_image_size,
-                        "original_image_location": original_image_location,
-                        "canvas_size": canvas_size,
-                        "prompt": prompt,
-                        "negative_prompt": negative_prompt,
-                        "seed": seed_values[idx],
-                        "prompt_content_moderation": prompt_content_moderation,
-                        "preserve_alpha": preserve_alpha,
-                        "visual_input_content_moderation": visual_input_content_moderation,
-                        "visual_output_content_moderation": visual_output_content_moderation
-                    }
-
-                headers = bria_json_headers(api_key)
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"ImageExpansionNode - Initial request successful for image {idx}, polling for completion...")
-                final_response = poll_status_until_completed(status_url, api_key)
-                result_image_url = final_response["result"]["image_url"]
-
-                image_response = requests.get(result_image_url)
-                result_image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-                result_tensor = torch.from_numpy(np.array(result_image).astype(np.float32) / 255.0)
-
-                batch_results.append(result_tensor)
-
-            except Exception as e:
-                print(f"[ImageExpansionNode] Skipping image {idx} due to error: {e}")
-                fallback_array = np.array(pil_image).astype(np.float32) / 255.0
-                batch_results.append(torch.from_numpy(fallback_array))
+                    height, width = result.shape[:2]
+                    result = restore_resolution(result, (round(width / scale), round(height / scale)))
+            return result
+
+        def on_error(idx, pil_image, error):
+            print(f"[ImageExpansionNode] Skipping image {idx} due to error: {error}")
+            fallback_array = np.array(pil_image).astype(np.float32) / 255.0
+            return torch.from_numpy(fallback_array)
+
+        batch_results = run_batch(images, process_image, on_error)
 
         return (batch_results,)
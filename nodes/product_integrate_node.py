@@ -1,15 +1,15 @@
-import requests
 import torch
 
 from .common import (
-    bria_json_headers,
+    async_node,
     image_to_base64,
-    poll_status_until_completed,
     postprocess_image,
     preprocess_image,
+    run_image_job,
 )
 
 
+@async_node
 class ProductIntegrateNode:
     """Product Integrate Node - Integrate a single product into a background scene"""
 
@@ -52,10 +52,10 @@ class ProductIntegrateNode:
         seed,
     ):
         payload = {
-            "scene": image_to_base64(scene_image),
+            "scene": image_to_base64(scene_image, endpoint=self.api_url),
             "products": [
                 {
-                    "image": image_to_base64(product_image),
+                    "image": image_to_base64(product_image, endpoint=self.api_url),
                     "coordinates": {
                         "x": x_coordinate,
                         "y": y_coordinate,
@@ -97,38 +97,14 @@ class ProductIntegrateNode:
             seed,
         )
 
-        headers = bria_json_headers(api_token)
-
         try:
-            response = requests.post(self.api_url, json=payload, headers=headers)
-
-            if response.status_code in (200, 202):
-                print(
-                    f"Initial product integrate request successful, polling for completion..."
-                )
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                request_id = response_dict.get("request_id")
-
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-
-                result = final_response.get("result", {})
-                result_image_url = result.get("image_url")
-                used_seed = result.get("seed", seed)
+            print("Requesting product integration...")
+            result, image_bytes = run_image_job(self.api_url, payload, api_token)
+            used_seed = result.get("seed", seed)
 
-                image_response = requests.get(result_image_url)
-                result_image = postprocess_image(image_response.content)
+            result_image = postprocess_image(image_bytes)
 
-                return (result_image, used_seed)
-            else:
-                raise Exception(
-                    f"API request failed with status code {response.status_code} {response.text}"
-                )
+            return (result_image, used_seed)
 
         except Exception as e:
             raise Exception(f"[ProductIntegrateNode] Error: {e}")
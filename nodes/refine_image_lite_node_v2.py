@@ -1,9 +1,9 @@
-import requests
 
-from .common import bria_json_headers, poll_status_until_completed, postprocess_image
+from .common import postprocess_image, async_node, run_image_job, run_job
 
 
 
+@async_node
 class RefineImageLiteNodeV2:
     """Lite Refine Image Node"""
 
@@ -97,71 +97,34 @@ class RefineImageLiteNodeV2:
             guidance_scale,
             seed,
         )
-        headers = bria_json_headers(api_token)
-
         try:
-            response = requests.post(self.api_url, json=payload, headers=headers)
-
-            if response.status_code in (200, 202):
-                print(f"Initial refine request successful to {self.api_url}, polling for completion...")
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                request_id = response_dict.get("request_id")
-
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-
-                final_response = poll_status_until_completed(status_url, api_token)
-
-                result = final_response.get("result", {})
-                structured_prompt = result.get("structured_prompt", "")
-                used_seed = result.get("seed", seed)
-
-                # Step 2 to call genearte image
-                payloadForImageGenetrate = {
-                    "prompt": prompt,
-                    "structured_prompt":structured_prompt,
-                    "model_version": model_version,
-                    "aspect_ratio": aspect_ratio,
-                    "steps_num": steps_num,
-                    "guidance_scale": guidance_scale,
-                    "seed": used_seed,
-                }
-                
-                headers = bria_json_headers(api_token)
-
-                response = requests.post(self.generate_api_url, json=payloadForImageGenetrate, headers=headers)
-
-                if response.status_code in (200, 202):
-                    print(
-                        f"Initial request successful to {self.generate_api_url}, polling for completion..."
-                    )
-                    response_dict = response.json()
-                    status_url = response_dict.get("status_url")
-                    request_id = response_dict.get("request_id")
-
-                    if not status_url:
-                        raise Exception("No status_url returned from API")
-
-                    print(f"Request ID: {request_id}, Status URL: {status_url}")
-
-                    final_response = poll_status_until_completed(status_url, api_token)
-
-                    result = final_response.get("result", {})
-                    result_image_url = result.get("image_url")
-                    structured_prompt = result.get("structured_prompt", "")
-                    used_seed = result.get("seed")
-
-                    image_response = requests.get(result_image_url)
-                    result_image = postprocess_image(image_response.content)
-
-                    return (result_image, structured_prompt, used_seed)
-
-            raise Exception(
-                f"Error: API request failed with status code {response.status_code} {response.text}"
-            )
+            print(f"Requesting refine from {self.api_url}...")
+            # run_job journals the job and shares it with identical concurrent requests
+            final_response = run_job(self.api_url, payload, api_token)
+
+            result = final_response.get("result", {})
+            structured_prompt = result.get("structured_prompt", "")
+            used_seed = result.get("seed", seed)
+
+            # Step 2 to call genearte image
+            payloadForImageGenetrate = {
+                "prompt": prompt,
+                "structured_prompt":structured_prompt,
+                "model_version": model_version,
+                "aspect_ratio": aspect_ratio,
+                "steps_num": steps_num,
+                "guidance_scale": guidance_scale,
+                "seed": used_seed,
+            }
+
+            print(f"Requesting image from {self.generate_api_url}...")
+            result, image_bytes = run_image_job(self.generate_api_url, payloadForImageGenetrate, api_token)
+            structured_prompt = result.get("structured_prompt", "")
+            used_seed = result.get("seed")
+
+            result_image = postprocess_image(image_bytes)
+
+            return (result_image, structured_prompt, used_seed)
 
         except Exception as e:
-            raise Exception(f"{e}")
\ No newline at end of file
+            raise Exception(f"{e}")
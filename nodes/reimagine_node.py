@@ -1,13 +1,16 @@
-import requests
 
 from .common import (
+    async_node,
     bria_json_headers,
+    download,
+    http_post,
     image_to_base64,
     postprocess_image,
     preprocess_image,
 )
 
 
+@async_node
 class ReimagineNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -54,21 +57,21 @@ class ReimagineNode():
         }
         if structure_image is not None:
             structure_image = preprocess_image(structure_image)
-            structure_image = image_to_base64(structure_image)
+            structure_image = image_to_base64(structure_image, endpoint=self.api_url)
             payload["structure_image_file"] = structure_image
             payload["structure_ref_influence"] = structure_ref_influence
         if tailored_model_id is not None and tailored_model_id != "":
             payload["tailored_model_id"] = tailored_model_id
             payload["tailored_model_influence"] = tailored_model_influence
-        response = requests.post(
+        response = http_post(
             self.api_url,
             json=payload,
             headers=bria_json_headers(api_key),
         )
         if response.status_code == 200:
                 response_dict = response.json()
-                image_response = requests.get(response_dict['result'][0]["urls"][0])
-                result_image = postprocess_image(image_response.content)
+                image_bytes = download(response_dict['result'][0]["urls"][0])
+                result_image = postprocess_image(image_bytes)
                 return (result_image,)
         else:
             raise Exception(f"Error: API request failed with status code {response.status_code} and text {response.text}")
@@ -1,16 +1,19 @@
-import io
-import requests
 import numpy as np
-from PIL import Image
 import torch
 
 from .common import (
-    bria_json_headers,
+    async_node,
+    decode_image,
     image_to_base64,
+    limit_input_resolution,
     normalize_images_input,
-    poll_status_until_completed,
+    reference_image_input,
+    restore_resolution,
+    run_batch,
+    run_image_job,
 )
 
+@async_node
 class ReplaceBgNode():
     @classmethod
     def INPUT_TYPES(cls):
@@ -62,61 +65,50 @@ class ReplaceBgNode():
             raise Exception("Please insert a valid API key.")
         images = normalize_images_input(images)
 
-        # Normalize reference images
-        ref_images_base64 = []
+        # Normalize reference images; each is uploaded once and referenced by URL in every payload
+        ref_images_input = []
         if ref_images is not None:
             ref_images_list = normalize_images_input(ref_images)
-            ref_images_base64 = [image_to_base64(img) for img in ref_images_list]
+            ref_images_input = [reference_image_input(img, api_key) for img in ref_images_list]
 
         # Prepare per-image seeds
         seed_values = [int(s.strip()) for s in seed.split(",")] if isinstance(seed, str) else [seed]
         if len(seed_values) < len(images):
             seed_values += [seed_values[-1]] * (len(images) - len(seed_values))
 
-        batch_results = []
-
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
-
-                payload = {
-                    "image": image_base64,
-                    "mode": mode,
-                    "prompt": prompt,
-                    "ref_images": ref_images_base64,
-                    "refine_prompt": refine_prompt,
-                    "original_quality": original_quality,
-                    "negative_prompt": negative_prompt,
-                    "seed": seed_values[idx],
-                    "prompt_content_moderation": prompt_content_moderation,
-                    "visual_output_content_moderation": visual_output_content_moderation,
-                    "enhance_ref_images": enhance_ref_images,
-                    "force_background_detection": force_background_detection
-                }
-
-                headers = bria_json_headers(api_key)
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                response_dict = response.json()
-                status_url = response_dict.get("status_url")
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"ReplaceBgNode - Initial request successful for image {idx}, polling for completion...")
-                final_response = poll_status_until_completed(status_url, api_key)
-                result_image_url = final_response["result"]["image_url"]
+        def process_image(idx, pil_image):
+            # original_quality asks for a result at the input's resolution, so the input is sent as is;
+            # otherwise a large input is sent downscaled and the result resized back to its size
+            sent_image, scale = pil_image, 1.0
+            if not original_quality:
+                sent_image, scale = limit_input_resolution(pil_image, self.api_url)
+            payload = {
+                "image": image_to_base64(sent_image, endpoint=self.api_url),
+                "mode": mode,
+                "prompt": prompt,
+                "ref_images": ref_images_input,
+                "refine_prompt": refine_prompt,
+                "original_quality": original_quality,
+                "negative_prompt": negative_prompt,
+                "seed": seed_values[idx],
+                "prompt_content_moderation": prompt_content_moderation,
+                "visual_output_content_moderation": visual_output_content_moderation,
+                "enhance_ref_images": enhance_ref_images,
+                "force_background_detection": force_background_detection
+            }
 
-                image_response = requests.get(result_image_url)
-                result_image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-                result_tensor = torch.from_numpy(np.array(result_image).astype(np.float32) / 255.0)
+            print(f"ReplaceBgNode - Requesting image {idx}...")
+            _, image_bytes = run_image_job(self.api_url, payload, api_key)
+            result = decode_image(image_bytes)
+            if scale < 1.0:
+                result = restore_resolution(result, pil_image.size)
+            return result
 
-                batch_results.append(result_tensor)
+        def on_error(idx, pil_image, error):
+            print(f"[ReplaceBgNode] Skipping image {idx} due to error: {error}")
+            fallback_array = np.array(pil_image).astype(np.float32) / 255.0
+            return torch.from_numpy(fallback_array)
 
-            except Exception as e:
-                print(f"[ReplaceBgNode] Skipping image {idx} due to error: {e}")
-                fallback_array = np.array(pil_image).astype(np.float32) / 255.0
-                batch_results.append(torch.from_numpy(fallback_array))
+        batch_results = run_batch(images, process_image, on_error)
 
         return (batch_results,)
@@ -1,17 +1,20 @@
-import io
-import requests
 import numpy as np
-from PIL import Image
 import torch
 
 from .common import (
-    bria_json_headers,
+    apply_alpha_to_original,
+    async_node,
+    decode_image,
+    download,
     image_to_base64,
+    limit_input_resolution,
     normalize_images_input,
-    poll_status_until_completed,
+    run_batch,
+    run_job,
     to_pil_safe,
 )
 
+@async_node
 class RmbgNode():
     @classmethod
     def INPUT_TYPES(cls):
@@ -41,49 +44,35 @@ class RmbgNode():
         # Normalize input to list of PIL images
         images = normalize_images_input(images)
 
-        batch_results = []
-
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
-
-                payload = {
-                    "image": image_base64,
-                    "visual_input_content_moderation": visual_input_content_moderation,
-                    "visual_output_content_moderation": visual_output_content_moderation,
-                    "preserve_alpha": preserve_alpha
-                }
-
-                headers = bria_json_headers(api_key)
-
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code not in (200, 202):
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-                # Poll until completion
-                response_dict = response.json()
-                status_url = response_dict.get('status_url')
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"RmbgNode - Initial request successful for image {idx}, polling for completion...")
-                final_response = poll_status_until_completed(status_url, api_key)
-                result_image_url = final_response['result']['image_url']
-
-                # Download result
-                image_response = requests.get(result_image_url)
-                result_image = Image.open(io.BytesIO(image_response.content))
-
-                # Convert to float32 tensor (H, W, C), 0-1
-                result_array = np.array(result_image).astype(np.float32) / 255.0
-                result_tensor = torch.from_numpy(result_array)  # shape: (H,W,4)
-                batch_results.append(result_tensor)
-
-            except Exception as e:
-                print(f"[RmbgNode] Skipping image {idx} due to error: {e}")
-                # Append empty tensor of the same size as original
-                empty_array = np.zeros((pil_image.height, pil_image.width, 4), dtype=np.float32)
-                batch_results.append(torch.from_numpy(empty_array))
+        def process_image(idx, pil_image):
+            # Large inputs are sent downscaled; the matte is then put back on the full-size pixels
+            sent_image, scale = limit_input_resolution(pil_image, self.api_url)
+            payload = {
+                "image": image_to_base64(sent_image, endpoint=self.api_url),
+                "visual_input_content_moderation": visual_input_content_moderation,
+                "visual_output_content_moderation": visual_output_content_moderation,
+                "preserve_alpha": preserve_alpha
+            }
+
+            print(f"RmbgNode - Requesting image {idx}...")
+            final_response = run_job(self.api_url, payload, api_key)
+            result_image_url = final_response['result']['image_url']
+
+            # Download result
+            image_bytes = download(result_image_url)
+            # Decode to float32 tensor (H, W, C), 0-1, keeping the alpha channel
+            result = decode_image(image_bytes, channels=None)  # shape: (H,W,4)
+            if scale < 1.0:
+                result = apply_alpha_to_original(pil_image, result, keep_alpha=preserve_alpha)
+            return result
+
+        def on_error(idx, pil_image, error):
+            print(f"[RmbgNode] Skipping image {idx} due to error: {error}")
+            # Append empty tensor of the same size as original
+            empty_array = np.zeros((pil_image.height, pil_image.width, 4), dtype=np.float32)
+            return torch.from_numpy(empty_array)
+
+        batch_results = run_batch(images, process_image, on_error)
 
         # Return list of tensors (Comfy preview handles this correctly)
         return (batch_results,)
@@ -1,6 +1,8 @@
 from .utils.shot_utils import get_image_input_types, create_image_payload, make_api_request, shot_by_image_api_url, PlacementType
+from .common import async_node
 
 
+@async_node
 class ShotByImageManualPlacementNode:
     @classmethod
     def INPUT_TYPES(self):
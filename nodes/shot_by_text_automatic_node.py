@@ -1,6 +1,8 @@
 from  .utils.shot_utils import get_text_input_types, create_text_payload, make_api_request, shot_by_text_api_url, PlacementType
+from .common import async_node
 
 
+@async_node
 class ShotByTextAutomaticNode:
     @classmethod
     def INPUT_TYPES(self):
@@ -8,7 +10,7 @@ class ShotByTextAutomaticNode:
         input_types["required"]["shot_size"] = ("STRING", {"default": "1000, 1000"})
         return input_types
 
-    RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
+    RETURN_TYPES = ("IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE", "IMAGE")
     RETURN_NAMES = (
         "output_image_1",
         "output_image_2",
@@ -17,6 +19,7 @@ class ShotByTextAutomaticNode:
         "output_image_5",
         "output_image_6",
         "output_image_7",
+        "all_images",
     )
     CATEGORY = "API Nodes"
     FUNCTION = "execute"
@@ -1,6 +1,8 @@
 from .utils.shot_utils import get_text_input_types, create_text_payload, make_api_request, shot_by_text_api_url, PlacementType
+from .common import async_node
 
 
+@async_node
 class ShotByTextManualPlacementNode:
     @classmethod
     def INPUT_TYPES(self):
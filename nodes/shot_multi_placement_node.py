@@ -0,0 +1,138 @@
+import json
+
+from .common import async_node, run_batch
+from .utils.shot_utils import (
+    PlacementType,
+    create_image_payload,
+    create_text_payload,
+    decode_result_batch,
+    fetch_result_bytes,
+    get_common_input_types,
+    parse_placement_specs,
+    payload_for_placement,
+    request_result_urls,
+    shot_by_image_api_url,
+    shot_by_text_api_url,
+)
+
+
+@async_node
+class ShotMultiPlacementNode:
+    """
+    Lifestyle shots of one product in several placements at once.
+
+    ``placements`` holds one spec per line, e.g. ``manual_padding padding_values=0, 0, 200, 200``.
+    The product (and the reference image, if connected) is encoded once and all placements are
+    requested concurrently. With ``ref_image`` the shots follow the reference image, otherwise
+    ``scene_description``. ``metadata`` is a JSON list telling which batch entries each spec produced.
+    """
+
+    @classmethod
+    def INPUT_TYPES(self):
+        input_types = get_common_input_types()
+        input_types["required"].update(
+            {
+                "image": ("IMAGE",),
+                "placements": (
+                    "STRING",
+                    {
+                        "multiline": True,
+                        "default": "manual_placement shot_size=1000, 1000 manual_placement_selection=bottom_center\n"
+                        "manual_padding padding_values=0, 0, 200, 200\n"
+                        "automatic_aspect_ratio aspect_ratio=16:9",
+                    },
+                ),
+            }
+        )
+        input_types["optional"].update(
+            {
+                "scene_description": ("STRING", {"default": ""}),
+                "mode": (["base", "fast", "high_control"], {"default": "fast"}),
+                "optimize_description": ("BOOLEAN", {"default": True}),
+                "exclude_elements": ("STRING", {"default": ""}),
+                "ref_image": ("IMAGE",),
+                "enhance_ref_image": ("BOOLEAN", {"default": True}),
+                "ref_image_influence": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0}),
+            }
+        )
+        return input_types
+
+    RETURN_TYPES = ("IMAGE", "STRING")
+    RETURN_NAMES = ("images", "metadata")
+    CATEGORY = "API Nodes"
+    FUNCTION = "execute"
+
+    def execute(
+        self,
+        image,
+        placements,
+        api_key,
+        scene_description="",
+        mode="fast",
+        optimize_description=True,
+        exclude_elements="",
+        ref_image=None,
+        enhance_ref_image=True,
+        ref_image_influence=1.0,
+        force_rmbg=False,
+        content_moderation=False,
+    ):
+        specs = parse_placement_specs(placements)
+
+        # Encode once; every placement reuses the same product (and reference) fields.
+        if ref_image is not None:
+            api_url = shot_by_image_api_url
+            base_payload = create_image_payload(
+                image,
+                ref_image,
+                api_key,
+                PlacementType.ORIGINAL.value,
+                enhance_ref_image=enhance_ref_image,
+                ref_image_influence=ref_image_influence,
+                force_rmbg=force_rmbg,
+                content_moderation=content_moderation,
+            )
+        else:
+            if not scene_description.strip():
+                raise Exception("Please provide a scene_description or connect a ref_image.")
+            api_url = shot_by_text_api_url
+            base_payload = create_text_payload(
+                image,
+                api_key,
+                scene_description,
+                mode,
+                PlacementType.ORIGINAL.value,
+                optimize_description=optimize_description,
+                exclude_elements=exclude_elements,
+                force_rmbg=force_rmbg,
+                content_moderation=content_moderation,
+            )
+
+        def process_spec(idx, spec):
+            placement_type, options = spec
+            payload = payload_for_placement(base_payload, placement_type, **options)
+            print(f"ShotMultiPlacementNode - Requesting {placement_type} ({idx + 1}/{len(specs)})")
+            image_urls = request_result_urls(api_url, payload, api_key, Placement_type=placement_type)
+            # Only download here; all shots are decoded together into one batch below.
+            return fetch_result_bytes(image_urls), None
+
+        def on_error(idx, spec, error):
+            print(f"[ShotMultiPlacementNode] Placement {idx + 1} ({spec[0]}) failed: {error}")
+            return [], str(error)
+
+        outcomes = run_batch(specs, process_spec, on_error)
+
+        shot_bytes, metadata = [], []
+        for (placement_type, options), (shots, error) in zip(specs, outcomes):
+            entry = {"placement_type": placement_type, "options": options}
+            if error is None:
+                entry["images"] = list(range(len(shot_bytes), len(shot_bytes) + len(shots)))
+            else:
+                entry["error"] = error
+            shot_bytes.extend(shots)
+            metadata.append(entry)
+        if not shot_bytes:
+            raise Exception("All placements failed: " + "; ".join(entry["error"] for entry in metadata))
+
+        _, batch = decode_result_batch(shot_bytes)
+        return (batch, json.dumps(metadata))
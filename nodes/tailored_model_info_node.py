@@ -1,6 +1,6 @@
-import requests
-from .common import bria_json_headers
+from .common import bria_json_headers, coalesce, http_get, async_node
 
+@async_node
 class TailoredModelInfoNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -21,10 +21,9 @@ class TailoredModelInfoNode():
 
     # Define the execute method as expected by ComfyUI
     def execute(self, model_id, api_key):
-        response = requests.get(
-            self.api_url + model_id,
-            headers=bria_json_headers(api_key),
-        )
+        url = self.api_url + model_id
+        # Concurrent lookups of the same model share one request
+        response = coalesce("model_info", url, None, api_key, http_get, url, headers=bria_json_headers(api_key))
         if response.status_code == 200:
             generation_prefix = response.json()["generation_prefix"]
             training_version = response.json()["training_version"]
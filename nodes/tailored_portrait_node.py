@@ -1,16 +1,19 @@
-import io
-import requests
 import numpy as np
-from PIL import Image
 import torch
 
 from .common import (
+    async_node,
     bria_json_headers,
+    decode_image,
+    download,
+    http_post,
     image_to_base64,
     normalize_images_input,
+    run_batch,
     to_pil_safe,
 )
 
+@async_node
 class TailoredPortraitNode():
     @classmethod
     def INPUT_TYPES(cls):
@@ -49,40 +52,33 @@ class TailoredPortraitNode():
         # Normalize images to list of PIL images
         images = normalize_images_input(images)
 
-        batch_results = []
-
-        for idx, pil_image in enumerate(images):
-            try:
-                image_base64 = image_to_base64(pil_image)
-
-                payload = {
-                    "id_image_file": image_base64,
-                    "tailored_model_id": int(tailored_model_id),
-                    "tailored_model_influence": tailored_model_influence,
-                    "id_strength": id_strength,
-                    "seed": seed
-                }
+        def process_image(idx, pil_image):
+            payload = {
+                "id_image_file": image_to_base64(pil_image, endpoint=self.api_url),
+                "tailored_model_id": int(tailored_model_id),
+                "tailored_model_influence": tailored_model_influence,
+                "id_strength": id_strength,
+                "seed": seed
+            }
 
-                headers = bria_json_headers(api_key)
+            headers = bria_json_headers(api_key)
 
-                response = requests.post(self.api_url, json=payload, headers=headers)
-                if response.status_code != 200:
-                    raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+            response = http_post(self.api_url, json=payload, headers=headers)
+            if response.status_code != 200:
+                raise Exception(f"API request failed with status {response.status_code}: {response.text}")
 
-                response_dict = response.json()
-                image_response = requests.get(response_dict["image_res"])
-                result_image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
+            response_dict = response.json()
+            image_bytes = download(response_dict["image_res"])
 
-                # Convert to float32 tensor (H,W,C), 0-1
-                result_array = np.array(result_image).astype(np.float32) / 255.0
-                result_tensor = torch.from_numpy(result_array)
+            # Decode to float32 tensor (H,W,C), 0-1
+            return decode_image(image_bytes)
 
-                batch_results.append(result_tensor)
+        def on_error(idx, pil_image, error):
+            print(f"[TailoredPortraitNode] Skipping image {idx} due to error: {error}")
+            fallback_array = np.array(pil_image).astype(np.float32) / 255.0
+            return torch.from_numpy(fallback_array)
 
-            except Exception as e:
-                print(f"[TailoredPortraitNode] Skipping image {idx} due to error: {e}")
-                fallback_array = np.array(pil_image).astype(np.float32) / 255.0
-                batch_results.append(torch.from_numpy(fallback_array))
+        batch_results = run_batch(images, process_image, on_error)
 
         # Return list of tensors (avoids size/dtype mismatch)
         return (batch_results,)
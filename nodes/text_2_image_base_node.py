@@ -1,13 +1,16 @@
-import requests
 
 from .common import (
+    async_node,
     bria_json_headers,
+    download,
+    http_post,
     image_to_base64,
     postprocess_image,
     preprocess_image,
 )
 
 
+@async_node
 class Text2ImageBaseNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -69,31 +72,31 @@ class Text2ImageBaseNode():
             payload["medium"] = medium
         if guidance_method_1_image is not None:
             guidance_method_1_image = preprocess_image(guidance_method_1_image)
-            guidance_method_1_image = image_to_base64(guidance_method_1_image)
+            guidance_method_1_image = image_to_base64(guidance_method_1_image, endpoint=self.api_url)
             payload["guidance_method_1"] = guidance_method_1
             payload["guidance_method_1_scale"] = guidance_method_1_scale
             payload["guidance_method_1_image_file"] = guidance_method_1_image
         if guidance_method_2_image is not None:
             guidance_method_2_image = preprocess_image(guidance_method_2_image)
-            guidance_method_2_image = image_to_base64(guidance_method_2_image)
+            guidance_method_2_image = image_to_base64(guidance_method_2_image, endpoint=self.api_url)
             payload["guidance_method_2"] = guidance_method_2
             payload["guidance_method_2_scale"] = guidance_method_2_scale
             payload["guidance_method_2_image_file"] = guidance_method_2_image
         if image_prompt_image is not None:
             image_prompt_image = preprocess_image(image_prompt_image)
-            image_prompt_image = image_to_base64(image_prompt_image)
+            image_prompt_image = image_to_base64(image_prompt_image, endpoint=self.api_url)
             payload["image_prompt_mode"] = image_prompt_mode
             payload["image_prompt_file"] = image_prompt_image
             payload["image_prompt_scale"] = image_prompt_scale
-        response = requests.post(
+        response = http_post(
             self.api_url,
             json=payload,
             headers=bria_json_headers(api_key),
         )
         if response.status_code == 200:
                 response_dict = response.json()
-                image_response = requests.get(response_dict['result'][0]["urls"][0])
-                result_image = postprocess_image(image_response.content)
+                image_bytes = download(response_dict['result'][0]["urls"][0])
+                result_image = postprocess_image(image_bytes)
                 return (result_image,)
         else:
             raise Exception(f"Error: API request failed with status code {response.status_code} and text {response.text}")
@@ -1,8 +1,8 @@
-import requests
 
-from .common import bria_json_headers, postprocess_image
+from .common import bria_json_headers, postprocess_image, http_post, async_node, download
 
 
+@async_node
 class Text2ImageHDNode():
     @classmethod
     def INPUT_TYPES(self):
@@ -49,15 +49,15 @@ class Text2ImageHDNode():
         }
         if medium != "none":
             payload["medium"] = medium
-        response = requests.post(
+        response = http_post(
             self.api_url,
             json=payload,
             headers=bria_json_headers(api_key),
         )
         if response.status_code == 200:
                 response_dict = response.json()
-                image_response = requests.get(response_dict['result'][0]["urls"][0])
-                result_image = postprocess_image(image_response.content)
+                image_bytes = download(response_dict['result'][0]["urls"][0])
+                result_image = postprocess_image(image_bytes)
                 return (result_image,)
         else:
             raise Exception(f"Error: API request failed with status code {response.status_code} and text {response.text}")
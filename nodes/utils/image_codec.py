@@ -0,0 +1,217 @@
+import io
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .telemetry import span
+
+# torchvision is imported on the first decode, not at startup: importing it costs over a second
+# (it pulls in torch._dynamo), which would be paid on every ComfyUI start.
+_NOT_LOADED = object()
+_tv_decoder = _NOT_LOADED
+
+
+EncodedImage = namedtuple("EncodedImage", ["data", "mime_type", "seconds"])
+
+_MIME_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def tensor_to_uint8(image):
+    """
+    Convert a ComfyUI image (torch tensor or numpy array, (H,W,C), (1,H,W,C) or (H,W)) to uint8 HWC.
+
+    Float inputs are treated as 0-1 and converted in one vectorized pass (scale, round, clamp);
+    there is no scan over the data to guess its range.
+    """
+    if isinstance(image, torch.Tensor):
+        if image.ndim == 4:
+            image = image[0]
+        if image.dtype != torch.uint8:
+            image = image.detach().float().mul(255.0).add_(0.5).clamp_(0.0, 255.0).to(torch.uint8)
+        return image.cpu().numpy()
+    image = np.asarray(image)
+    if image.ndim == 4:
+        image = image[0]
+    if image.dtype != np.uint8:
+        image = np.clip(image * 255.0 + 0.5, 0.0, 255.0).astype(np.uint8)
+    return image
+
+
+def array_to_pil(array):
+    """Wrap a uint8 (H,W), (H,W,1), (H,W,3) or (H,W,4) array as a PIL image."""
+    if array.size == 0:
+        array = np.zeros((1, 1, 3), dtype=np.uint8)
+    if array.ndim == 3 and array.shape[2] == 1:
+        array = array[:, :, 0]
+    if array.ndim == 2:
+        return Image.fromarray(array, mode="L")
+    if array.shape[2] == 3:
+        return Image.fromarray(array, mode="RGB")
+    if array.shape[2] == 4:
+        return Image.fromarray(array, mode="RGBA")
+    raise ValueError(f"Cannot convert image with shape {array.shape} to PIL")
+
+
+class ImageEncoding:
+    """
+    How an input image is put on the wire: ``png`` (with a zlib ``compress_level``), lossless
+    ``webp``, or ``jpeg`` at ``quality``.
+
+    JPEG cannot carry masks or alpha, so non-RGB images are always sent as PNG under that setting.
+    """
+
+    def __init__(self, format="png", compress_level=1, quality=95):
+        if format not in _MIME_TYPES:
+            raise ValueError(f"Unsupported image encoding: {format}")
+        self.format = format
+        self.compress_level = compress_level
+        self.quality = quality
+
+    @classmethod
+    def parse(cls, spec):
+        """Parse ``png``, ``png:6``, ``webp``, ``jpeg`` or ``jpeg:90``."""
+        name, _, level = spec.strip().lower().partition(":")
+        name = {"jpg": "jpeg", "webp_lossless": "webp"}.get(name, name)
+        if name == "png":
+            return cls("png", compress_level=int(level) if level else 1)
+        if name == "jpeg":
+            return cls("jpeg", quality=int(level) if level else 95)
+        return cls(name)
+
+    def __repr__(self):
+        if self.format == "png":
+            return f"png:{self.compress_level}"
+        if self.format == "jpeg":
+            return f"jpeg:{self.quality}"
+        return self.format
+
+    def encode(self, image):
+        """Encode a PIL image, tensor or array; returns an ``EncodedImage``."""
+        started = time.perf_counter()
+        with span("encode") as record:
+            if not isinstance(image, Image.Image):
+                image = array_to_pil(tensor_to_uint8(image))
+
+            fmt = self.format
+            if fmt == "jpeg" and image.mode != "RGB":
+                fmt = "png"
+            buffer = io.BytesIO()
+            if fmt == "png":
+                image.save(buffer, format="PNG", compress_level=self.compress_level)
+            elif fmt == "webp":
+                image.save(buffer, format="WEBP", lossless=True, quality=0, method=0)
+            else:
+                image.save(buffer, format="JPEG", quality=self.quality, subsampling=0)
+            data = buffer.getvalue()
+            record["format"] = fmt
+            record["bytes"] = len(data)
+
+        seconds = time.perf_counter() - started
+        _record(fmt, len(data), seconds)
+        return EncodedImage(data, _MIME_TYPES[fmt], seconds)
+
+
+_stats = {}  # format -> {"count", "bytes", "seconds"}
+_stats_lock = threading.Lock()
+
+
+def _record(fmt, size, seconds):
+    with _stats_lock:
+        entry = _stats.setdefault(fmt, {"count": 0, "bytes": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["bytes"] += size
+        entry["seconds"] += seconds
+
+
+def encode_stats():
+    """Totals per wire format since start: number of images, bytes produced and encode seconds."""
+    with _stats_lock:
+        return {fmt: dict(entry) for fmt, entry in _stats.items()}
+
+
+_READ_MODES = {3: "RGB", 4: "RGB_ALPHA", None: "UNCHANGED"}
+_PIL_MODES = {3: "RGB", 4: "RGBA"}
+
+
+def _torchvision_decoder():
+    """``(decode_image, ImageReadMode)`` from torchvision, or ``None`` when it is not available."""
+    global _tv_decoder
+    if _tv_decoder is _NOT_LOADED:
+        try:
+            from torchvision.io import ImageReadMode, decode_image
+            _tv_decoder = (decode_image, ImageReadMode)
+        except ImportError:  # older torchvision: results are decoded with PIL
+            _tv_decoder = None
+    return _tv_decoder
+
+
+def _decode_chw(data, channels):
+    """Decode encoded bytes to a uint8 (C,H,W) tensor with 3 or 4 channels (``None`` keeps alpha if present)."""
+    decoder = _torchvision_decoder()
+    if decoder is not None:
+        tv_decode_image, ImageReadMode = decoder
+        if isinstance(data, bytes):
+            # torch.frombuffer needs a writable buffer; copying the compressed bytes is cheap.
+            data = bytearray(data)
+        try:
+            decoded = tv_decode_image(
+                torch.frombuffer(data, dtype=torch.uint8), mode=getattr(ImageReadMode, _READ_MODES[channels])
+            )
+        except RuntimeError:
+            decoded = None  # format this torchvision build cannot decode (e.g. WebP, GIF)
+        if decoded is not None:
+            if decoded.shape[0] in (1, 2):  # gray / gray+alpha from UNCHANGED
+                decoded = decoded[[0, 0, 0] + ([1] if decoded.shape[0] == 2 else [])]
+            return decoded
+
+    image = Image.open(io.BytesIO(data))
+    mode = _PIL_MODES.get(channels) or ("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    if image.mode != mode:
+        image = image.convert(mode)
+    return torch.from_numpy(np.array(image)).permute(2, 0, 1)
+
+
+def _write_hwc(chw, out):
+    if out.dtype == torch.uint8:
+        out.copy_(chw.permute(1, 2, 0))
+    else:
+        torch.mul(chw.permute(1, 2, 0), 1.0 / 255.0, out=out)
+    return out
+
+
+def decode_image(data, channels=3, dtype=torch.float32, out=None):
+    """
+    Decode result bytes into a (H,W,C) tensor in a single conversion pass.
+
+    ``channels`` is 3 (RGB), 4 (RGBA) or ``None`` (keep alpha when the file has it). The output is
+    float32 in 0-1 (ComfyUI's IMAGE layout) or uint8 with ``dtype=torch.uint8``; pass ``out`` to
+    decode into preallocated memory, e.g. one slice of a batch.
+    """
+    with span("decode", bytes=len(data)):
+        chw = _decode_chw(data, channels)
+        if out is None:
+            out = torch.empty((chw.shape[1], chw.shape[2], chw.shape[0]), dtype=dtype)
+        elif tuple(out.shape) != (chw.shape[1], chw.shape[2], chw.shape[0]):
+            raise ValueError(f"Decoded image of shape {tuple(chw.shape)} does not fit output of shape {tuple(out.shape)}")
+        return _write_hwc(chw, out)
+
+
+def decode_images(datas, channels=3, dtype=torch.float32):
+    """Decode several same-sized results into one contiguous (B,H,W,C) tensor."""
+    datas = list(datas)
+    with span("decode", bytes=sum(len(data) for data in datas), images=len(datas)):
+        decoded = [_decode_chw(data, channels) for data in datas]
+        if not decoded:
+            raise ValueError("No images to decode")
+        shapes = {tuple(chw.shape) for chw in decoded}
+        if len(shapes) != 1:
+            raise ValueError(f"Cannot batch images of different shapes: {sorted(shapes)}")
+        c, h, w = decoded[0].shape
+        batch = torch.empty((len(decoded), h, w, c), dtype=dtype)
+        for i, chw in enumerate(decoded):
+            _write_hwc(chw, batch[i])
+        return batch
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    request_id TEXT,
+    status_url TEXT NOT NULL,
+    node TEXT,
+    state TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JobJournal:
+    """
+    On-disk record of submitted jobs, so a job outlives the process that submitted it.
+
+    Each row maps the hash of a job's inputs to its ``request_id`` and ``status_url``. A job is
+    ``submitted`` until polling ends with ``completed`` or ``failed``. After a restart, a node that
+    is run again with the same inputs finds its ``submitted`` row and resumes polling the existing
+    job instead of paying for a new one. Rows older than ``max_age`` seconds are ignored and
+    pruned. SQLite in WAL mode lets several ComfyUI processes share one journal.
+    """
+
+    def __init__(self, path, max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute(_SCHEMA)
+        self.prune()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            try:
+                with db:  # commits on success, rolls back on error
+                    return db.execute(sql, params).fetchall()
+            finally:
+                db.close()
+
+    def in_flight(self, key):
+        """The ``submitted`` job recorded for ``key`` as a dict, or ``None``."""
+        rows = self._execute(
+            "SELECT request_id, status_url, node, submitted_at FROM jobs "
+            "WHERE key = ? AND state = 'submitted' AND submitted_at > ?",
+            (key, time.time() - self.max_age),
+        )
+        if not rows:
+            return None
+        request_id, status_url, node, submitted_at = rows[0]
+        return {"request_id": request_id, "status_url": status_url, "node": node, "submitted_at": submitted_at}
+
+    def record_submit(self, key, endpoint, request_id, status_url, node=None):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO jobs (key, endpoint, request_id, status_url, node, state, submitted_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'submitted', ?, ?)",
+            (key, endpoint, request_id, status_url, node, now, now),
+        )
+
+    def finish(self, key, state):
+        """Mark the job for ``key`` as ``completed`` or ``failed``."""
+        self._execute("UPDATE jobs SET state = ?, updated_at = ? WHERE key = ?", (state, time.time(), key))
+
+    def prune(self):
+        self._execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - self.max_age,))
+
+    def jobs(self, state=None):
+        """All recorded jobs (optionally only those in ``state``), newest first."""
+        sql = "SELECT key, endpoint, request_id, status_url, node, state, submitted_at FROM jobs"
+        params = ()
+        if state is not None:
+            sql += " WHERE state = ?"
+            params = (state,)
+        columns = ("key", "endpoint", "request_id", "status_url", "node", "state", "submitted_at")
+        return [dict(zip(columns, row)) for row in self._execute(sql + " ORDER BY submitted_at DESC", params)]
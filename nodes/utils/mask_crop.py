@@ -0,0 +1,95 @@
+import torch
+import torch.nn.functional as F
+
+
+# A crop is not worth it when it would still cover most of the image.
+MAX_CROP_FRACTION = 0.8
+# Smallest crop edge sent, so the model still sees enough context around a tiny mask.
+MIN_CROP_SIZE = 512
+
+
+def _mask_2d(mask):
+    """First mask of a ComfyUI MASK ((B,H,W) or (H,W)) as an (H,W) float tensor."""
+    mask = mask.detach().float().cpu()
+    return mask[0] if mask.dim() == 3 else mask
+
+
+def _grow(lo, hi, size, limit):
+    """Widen ``[lo, hi)`` to at least ``size`` (centered, within ``[0, limit)``) and align it to 8 pixels."""
+    size = min(size, limit)
+    if hi - lo < size:
+        lo = max(0, min(lo - (size - (hi - lo)) // 2, limit - size))
+        hi = lo + size
+    lo -= lo % 8
+    hi = min(limit, hi + (-hi) % 8)
+    return lo, hi
+
+
+def mask_crop_box(mask, margin, min_size=MIN_CROP_SIZE, threshold=0.5):
+    """
+    Box ``(x0, y0, x1, y1)`` around the masked pixels plus ``margin`` pixels of context.
+
+    The box is at least ``min_size`` wide and high (when the image is) and aligned to 8 pixels.
+    Returns ``None`` when the mask is empty or the box would cover most of the image anyway.
+    """
+    mask = _mask_2d(mask)
+    height, width = mask.shape
+    ys, xs = torch.nonzero(mask > threshold, as_tuple=True)
+    if ys.numel() == 0:
+        return None
+    x0, x1 = max(0, int(xs.min()) - margin), min(width, int(xs.max()) + 1 + margin)
+    y0, y1 = max(0, int(ys.min()) - margin), min(height, int(ys.max()) + 1 + margin)
+    x0, x1 = _grow(x0, x1, min_size, width)
+    y0, y1 = _grow(y0, y1, min_size, height)
+    if (x1 - x0) * (y1 - y0) > MAX_CROP_FRACTION * width * height:
+        return None
+    return x0, y0, x1, y1
+
+
+def crop(image, mask, box):
+    """Crop a ComfyUI IMAGE ((B,H,W,C)) and MASK ((B,H,W)) to ``box``, keeping their batch layout."""
+    x0, y0, x1, y1 = box
+    return image[:, y0:y1, x0:x1, :], mask[..., y0:y1, x0:x1]
+
+
+def feather_weights(mask, feather, threshold=0.5):
+    """
+    Blend weights for a mask crop: 1 on the mask, falling to 0 over ``2 * feather`` pixels outside it.
+
+    The mask is dilated by ``feather`` and then box-blurred twice with half that radius; the blur
+    never reaches back into the mask, so the edited area itself is taken from the API result.
+    """
+    weights = (_mask_2d(mask) > threshold).float()[None, None]
+    if feather > 0:
+        weights = F.max_pool2d(weights, 2 * feather + 1, stride=1, padding=feather)
+        radius = max(1, feather // 2)
+        for _ in range(2):
+            weights = F.avg_pool2d(weights, 2 * radius + 1, stride=1, padding=radius, count_include_pad=False)
+    return weights[0, 0]
+
+
+def paste_patch(image, patch, box, weights):
+    """
+    Blend ``patch`` ((h,w,C)) into ``image`` ((H,W,C)) at ``box`` using ``weights`` ((h,w)).
+
+    The patch is resized to the box if the API returned another size. If it carries an alpha
+    channel the image lacks, the image gets an opaque one, matching a full-size result.
+    """
+    x0, y0, x1, y1 = box
+    height, width = y1 - y0, x1 - x0
+    patch = patch.float()
+    if tuple(patch.shape[:2]) != (height, width):
+        patch = F.interpolate(
+            patch.permute(2, 0, 1)[None], size=(height, width), mode="bicubic", align_corners=False
+        )[0].permute(1, 2, 0).clamp_(0.0, 1.0)
+
+    out = image.detach().float().cpu().clone()
+    if patch.shape[2] > out.shape[2]:
+        out = torch.cat([out, torch.ones(out.shape[:2] + (patch.shape[2] - out.shape[2],))], dim=2)
+    region = out[y0:y1, x0:x1]
+    if patch.shape[2] < out.shape[2]:
+        patch = torch.cat([patch, region[:, :, patch.shape[2]:]], dim=2)
+
+    weights = weights[:, :, None]
+    out[y0:y1, x0:x1] = region * (1.0 - weights) + patch * weights
+    return out
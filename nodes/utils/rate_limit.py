@@ -0,0 +1,269 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+
+FAMILIES = ("v1", "v2_image", "v2_video", "upload", "status")
+
+
+def endpoint_family(url):
+    """
+    Classify a Bria API URL into the family whose quota it counts against.
+
+    Returns ``None`` for anything that is not a Bria API call (result downloads, presigned S3 PUTs).
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    if not (host == "bria-api.com" or host.endswith(".bria-api.com")):
+        return None
+    path = parts.path
+    if path.startswith("/upload-"):
+        return "upload"
+    if "/status/" in path:
+        return "status"
+    if path.startswith("/v2/video/"):
+        return "v2_video"
+    if path.startswith("/v2/"):
+        return "v2_image"
+    if path.startswith("/v1/"):
+        return "v1"
+    return None
+
+
+class TokenBucket:
+    """
+    ``rate`` requests per second with bursts of up to ``burst``; ``rate=0`` disables the limit.
+
+    ``reserve`` books the next slot and returns how long the caller must wait for it, so the same
+    bucket paces both threads (``time.sleep``) and coroutines (``asyncio.sleep``).
+    """
+
+    def __init__(self, rate, burst=None):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.burst = 1.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self.configure(rate, burst)
+        self._tokens = self.burst
+
+    def configure(self, rate, burst=None):
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            self.burst = max(1.0, float(burst if burst is not None else self.rate))
+            self._tokens = min(self._tokens, self.burst)
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._blocked_until - now)
+            if self.rate <= 0:
+                return wait
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+            return wait
+
+    def pause(self, seconds):
+        """Hold every caller back for ``seconds`` (the server answered 429)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class InFlightLimit:
+    """
+    A FIFO counting semaphore usable from threads and from any event loop at the same time.
+
+    A released slot is handed directly to the oldest waiter, so callers are served in arrival
+    order. ``limit=0`` disables the limit.
+    """
+
+    def __init__(self, limit):
+        self._lock = threading.Lock()
+        self._waiters = deque()  # threading.Event or (loop, asyncio.Future)
+        self.active = 0
+        self.limit = int(limit)
+
+    def configure(self, limit):
+        with self._lock:
+            self.limit = int(limit)
+            while self._waiters and self._has_room():
+                self._grant_next()
+
+    def _has_room(self):
+        return self.limit <= 0 or self.active < self.limit
+
+    def _grant_next(self):
+        # Called with the lock held: moves one slot to the oldest waiter that can still take it.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                self.active += 1
+                waiter.set()
+                return
+            loop, future = waiter
+            if loop.is_closed():
+                continue
+            self.active += 1
+            loop.call_soon_threadsafe(self._deliver, future)
+            return
+
+    def _deliver(self, future):
+        if future.done():  # the waiter was cancelled after the slot was granted
+            self.release()
+        else:
+            future.set_result(None)
+
+    def acquire(self):
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.active += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.active += 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+            if self._has_room():
+                self._grant_next()
+
+
+# Default quota per family: (requests per second, requests in flight). 0 means unlimited.
+DEFAULT_LIMITS = {
+    "v1": (5.0, 8),
+    "v2_image": (10.0, 16),
+    "v2_video": (2.0, 4),
+    "upload": (10.0, 8),
+    "status": (20.0, 32),
+}
+
+
+def parse_limits(spec):
+    """Parse ``family=rate[:in_flight]`` pairs separated by ``;``, e.g. ``v2_image=5:8;upload=2``."""
+    limits = {}
+    for entry in (spec or "").split(";"):
+        if not entry.strip():
+            continue
+        family, _, value = entry.partition("=")
+        family = family.strip()
+        if family not in FAMILIES:
+            raise ValueError(f"Unknown Bria endpoint family '{family}', expected one of {', '.join(FAMILIES)}")
+        rate, _, in_flight = value.partition(":")
+        limits[family] = (float(rate), int(in_flight) if in_flight.strip() else None)
+    return limits
+
+
+class RateLimiter:
+    """
+    Process-wide request governor keyed by ``(api_key, endpoint family)``.
+
+    Every call made through the shared HTTP helpers waits for a token from the bucket of its key
+    (requests per second), then holds an in-flight slot until the response is in, so parallel
+    nodes and batches sharing one API key stay under its quota without coordinating. A 429 pauses
+    the whole key/family for the ``Retry-After`` time.
+    """
+
+    def __init__(self, limits=None, enabled=True):
+        self._lock = threading.Lock()
+        self.enabled = enabled
+        self.limits = dict(DEFAULT_LIMITS)
+        for family, (rate, max_in_flight) in (limits or {}).items():
+            self.limits[family] = (rate, DEFAULT_LIMITS[family][1] if max_in_flight is None else max_in_flight)
+        self._buckets = {}  # (api_key, family) -> TokenBucket
+        self._slots = {}  # (api_key, family) -> InFlightLimit
+
+    def configure(self, family, rate=None, max_in_flight=None):
+        """Change the limits of one family; existing keys pick them up immediately."""
+        with self._lock:
+            current_rate, current_in_flight = self.limits[family]
+            rate = current_rate if rate is None else float(rate)
+            max_in_flight = current_in_flight if max_in_flight is None else int(max_in_flight)
+            self.limits[family] = (rate, max_in_flight)
+            buckets = [bucket for key, bucket in self._buckets.items() if key[1] == family]
+            slots = [slot for key, slot in self._slots.items() if key[1] == family]
+        for bucket in buckets:
+            bucket.configure(rate)
+        for slot in slots:
+            slot.configure(max_in_flight)
+
+    def _get(self, api_key, family):
+        key = (api_key or "", family)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                rate, max_in_flight = self.limits[family]
+                bucket = self._buckets[key] = TokenBucket(rate)
+                self._slots[key] = InFlightLimit(max_in_flight)
+            return bucket, self._slots[key]
+
+    @contextmanager
+    def limit(self, api_key, family):
+        if not self.enabled or family is None:
+            yield
+            return
+        bucket, slots = self._get(api_key, family)
+        # Wait for the token before taking a slot, so a paced caller does not hold a slot idle
+        wait = bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        slots.acquire()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    @asynccontextmanager
+    async def limit_async(self, api_key, family):
+        if not self.enabled or family is None:
+            yield
+            return
+        bucket, slots = self._get(api_key, family)
+        wait = bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await slots.acquire_async()
+        try:
+            yield
+        finally:
+            slots.release()
+
+    def throttled(self, api_key, family, seconds):
+        """Record a 429 for ``(api_key, family)``: nobody sends on that key for ``seconds``."""
+        if not self.enabled or family is None:
+            return
+        bucket, _ = self._get(api_key, family)
+        bucket.pause(seconds)
+        print(f"Bria rate limit hit for {family}, pausing requests for {seconds:.1f}s")
+
+    def stats(self):
+        """Current in-flight count per family, summed over keys."""
+        with self._lock:
+            totals = {}
+            for (_, family), slots in self._slots.items():
+                totals[family] = totals.get(family, 0) + slots.active
+            return totals
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+def image_digest(pil_image):
+    """SHA-256 over the decoded pixels, so the same picture hashes the same whatever produced it."""
+    digest = hashlib.sha256()
+    digest.update(f"{pil_image.mode}:{pil_image.size[0]}x{pil_image.size[1]}:".encode("ascii"))
+    digest.update(pil_image.tobytes())
+    return digest.hexdigest()
+
+
+def file_digest(path, sample_size=1024 * 1024):
+    """
+    Fingerprint of a local file: its path, size and mtime plus a hash of its first and last ``sample_size`` bytes.
+
+    Cheap even for multi-gigabyte videos, and a file replaced by different content under the
+    same name and timestamp still gets a new fingerprint in all but contrived cases.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    digest = hashlib.sha256(f"{path}:{stat.st_size}:{stat.st_mtime_ns}:".encode("utf-8"))
+    with open(path, "rb") as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > 2 * sample_size:
+            f.seek(-sample_size, os.SEEK_END)
+            digest.update(f.read(sample_size))
+        else:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class ReferenceStore:
+    """
+    Remembers the temp URL each reference image was uploaded to, so it is uploaded once per TTL.
+
+    ``url_for`` hashes the image and returns a live URL from the store, or calls ``upload`` and
+    keeps its result for ``ttl`` seconds. ``url_for_key`` does the same for any upload identified
+    by a digest, e.g. a video file's ``file_digest``. Concurrent callers asking for the same image wait on the
+    single in-flight upload. ``digest_for`` maps a stored URL back to its digest. With a ``path`` the
+    table survives restarts.
+    """
+
+    def __init__(self, ttl=3600, path=None):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}  # digest -> (url, expires_at wall clock)
+        self._uploads = {}  # digest -> Future of an in-flight upload
+        self._digests = {}  # url -> digest, the reverse of _entries
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self._entries = {
+            digest: (url, expires) for digest, (url, expires) in stored.items() if expires > now
+        }
+        self._digests = {url: digest for digest, (url, _) in self._entries.items()}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save Bria reference store: {e}")
+
+    def url_for(self, pil_image, upload):
+        """Return the URL for ``pil_image``, calling ``upload(pil_image) -> url`` only on a miss."""
+        return self.url_for_key(image_digest(pil_image), lambda: upload(pil_image))
+
+    def url_for_key(self, digest, upload):
+        """Return the URL stored under ``digest``, calling ``upload() -> url`` only on a miss."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] > time.time():
+                return entry[0]
+            future = self._uploads.get(digest)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._uploads[digest] = future
+        if not owner:
+            return future.result()
+
+        try:
+            url = upload()
+        except BaseException as e:
+            with self._lock:
+                del self._uploads[digest]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            now = time.time()
+            self._entries = {key: value for key, value in self._entries.items() if value[1] > now}
+            self._entries[digest] = (url, now + self.ttl)
+            self._digests = {url: digest for digest, (url, _) in self._entries.items()}
+            del self._uploads[digest]
+            self._save()
+        future.set_result(url)
+        return url
+
+    def digest_for(self, url):
+        """Return the digest a stored URL was uploaded for, or None for any other value."""
+        with self._lock:
+            return self._digests.get(url)
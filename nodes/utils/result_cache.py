@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def request_fingerprint(api_url, payload):
+    """Content address of a request: SHA-256 over the endpoint and the canonical JSON payload (inline images included)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    digest = hashlib.sha256()
+    digest.update(api_url.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk store of finished job results keyed by ``request_fingerprint``.
+
+    Each entry is a JSON metadata file (the API ``result`` object plus bookkeeping) and the
+    downloaded result bytes. Entries older than ``ttl`` seconds are ignored and removed; when the
+    total size goes over ``max_bytes`` the least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        folder = os.path.join(self.directory, key[:2])
+        return os.path.join(folder, key + ".json"), os.path.join(folder, key + ".bin")
+
+    def get(self, key):
+        """Return ``(result, data)`` for a live entry, or None."""
+        meta_path, data_path = self._paths(key)
+        with self._lock:
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if time.time() - meta["created"] > self.ttl:
+                    self._remove(key)
+                    return None
+                with open(data_path, "rb") as f:
+                    data = f.read()
+            except (OSError, ValueError, KeyError):
+                return None
+            # Touch both files so eviction sees this entry as recently used.
+            now = time.time()
+            for path in (meta_path, data_path):
+                try:
+                    os.utime(path, (now, now))
+                except OSError:
+                    pass
+        return meta["result"], data
+
+    def put(self, key, result, data):
+        meta_path, data_path = self._paths(key)
+        with self._lock:
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            # Write the payload first and publish the metadata last, so readers never see half an entry.
+            tmp_data = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_data, "wb") as f:
+                f.write(data)
+            os.replace(tmp_data, data_path)
+            tmp_meta = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "result": result}, f)
+            os.replace(tmp_meta, meta_path)
+            self._evict()
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        entries = []
+        total = 0
+        now = time.time()
+        for folder, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".bin"):
+                    continue
+                key = name[:-4]
+                meta_path, data_path = self._paths(key)
+                try:
+                    size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+                    last_used = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                if now - last_used > self.ttl:
+                    self._remove(key)
+                    continue
+                entries.append((last_used, size, key))
+                total += size
+        if total <= self.max_bytes:
+            return
+        for _, size, key in sorted(entries):
+            self._remove(key)
+            total -= size
+            if total <= self.max_bytes:
+                break
@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+# Status codes worth another attempt. A submit (POST) is not idempotent: it is only repeated when
+# the server certainly did not start the job (throttled, or the gateway could not reach it).
+RETRYABLE_STATUS = frozenset((429, 500, 502, 503, 504))
+RETRYABLE_SUBMIT_STATUS = frozenset((429, 502, 503))
+_IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+
+
+def is_idempotent(method, url):
+    """GET/PUT and the presigned-URL requests (which only hand out an upload URL) are safe to repeat."""
+    return method.upper() in _IDEMPOTENT_METHODS or "/presigned-url" in urlsplit(url).path
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: attempt ``n`` waits up to ``base_delay * 2**n`` seconds,
+    capped at ``max_delay``. A ``Retry-After`` from the server is honored when it is longer.
+    """
+
+    def __init__(self, attempts=4, base_delay=0.5, max_delay=20.0):
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry_status(self, status_code, idempotent):
+        return status_code in (RETRYABLE_STATUS if idempotent else RETRYABLE_SUBMIT_STATUS)
+
+    def delay(self, attempt, retry_after=None):
+        delay = random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay * 3))
+        return delay
+
+
+def breaker_key(url):
+    """Endpoint a breaker is kept for: host and path, with all status URLs of a host sharing one."""
+    parts = urlsplit(url)
+    path = parts.path
+    if "/status/" in path:
+        path = path[: path.index("/status/")] + "/status"
+    elif not (parts.hostname or "").endswith("bria-api.com"):
+        path = ""  # result and upload hosts: one breaker per host
+    return f"{parts.netloc}{path}"
+
+
+class CircuitBreaker:
+    """
+    Stops sending to an endpoint that keeps failing.
+
+    After ``failure_threshold`` consecutive server-side failures (5xx or connection errors) the
+    breaker opens and calls fail immediately for ``reset_timeout`` seconds. Then one trial call
+    is let through: success closes the breaker, another failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Return ``None`` if a call may go out, otherwise the seconds until the next trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                # A trial call is out; a trial that never reported back expires after reset_timeout.
+                return self._trial_started + self.reset_timeout - now
+            self._trial_started = now
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_started is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_started = None
+
+
+class CircuitBreakers:
+    """One ``CircuitBreaker`` per endpoint (see ``breaker_key``), created on first use."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def configure(self, failure_threshold=None, reset_timeout=None):
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = int(failure_threshold)
+            if reset_timeout is not None:
+                self.reset_timeout = float(reset_timeout)
+            for breaker in self._breakers.values():
+                breaker.failure_threshold = self.failure_threshold
+                breaker.reset_timeout = self.reset_timeout
+
+    def for_url(self, url):
+        key = breaker_key(url)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return key, breaker
+
+    def states(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.state for key, breaker in breakers.items()}
@@ -1,11 +1,18 @@
-import requests
+import re
+
 import torch
 from ..common import (
     bria_json_headers,
+    download,
+    http_post,
     image_to_base64,
     postprocess_image,
     preprocess_image,
+    reference_image_input,
+    run_batch,
+    span,
 )
+from .image_codec import decode_image, decode_images
 
 shot_by_text_api_url = (
     "https://engine.prod.bria-api.com/v1/product/lifestyle_shot_by_text"
@@ -67,6 +74,72 @@ def update_payload_for_placement(placement_type, payload, **kwargs):
     return payload
 
 
+# Options each placement type reads in update_payload_for_placement; the required ones have no default.
+PLACEMENT_OPTIONS = {
+    PlacementType.ORIGINAL.value: {"original_quality": False},
+    PlacementType.AUTOMATIC.value: {"shot_size": True},
+    PlacementType.MANUAL_PLACEMENT.value: {"shot_size": True, "manual_placement_selection": False},
+    PlacementType.MANUAL_PADDING.value: {"padding_values": True},
+    PlacementType.CUSTOM_COORDINATES.value: {
+        "shot_size": True,
+        "foreground_image_size": True,
+        "foreground_image_location": True,
+    },
+    PlacementType.AUTOMATIC_ASPECT_RATIO.value: {"aspect_ratio": False},
+}
+_PLACEMENT_KEYS = {
+    "shot_size",
+    "manual_placement_selection",
+    "foreground_image_size",
+    "foreground_image_location",
+    "padding_values",
+    "aspect_ratio",
+    "original_quality",
+}
+_SPEC_OPTION = re.compile(r"(\w+)\s*=\s*(.*?)\s*(?=\s\w+\s*=|$)")
+
+
+def parse_placement_specs(text):
+    """
+    Parse placement specs, one per line: a placement type followed by ``option=value`` pairs.
+
+    For example ``manual_placement shot_size=1000, 1000 manual_placement_selection=upper_left``.
+    Blank lines and lines starting with ``#`` are skipped. Returns ``(placement_type, options)`` pairs.
+    """
+    specs = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        placement_type, _, rest = line.partition(" ")
+        placement_type = placement_type.strip().lower()
+        if placement_type not in PLACEMENT_OPTIONS:
+            raise Exception(
+                f"Line {number}: unknown placement type '{placement_type}', expected one of {', '.join(PLACEMENT_OPTIONS)}"
+            )
+        options = dict(_SPEC_OPTION.findall(rest.strip()))
+        allowed = PLACEMENT_OPTIONS[placement_type]
+        unknown = sorted(set(options) - set(allowed))
+        if unknown:
+            raise Exception(f"Line {number}: {placement_type} does not take {', '.join(unknown)}")
+        missing = [name for name, required in allowed.items() if required and not options.get(name)]
+        if missing:
+            raise Exception(f"Line {number}: {placement_type} needs {', '.join(missing)}")
+        if "original_quality" in options:
+            options["original_quality"] = options["original_quality"].lower() in ("1", "true", "yes", "on")
+        specs.append((placement_type, options))
+    if not specs:
+        raise Exception("Please add at least one placement spec.")
+    return specs
+
+
+def payload_for_placement(base_payload, placement_type, **kwargs):
+    """Copy of an already encoded shot payload with its placement replaced by ``placement_type``."""
+    payload = {key: value for key, value in base_payload.items() if key not in _PLACEMENT_KEYS}
+    payload["placement_type"] = placement_type
+    return update_payload_for_placement(placement_type, payload, **kwargs)
+
+
 def create_text_payload(
     image, api_key, scene_description, mode, placement_type, **kwargs
 ):
@@ -78,7 +151,7 @@ def create_text_payload(
     if isinstance(image, torch.Tensor):
         image = preprocess_image(image)
 
-    image_base64 = image_to_base64(image)
+    image_base64 = image_to_base64(image, endpoint=shot_by_text_api_url)
 
     payload = {
         "file": image_base64,
@@ -106,16 +179,16 @@ def create_image_payload(image, ref_image, api_key, placement_type, **kwargs):
 
     if isinstance(image, torch.Tensor):
         image = preprocess_image(image)
-        if isinstance(ref_image, torch.Tensor):
-            ref_image = preprocess_image(ref_image)
+    if isinstance(ref_image, torch.Tensor):
+        ref_image = preprocess_image(ref_image)
 
-        image_base64 = image_to_base64(image)
-        ref_image_base64 = image_to_base64(ref_image)
+    image_base64 = image_to_base64(image, endpoint=shot_by_image_api_url)
+    # The reference is usually shared by many shots: send its uploaded URL rather than the bytes
+    ref_image_input = reference_image_input(ref_image, api_key)
 
     # Base payload
     payload = {
         "file": image_base64,
-        "ref_image_file": ref_image_base64,
         "enhance_ref_image": kwargs.get("enhance_ref_image", True),
         "ref_image_influence": kwargs.get("ref_image_influence", 1.0),
         "placement_type": placement_type,
@@ -124,45 +197,86 @@ def create_image_payload(image, ref_image, api_key, placement_type, **kwargs):
         "force_rmbg": kwargs.get("force_rmbg", False),
         "content_moderation": kwargs.get("content_moderation", False),
     }
+    if ref_image_input.startswith(("http://", "https://")):
+        payload["ref_image_url"] = ref_image_input
+    else:
+        payload["ref_image_file"] = ref_image_input
 
     payload = update_payload_for_placement(placement_type, payload, **kwargs)
 
     return payload
 
 
+def fetch_result_bytes(image_urls):
+    """Download result images concurrently over the shared connection pool; returns their bytes in order."""
+    def fetch(idx, image_url):
+        return download(image_url, progress=False)
+
+    def fail(idx, image_url, error):
+        raise Exception(f"Failed to download result {idx + 1} ({image_url}): {error}")
+
+    return run_batch(image_urls, fetch, fail)
+
+
+def decode_result_batch(datas):
+    """
+    Decode result images straight into one preallocated (B,H,W,C) batch.
+
+    Returns the images in order as (1,H,W,C) views into the batch, plus the batch. Results of
+    different sizes cannot share a batch tensor; they are decoded one by one and the batch is
+    then the list of (H,W,C) images, the way RmbgNode hands on results of different sizes.
+    """
+    if not datas:
+        return [], None
+    try:
+        batch = decode_images(datas)
+    except ValueError:
+        images = [decode_image(data) for data in datas]
+        return [image[None,] for image in images], images
+    return list(batch.split(1)), batch
+
+
+def fetch_result_batch(image_urls):
+    """Download result images concurrently and decode them as one batch (see ``decode_result_batch``)."""
+    return decode_result_batch(fetch_result_bytes(image_urls))
+
+
+def request_result_urls(api_url, payload, api_key, Placement_type = None):
+    """Send a sync shot request and return its result image URLs (up to 7 for automatic placement)."""
+    headers = bria_json_headers(api_key)
+    with span("submit", endpoint=api_url):
+        response = http_post(api_url, json=payload, headers=headers)
+
+    if response.status_code != 200:
+        raise Exception(
+            f"Error: API request failed with status code {response.status_code}{response.text}"
+        )
+    print("response is 200")
+    results = response.json().get("result", [])
+    if Placement_type == PlacementType.AUTOMATIC.value:
+        return [result[0] for result in results[:7]]
+    return [results[0][0]]
+
+
 def make_api_request(api_url, payload, api_key, Placement_type = None):
     """Make API request and return processed image"""
 
 
     try:
-        headers = bria_json_headers(api_key)
-        response = requests.post(api_url, json=payload, headers=headers)
-
-        if response.status_code == 200:
-            print("response is 200")
-            response_dict = response.json()
-            if Placement_type == PlacementType.AUTOMATIC.value:
-                result_images = []
-                for i, result in enumerate(response_dict.get("result", [])[:7]):
-                    image_url = result[0]
-                    image_response = requests.get(image_url)
-                    processed = postprocess_image(image_response.content)
-                    result_images.append(processed)
-
-                # If less than 7 images, pad with None to match ComfyUI return structure
-                while len(result_images) < 7:
-                    result_images.append(None)
-                print(result_images)
-
-                return tuple(result_images)
-
-            image_response = requests.get(response_dict["result"][0][0])
-            result_image = postprocess_image(image_response.content)
-            return (result_image,)
-        else:
-            raise Exception(
-                f"Error: API request failed with status code {response.status_code}{response.text}"
-            )
+        image_urls = request_result_urls(api_url, payload, api_key, Placement_type)
+        if Placement_type == PlacementType.AUTOMATIC.value:
+            result_images, batch = fetch_result_batch(image_urls)
+            print(f"Received {len(result_images)} automatic shots")
+
+            # If less than 7 images, pad with None to match ComfyUI return structure
+            while len(result_images) < 7:
+                result_images.append(None)
+
+            return tuple(result_images) + (batch,)
+
+        image_bytes = download(image_urls[0])
+        result_image = postprocess_image(image_bytes)
+        return (result_image,)
 
     except Exception as e:
         raise Exception(f"{e}")
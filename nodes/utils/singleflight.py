@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from .result_cache import request_fingerprint
+
+
+def call_key(api_url, payload, api_key):
+    """Key of one API call: endpoint, canonical payload and (hashed) API key."""
+    key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    return request_fingerprint(api_url, {"api_key": key_digest, "payload": payload})
+
+
+class SingleFlight:
+    """
+    Lets concurrent identical calls share one execution.
+
+    The first caller for a key runs the function; callers arriving while it is in flight wait for
+    the same outcome (result or exception) instead of running it again. Once the call finishes the
+    key is forgotten, so later calls run afresh. Threads and coroutines share one table, so a
+    synchronous node and an async node asking for the same thing are coalesced too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> concurrent.futures.Future
+        self.shared = 0  # calls answered by another caller's execution
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        future, owner = self._join(key)
+        if not owner:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """``do`` for a coroutine function ``fn``; waiting does not block the event loop."""
+        future, owner = self._join(key)
+        if not owner:
+            # shield: a cancelled follower must not cancel the shared call
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,190 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# Tags (node, endpoint, request_id) inherited by every span opened in the current context.
+_tags = contextvars.ContextVar("bria_span_tags", default={})
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+_METRIC_LABELS = ("node", "endpoint")
+
+_metrics = {}  # (span, node, endpoint) -> {"buckets", "sum", "count", "errors", "bytes"}
+_metrics_lock = threading.Lock()
+
+_trace = {"path": os.environ.get("BRIA_TRACE_FILE", "").strip() or None, "file": None}
+_trace_lock = threading.Lock()
+
+
+@contextmanager
+def tagged(**tags):
+    """Add tags to every span opened inside this block (``None`` values are ignored)."""
+    token = _tags.set({**_tags.get(), **{key: value for key, value in tags.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_tags():
+    return dict(_tags.get())
+
+
+# Result URL -> tags of the job that produced it, so the download span of a result can be
+# attributed to its endpoint and request id even when it runs outside the job's context.
+_url_tags = OrderedDict()
+_url_tags_lock = threading.Lock()
+_URL_TAGS_LIMIT = 1024
+
+
+def link_result_urls(result, **tags):
+    """Remember ``tags`` for every URL found in a job ``result`` (nested dicts and lists)."""
+    tags = {key: value for key, value in {**_tags.get(), **tags}.items() if value is not None}
+    pending = [result]
+    with _url_tags_lock:
+        while pending:
+            value = pending.pop()
+            if isinstance(value, dict):
+                pending.extend(value.values())
+            elif isinstance(value, (list, tuple)):
+                pending.extend(value)
+            elif isinstance(value, str) and value.startswith(("http://", "https://")):
+                _url_tags[value] = tags
+                _url_tags.move_to_end(value)
+        while len(_url_tags) > _URL_TAGS_LIMIT:
+            _url_tags.popitem(last=False)
+
+
+def url_tags(url):
+    with _url_tags_lock:
+        return dict(_url_tags.get(url, {}))
+
+
+@contextmanager
+def span(name, **tags):
+    """
+    Time one phase of an API interaction (encode, upload, submit, queue, download, decode).
+
+    Yields the span record; code inside the block may add fields to it, e.g. ``request_id`` once
+    it is known or ``bytes`` for the payload size. The finished span feeds the Prometheus metrics
+    and, when a trace file is configured, is appended to it as one JSON line.
+    """
+    record = {**_tags.get(), **{key: value for key, value in tags.items() if value is not None}}
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _finish(name, record, started_at, time.perf_counter() - started, error)
+
+
+def _finish(name, record, started_at, duration, error):
+    key = (name,) + tuple(str(record.get(label, "")) for label in _METRIC_LABELS)
+    with _metrics_lock:
+        entry = _metrics.get(key)
+        if entry is None:
+            entry = _metrics[key] = {"buckets": [0] * len(_BUCKETS), "sum": 0.0, "count": 0, "errors": 0, "bytes": 0}
+        for i, bound in enumerate(_BUCKETS):
+            if duration <= bound:
+                entry["buckets"][i] += 1
+        entry["sum"] += duration
+        entry["count"] += 1
+        if error is not None:
+            entry["errors"] += 1
+        entry["bytes"] += int(record.get("bytes") or 0)
+
+    if _trace["path"] is not None:
+        line = {"span": name, "start": started_at, "duration": duration, **record}
+        if error is not None:
+            line["error"] = error
+        _write_trace(line)
+
+
+def _write_trace(line):
+    with _trace_lock:
+        if _trace["path"] is None:
+            return
+        try:
+            if _trace["file"] is None:
+                _trace["file"] = open(_trace["path"], "a", encoding="utf-8", buffering=1)
+            _trace["file"].write(json.dumps(line, default=str) + "\n")
+        except OSError as e:
+            print(f"Disabling Bria trace file {_trace['path']}: {e}")
+            _trace["path"] = None
+
+
+def configure_trace_file(path):
+    """Append finished spans to ``path`` as JSON lines; ``None`` stops tracing."""
+    with _trace_lock:
+        if _trace["file"] is not None:
+            _trace["file"].close()
+        _trace["path"] = path or None
+        _trace["file"] = None
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Render the span metrics in the Prometheus text exposition format."""
+    with _metrics_lock:
+        snapshot = {key: {**entry, "buckets": list(entry["buckets"])} for key, entry in _metrics.items()}
+
+    lines = [
+        "# HELP bria_span_seconds Time spent in each phase of Bria API interactions.",
+        "# TYPE bria_span_seconds histogram",
+    ]
+    for key, entry in sorted(snapshot.items()):
+        labels = ",".join(
+            f'{label}="{_label_value(value)}"' for label, value in zip(("span",) + _METRIC_LABELS, key)
+        )
+        for bound, count in zip(_BUCKETS, entry["buckets"]):
+            lines.append(f'bria_span_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'bria_span_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+        lines.append(f"bria_span_seconds_sum{{{labels}}} {entry['sum']}")
+        lines.append(f"bria_span_seconds_count{{{labels}}} {entry['count']}")
+
+    for metric, field, help_text in (
+        ("bria_span_errors_total", "errors", "Spans that ended with an exception."),
+        ("bria_span_bytes_total", "bytes", "Bytes encoded, uploaded or downloaded within spans."),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for key, entry in sorted(snapshot.items()):
+            labels = ",".join(
+                f'{label}="{_label_value(value)}"' for label, value in zip(("span",) + _METRIC_LABELS, key)
+            )
+            lines.append(f"{metric}{{{labels}}} {entry[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def register_metrics_route(path="/bria/metrics"):
+    """Serve ``prometheus_text()`` from the ComfyUI server, when running inside ComfyUI."""
+    try:
+        from aiohttp import web
+        from server import PromptServer
+    except ImportError:
+        return False
+    instance = getattr(PromptServer, "instance", None)
+    if instance is None:
+        return False
+
+    @instance.routes.get(path)
+    async def bria_metrics(request):
+        return web.Response(text=prometheus_text(), content_type="text/plain", charset="utf-8")
+
+    return True
@@ -1,6 +1,30 @@
 import os
 import folder_paths
 
+_video_listing = {}  # input directory -> (mtime_ns, sorted video files)
+
+
+def list_input_videos(input_dir):
+    """
+    Sorted video files in ``input_dir``.
+
+    ComfyUI calls ``INPUT_TYPES`` on startup and on every refresh of the node list, so the listing
+    is cached until the directory changes; ``os.scandir`` also avoids one ``stat`` per file.
+    """
+    try:
+        mtime_ns = os.stat(input_dir).st_mtime_ns
+    except OSError:
+        return []
+    cached = _video_listing.get(input_dir)
+    if cached is not None and cached[0] == mtime_ns:
+        return list(cached[1])
+    with os.scandir(input_dir) as entries:
+        files = [entry.name for entry in entries if entry.is_file()]
+    files = sorted(folder_paths.filter_files_content_types(files, ["video"]))
+    _video_listing[input_dir] = (mtime_ns, files)
+    return list(files)
+
+
 class LoadVideoFramesNode:
     """
     Load a video file from the input folder or upload.
@@ -14,13 +38,11 @@ class LoadVideoFramesNode:
     
     @classmethod
     def INPUT_TYPES(cls):
-        input_dir = folder_paths.get_input_directory()
-        files = [f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))]
-        files = folder_paths.filter_files_content_types(files, ["video"])
+        files = list_input_videos(folder_paths.get_input_directory())
         
         return {
             "required": {
-                "video": (sorted(files), {"video_upload": True}),
+                "video": (files, {"video_upload": True}),
             }
         }
     
@@ -3,6 +3,8 @@ import uuid
 import folder_paths
 import requests
 
+from ..common import open_download, read_download
+
 class PreviewVideoURLNode:
     """
     Bria Preview Video URL Node
@@ -62,8 +64,7 @@ class PreviewVideoURLNode:
         
         # Download video from URL
         try:
-            response = requests.get(video_url, stream=True, timeout=60)
-            response.raise_for_status()
+            response = open_download(video_url)
             
             # Determine file extension from URL or Content-Type
             content_type = response.headers.get('Content-Type', '')
@@ -77,12 +78,9 @@ class PreviewVideoURLNode:
             filepath = os.path.join(full_output_folder, filename)
   
             
-            # Save video to temp directory
+            # Stream video to temp directory
             print(f"Saving video to: {filepath}")
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            read_download(response, path=filepath)
             
             file_size = os.path.getsize(filepath)
             print(f"Video downloaded successfully: {filename} ({file_size / (1024*1024):.2f} MB)")
@@ -1,15 +1,14 @@
-import os
 import uuid
-import requests
 from ..common import (
-    bria_json_headers,
+    async_node,
     normalize_images_input,
-    poll_status_until_completed,
-    upload_pil_image_to_temp
+    upload_pil_image_to_temp,
 )
-from .video_utils import upload_video_to_s3
+from ..utils.reference_store import image_digest
+from .video_utils import run_video_job
 
 
+@async_node
 class ReplaceVideoBackgroundNode():
     """
     Composites a new background (image or video URL, or an IMAGE from another node) behind the
@@ -62,8 +61,8 @@ class ReplaceVideoBackgroundNode():
         self.api_url = "https://engine.prod.bria-api.com/v2/video/edit/replace_background"
 
     @staticmethod
-    def _background_image_to_temp_url(background_image, api_key):
-        """First image only; upload to temp bucket (format from file_name extension; .png if none)."""
+    def _background_pil(background_image):
+        """First image only, as PIL; ``None`` when no background image is connected."""
         if background_image is None:
             return None
         try:
@@ -72,8 +71,7 @@ class ReplaceVideoBackgroundNode():
             raise Exception(f"Invalid background_image: {e}") from e
         if not pil_images:
             raise Exception("background_image produced no images.")
-        file_name = f"{uuid.uuid4()}_background"
-        return upload_pil_image_to_temp(pil_images[0], api_key, file_name=file_name)
+        return pil_images[0]
 
     def execute(
         self,
@@ -90,11 +88,18 @@ class ReplaceVideoBackgroundNode():
         if not video_url or not str(video_url).strip():
             raise Exception("video_url is required: provide a local path or a publicly accessible video URL.")
 
-        bg_from_image = self._background_image_to_temp_url(background_image, api_key)
+        bg_pil = self._background_pil(background_image)
         bg_from_url = str(background_url).strip() if background_url else ""
 
-        if bg_from_image:
-            bg = bg_from_image
+        field_keys = {}
+        if bg_pil is not None:
+            # Uploaded to the temp bucket (format from file_name extension; .png if none) only when
+            # the job is submitted; the image's pixels identify it in the job journal.
+            def bg():
+                file_name = f"{uuid.uuid4()}_background"
+                return upload_pil_image_to_temp(bg_pil, api_key, file_name=file_name)
+
+            field_keys["background_url"] = image_digest(bg_pil)
         elif bg_from_url:
             bg = bg_from_url
         else:
@@ -103,50 +108,17 @@ class ReplaceVideoBackgroundNode():
                 "or a non-empty background_url (HTTPS image or video URL)."
             )
 
-        if os.path.exists(video_url):
-            filename = f"{str(uuid.uuid4())}_{os.path.basename(video_url)}"
-            input_video_url = upload_video_to_s3(video_url, filename, api_key)
-            if not input_video_url or not (
-                input_video_url.startswith("http://") or input_video_url.startswith("https://")
-            ):
-                raise Exception(f"Failed to upload video to S3. Got: {input_video_url}")
-        else:
-            input_video_url = video_url.strip()
-
         try:
             print("Calling Bria API for video replace background...")
-            payload = {
-                "video": input_video_url,
+            final_response = run_video_job(self.api_url, api_key, video_url, {
                 "background_url": bg,
                 "output_container_and_codec": output_container_and_codec,
                 "preserve_audio": preserve_audio,
-            }
-
-            headers = bria_json_headers(api_key)
-
-            response = requests.post(self.api_url, json=payload, headers=headers)
-
-            if response.status_code == 200 or response.status_code == 202:
-                print("Initial video replace-background request accepted, polling for completion...")
-                response_dict = response.json()
-
-                status_url = response_dict.get("status_url")
-                request_id = response_dict.get("request_id")
-
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-
-                final_response = poll_status_until_completed(
-                    status_url, api_key, timeout=3600, check_interval=5
-                )
-
-                result_video_url = final_response["result"]["video_url"]
+            }, field_keys=field_keys)
 
-                print(f"Video processing completed. Result URL: {result_video_url}")
-                return (result_video_url,)
+            result_video_url = final_response["result"]["video_url"]
 
-            raise Exception(f"Error: API request failed with status code {response.status_code} {response.text}")
+            print(f"Video processing completed. Result URL: {result_video_url}")
+            return (result_video_url,)
         except Exception as e:
             raise Exception(f"{e}")
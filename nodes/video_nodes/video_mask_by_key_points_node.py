@@ -1,11 +1,8 @@
-import os
-import uuid
-import requests
-import folder_paths
-from ..common import bria_json_headers, poll_status_until_completed
-from .video_utils import upload_video_to_s3
+from ..common import async_node
+from .video_utils import run_video_job
 import json
 
+@async_node
 class VideoMaskByKeyPointsNode():
     """
     Generate a video mask using key points with the Bria API.
@@ -63,65 +60,20 @@ class VideoMaskByKeyPointsNode():
         except json.JSONDecodeError as e:
             raise Exception(f"Invalid JSON format for key_points: {e}")
 
-        video_path = None
-        
-        if video_url and video_url.strip() != "":
-            if os.path.exists(video_url):
-                filename = f"{ str(uuid.uuid4())}_{os.path.basename(video_url)}"
-                input_video_url = upload_video_to_s3(video_url, filename, api_key)
-                
-                if not input_video_url or not (input_video_url.startswith('http://') or input_video_url.startswith('https://')):
-                    raise Exception(f"Failed to upload video to S3. Got: {input_video_url}")
-                
-                
-                if video_url.startswith(folder_paths.get_temp_directory()):
-                    video_path = None
-            else:
-                input_video_url = video_url
-        
         try:
-            
             print("Step 3: Calling Bria API for video mask generation by key points...")
-            payload = {
-                "video": input_video_url,
+            final_response = run_video_job(self.api_url, api_key, video_url, {
                 "key_points": key_points_array,
                 "output_container_and_codec": output_container_and_codec,
-                "preserve_audio": preserve_audio
-            }
+                "preserve_audio": preserve_audio,
+            })
 
-            headers = bria_json_headers(api_key)
+            result_mask_url = final_response['result']['mask_url']
 
-            response = requests.post(self.api_url, json=payload, headers=headers)
-            
-            if response.status_code == 200 or response.status_code == 202:
-                print('Initial Video Mask by Key Points request successful, polling for completion...')
-                response_dict = response.json()
+            print(f"Video mask processing completed. Result URL: {result_mask_url}")
+            print(f"Video mask generation complete! Use Preview Video URL node to view the result.")
 
-                status_url = response_dict.get('status_url')
-                request_id = response_dict.get('request_id')
-                
-                if not status_url:
-                    raise Exception("No status_url returned from API")
-                
-                print(f"Request ID: {request_id}, Status URL: {status_url}")
-                
-                final_response = poll_status_until_completed(status_url, api_key, timeout=3600, check_interval=5)
-                
-                result_mask_url = final_response['result']['mask_url']
-                
-                print(f"Video mask processing completed. Result URL: {result_mask_url}")
-                print(f"Video mask generation complete! Use Preview Video URL node to view the result.")
-                
-                return (result_mask_url,)
-            else:
-                raise Exception(f"Error: API request failed with status code {response.status_code} {response.text}")
+            return (result_mask_url,)
 
         except Exception as e:
             raise Exception(f"{e}")
-        finally:
-            if video_path:
-                try:
-                    if os.path.exists(video_path):
-                        os.unlink(video_path)
-                except:
-                    pass
\ No newline at end of file
@@ -1,7 +1,85 @@
 import os
-import requests
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from ..common import BRIA_COMFYUI_USER_AGENT
+from ..common import (
+    BRIA_COMFYUI_USER_AGENT,
+    VIDEO_POLLING_POLICY,
+    FileUploadStream,
+    bria_cache_dir,
+    http_post,
+    http_put,
+    run_journaled_job,
+    span,
+    upload_progress,
+)
+from ..utils.reference_store import ReferenceStore, file_digest
+
+
+# Videos are streamed from disk instead of read into memory. Above ``multipart_mb`` the presigned
+# URL API is asked for a multipart upload; if it offers one (``upload_id``, ``part_urls`` and
+# ``complete_url`` in its answer) the parts are uploaded in parallel, otherwise the file goes up
+# in a single streamed PUT.
+_upload_settings = {
+    "multipart_mb": float(os.environ.get("BRIA_VIDEO_MULTIPART_MB", "").strip() or 256),
+    "part_mb": float(os.environ.get("BRIA_VIDEO_UPLOAD_PART_MB", "").strip() or 64),
+    "workers": int(os.environ.get("BRIA_VIDEO_UPLOAD_WORKERS", "").strip() or 4),
+}
+
+
+def configure_video_uploads(multipart_mb=None, part_mb=None, workers=None):
+    """Update the multipart threshold (0 disables multipart), part size and parallel part uploads."""
+    if multipart_mb is not None:
+        _upload_settings["multipart_mb"] = float(multipart_mb)
+    if part_mb is not None:
+        _upload_settings["part_mb"] = float(part_mb)
+    if workers is not None:
+        _upload_settings["workers"] = max(1, int(workers))
+
+
+def _request_presigned_url(api_url, payload, headers):
+    response = http_post(api_url, json=payload, headers=headers)
+    if response.status_code != 200:
+        raise Exception(f"Failed to get presigned URL: {response.status_code} {response.text}")
+    return response.json()
+
+
+def _upload_single(video_path, upload_url, content_type, progress):
+    with FileUploadStream(video_path, progress=progress) as body:
+        with span("upload", endpoint=upload_url.split("?")[0], bytes=len(body)):
+            upload_response = http_put(upload_url, data=body, headers={"Content-Type": content_type})
+    if upload_response.status_code not in [200, 204]:
+        raise Exception(f"Failed to upload video to S3: {upload_response.status_code}")
+
+
+def _upload_multipart(video_path, size, response_data, headers, progress):
+    part_urls = response_data["part_urls"]
+    part_size = int(response_data.get("part_size") or _upload_settings["part_mb"] * 1024 * 1024)
+    if len(part_urls) != -(-size // part_size):
+        raise Exception(f"Got {len(part_urls)} part URLs for {size} bytes in parts of {part_size}")
+
+    def put_part(number, url):
+        offset = (number - 1) * part_size
+        with FileUploadStream(video_path, offset, min(part_size, size - offset), progress) as body:
+            with span("upload", endpoint=url.split("?")[0], part=number, bytes=len(body)):
+                response = http_put(url, data=body)
+        if response.status_code not in [200, 204]:
+            raise Exception(f"Failed to upload part {number} to S3: {response.status_code}")
+        return {"part_number": number, "etag": response.headers.get("ETag", "").strip('"')}
+
+    print(f"Uploading {len(part_urls)} parts of {part_size // (1024 * 1024)} MB")
+    workers = min(_upload_settings["workers"], len(part_urls))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bria-upload") as pool:
+        parts = list(pool.map(put_part, range(1, len(part_urls) + 1), part_urls))
+
+    complete_response = http_post(
+        response_data["complete_url"],
+        json={"upload_id": response_data["upload_id"], "parts": parts},
+        headers=headers,
+    )
+    if complete_response.status_code not in [200, 204]:
+        raise Exception(f"Failed to complete multipart upload: {complete_response.status_code} {complete_response.text}")
 
 
 def upload_video_to_s3(video_path, filename, api_token):
@@ -28,40 +106,41 @@ def upload_video_to_s3(video_path, filename, api_token):
         "file_name": filename,
         "content_type":content_type
     }
+    size = os.path.getsize(video_path)
+    multipart_bytes = _upload_settings["multipart_mb"] * 1024 * 1024
     
     print(f"Requesting presigned URL for: {filename}")
     
     try:
-        response = requests.post(api_url, json=payload, headers=headers)
-        
-        if response.status_code != 200:
-            raise Exception(f"Failed to get presigned URL: {response.status_code} {response.text}")
-        
-        response_data = response.json()
+        response_data = None
+        if 0 < multipart_bytes <= size:
+            part_size = int(_upload_settings["part_mb"] * 1024 * 1024)
+            try:
+                response_data = _request_presigned_url(
+                    api_url, {**payload, "multipart": True, "file_size": size, "part_size": part_size}, headers
+                )
+            except Exception as e:
+                print(f"Multipart upload not available ({e}), uploading in one request")
+        if response_data is None:
+            response_data = _request_presigned_url(api_url, payload, headers)
+
         video_url = response_data.get("video_url")
+        multipart = bool(response_data.get("upload_id") and response_data.get("part_urls") and response_data.get("complete_url"))
         upload_url = response_data.get("upload_url")
         
-        if not video_url or not upload_url:
+        if not video_url or not (upload_url or multipart):
             raise Exception(f"Invalid response from presigned URL API: {response_data}")
         
         print(f"Received presigned URL")
         print(f"Video URL: {video_url}")
         
-        # Step 2: Upload video to presigned URL
-        print(f"Uploading video to S3...")
-        
-        with open(video_path, 'rb') as f:
-            video_data = f.read()
-        
-        # Determine content type based on file extension
-        upload_headers = {
-            "Content-Type": content_type
-        }
-
-        upload_response = requests.put(upload_url, data=video_data, headers=upload_headers)
-        
-        if upload_response.status_code not in [200, 204]:
-            raise Exception(f"Failed to upload video to S3: {upload_response.status_code}")
+        # Step 2: Stream the video to the presigned URL(s)
+        print(f"Uploading video to S3 ({size / (1024 * 1024):.1f} MB)...")
+        progress = upload_progress(size)
+        if multipart:
+            _upload_multipart(video_path, size, response_data, headers, progress)
+        else:
+            _upload_single(video_path, upload_url, content_type, progress)
         
         print(f"Video uploaded successfully to S3")
         
@@ -70,3 +149,101 @@ def upload_video_to_s3(video_path, filename, api_token):
     except Exception as e:
         raise Exception(f"Error uploading video to S3: {str(e)}")
 
+
+def video_source_identity(video_url):
+    """Stable identity of a video input: the file's path, size and mtime, or the URL itself."""
+    video_url = str(video_url).strip()
+    if os.path.exists(video_url):
+        stat = os.stat(video_url)
+        return {"path": os.path.abspath(video_url), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return video_url
+
+
+# Temp URLs of uploaded local videos, keyed by the file's fingerprint and shared by all video
+# nodes, so a clip used by several nodes or runs is uploaded once per TTL.
+_video_upload_cache_settings = {
+    "enabled": os.environ.get("BRIA_VIDEO_UPLOAD_CACHE", "").strip().lower() not in ("0", "false", "no", "off"),
+    "ttl_minutes": float(os.environ.get("BRIA_VIDEO_UPLOAD_TTL_MINUTES", "").strip() or 60),
+}
+_video_upload_store = None
+_video_upload_store_lock = threading.Lock()
+
+
+def configure_video_upload_cache(enabled=None, ttl_minutes=None):
+    """Update the video upload cache settings; the store is reopened with them on next use."""
+    global _video_upload_store
+    with _video_upload_store_lock:
+        if enabled is not None:
+            _video_upload_cache_settings["enabled"] = bool(enabled)
+        if ttl_minutes is not None:
+            _video_upload_cache_settings["ttl_minutes"] = float(ttl_minutes)
+        _video_upload_store = None
+
+
+def get_video_upload_store():
+    """Return the shared store of uploaded video URLs (persisted under ``bria_cache_dir()``)."""
+    global _video_upload_store
+    with _video_upload_store_lock:
+        if _video_upload_store is None:
+            _video_upload_store = ReferenceStore(
+                ttl=_video_upload_cache_settings["ttl_minutes"] * 60,
+                path=os.path.join(bria_cache_dir(), "video_uploads.json"),
+            )
+        return _video_upload_store
+
+
+def video_input_to_url(video_url, api_token):
+    """
+    Upload a local video and return its temp URL; URLs are passed through unchanged.
+
+    An unchanged file that was uploaded less than the cache TTL ago is not uploaded again.
+    """
+    video_url = str(video_url).strip()
+    if not os.path.exists(video_url):
+        return video_url
+
+    uploaded = []
+
+    def upload():
+        uploaded.append(video_url)
+        filename = f"{str(uuid.uuid4())}_{os.path.basename(video_url)}"
+        input_video_url = upload_video_to_s3(video_url, filename, api_token)
+        if not input_video_url or not (input_video_url.startswith('http://') or input_video_url.startswith('https://')):
+            raise Exception(f"Failed to upload video to S3. Got: {input_video_url}")
+        return input_video_url
+
+    if not _video_upload_cache_settings["enabled"]:
+        return upload()
+    url = get_video_upload_store().url_for_key(file_digest(video_url), upload)
+    if not uploaded:
+        print(f"Reusing uploaded video {url}")
+    return url
+
+
+def run_video_job(api_url, api_token, video_url, fields, field_keys=None):
+    """
+    Submit a video job for ``video_url`` (local path or URL) plus payload ``fields`` and wait for it.
+
+    The job is journaled under the video's identity and the fields, so if ComfyUI restarts while it
+    runs, executing the node again with the same inputs resumes the job without uploading the
+    video again. A field value may be a zero-argument callable that is only evaluated when a job is
+    actually submitted (e.g. an upload); ``field_keys`` then gives its stable identity.
+    """
+    if not video_url or not str(video_url).strip():
+        raise Exception("video_url is required: provide a local path or a publicly accessible video URL.")
+
+    inputs = {"video": video_source_identity(video_url)}
+    for name, value in fields.items():
+        inputs[name] = (field_keys or {}).get(name, value if not callable(value) else None)
+
+    def make_payload():
+        payload = {"video": video_input_to_url(video_url, api_token)}
+        for name, value in fields.items():
+            payload[name] = value() if callable(value) else value
+        return payload
+
+    final_response = run_journaled_job(
+        api_url, inputs, make_payload, api_token, timeout=3600, policy=VIDEO_POLLING_POLICY
+    )
+    print(f"Request ID: {final_response.get('request_id')}")
+    return final_response
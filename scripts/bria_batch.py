@@ -0,0 +1,310 @@
+"""
+Run Bria nodes over a manifest of images from the command line, without the ComfyUI server.
+
+Each manifest row is pushed through a pipeline of nodes (``--pipeline``, node names as in
+``NODE_CLASS_MAPPINGS``); the first IMAGE output of a step feeds the first IMAGE input of the
+next. Rows run concurrently, finished rows are appended to a checkpoint file so an interrupted
+run resumes where it stopped, and the final images are written to the output directory.
+
+The manifest is a CSV file or a JSONL file with one object per row:
+
+* ``image`` (required): local path (relative to the manifest) or http(s) URL of the input image.
+* ``id``: name of the output files; defaults to the image file name without extension.
+* any other column sets a node input: ``prompt`` applies to every step that has a ``prompt``
+  input, ``ReplaceBgNode.prompt`` only to that step. ``--set`` gives defaults for all rows.
+
+The node package is imported the way ComfyUI imports custom nodes, so ComfyUI itself must be
+importable (``--comfyui /path/to/ComfyUI`` or ``COMFYUI_PATH``) for ``folder_paths``.
+
+Example:
+    python scripts/bria_batch.py catalog.csv --out results --comfyui ~/ComfyUI \\
+        --pipeline RmbgNode,ReplaceBgNode,ImageEnhanceNode --set ReplaceBgNode.prompt="on a marble table"
+"""
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import torch
+from PIL import Image
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY_INPUTS = ("api_key", "api_token")
+
+
+def load_package(comfyui_path):
+    """Import the repository as a custom-node package and return the package module."""
+    if comfyui_path:
+        sys.path.insert(0, comfyui_path)
+    try:
+        import folder_paths  # noqa: F401
+    except ImportError:
+        sys.exit("ComfyUI is not importable: pass --comfyui /path/to/ComfyUI or set COMFYUI_PATH.")
+    spec = importlib.util.spec_from_file_location(
+        "comfyui_bria_api", os.path.join(REPO_ROOT, "__init__.py"), submodule_search_locations=[REPO_ROOT]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["comfyui_bria_api"] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+def read_manifest(path):
+    """Rows of a CSV or JSONL manifest as dicts, each with a unique ``id``."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    seen = set()
+    for number, row in enumerate(rows, 1):
+        if not row.get("image"):
+            raise ValueError(f"{path}: row {number} has no 'image'")
+        row_id = str(row.get("id") or os.path.splitext(os.path.basename(row["image"].split("?")[0]))[0])
+        if row_id in seen:
+            row_id = f"{row_id}_{number}"
+        seen.add(row_id)
+        row["id"] = row_id
+    return rows
+
+
+def _coerce(kind, value):
+    """Convert a manifest value (usually a string) to what a node input of type ``kind`` expects."""
+    if not isinstance(value, str):
+        return value
+    if kind == "INT":
+        return int(value)
+    if kind == "FLOAT":
+        return float(value)
+    if kind == "BOOLEAN":
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return value
+
+
+class Step:
+    """One node of the pipeline: its class, input specs and widget defaults."""
+
+    def __init__(self, name, node_cls):
+        self.name = name
+        self.node_cls = node_cls
+        input_types = node_cls.INPUT_TYPES()
+        self.required = input_types.get("required", {})
+        self.specs = {**self.required, **input_types.get("optional", {})}
+        self.image_input = next((name for name, spec in self.specs.items() if spec[0] == "IMAGE"), None)
+        self.image_output = next(
+            (i for i, kind in enumerate(node_cls.RETURN_TYPES) if kind == "IMAGE"), None
+        )
+        if self.image_input is None or self.image_output is None:
+            raise ValueError(f"{name} does not take and return an IMAGE, so it cannot be a pipeline step")
+
+    def inputs(self, image, api_key, params):
+        """Keyword arguments for ``execute``: widget defaults, then unscoped, then step-scoped parameters."""
+        kwargs = {}
+        for name, spec in self.specs.items():
+            kind, options = spec[0], (spec[1] if len(spec) > 1 else {})
+            if isinstance(kind, (list, tuple)):
+                kwargs[name] = options.get("default", kind[0] if kind else None)
+            elif kind != "IMAGE" and "default" in options:
+                kwargs[name] = options["default"]
+        for name, value in params.items():
+            step, _, key = name.rpartition(".")
+            if step in ("", self.name) and key in self.specs:
+                kwargs[key] = _coerce(self.specs[key][0], value)
+        for name in API_KEY_INPUTS:
+            if name in self.specs:
+                kwargs[name] = api_key
+        kwargs[self.image_input] = image
+
+        missing = [name for name in self.required if name not in kwargs]
+        if missing:
+            raise ValueError(f"{self.name} needs a value for {', '.join(missing)}")
+        return kwargs
+
+
+def _load_image(source, base_dir, download):
+    if source.startswith(("http://", "https://")):
+        image = Image.open(io.BytesIO(download(source, progress=False)))
+    else:
+        image = Image.open(os.path.join(base_dir, source))
+    array = np.asarray(image.convert("RGB"), dtype=np.float32) / 255.0
+    return torch.from_numpy(array)[None]
+
+
+def _image_list(value):
+    """Flatten an IMAGE output (a (B,H,W,C) tensor or a list of them) into (H,W,C) tensors."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [image for item in value for image in _image_list(item)]
+    return [value] if value.ndim == 3 else list(value)
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished rows; rows recorded as ``ok`` are skipped on resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self.done[entry["id"]] = entry
+
+    def is_done(self, row_id):
+        return self.done.get(row_id, {}).get("status") == "ok"
+
+    def record(self, entry):
+        with self._lock:
+            self.done[entry["id"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+
+def run_row(row, steps, api_key, params, args, codec, download):
+    started = time.perf_counter()
+    entry = {"id": row["id"], "image": row["image"], "steps": {}}
+    row_params = {**params, **{k: v for k, v in row.items() if k not in ("id", "image") and v not in (None, "")}}
+    try:
+        value = _load_image(row["image"], args.base_dir, download)
+        outputs = ()
+        for step in steps:
+            step_started = time.perf_counter()
+            outputs = step.node_cls().execute(**step.inputs(value, api_key, row_params))
+            entry["steps"][step.name] = time.perf_counter() - step_started
+            value = outputs[step.image_output]
+
+        images = _image_list(value)
+        files = []
+        for i, image in enumerate(images):
+            name = f"{row['id']}.png" if len(images) == 1 else f"{row['id']}_{i}.png"
+            codec.array_to_pil(codec.tensor_to_uint8(image)).save(os.path.join(args.out, name))
+            files.append(name)
+        entry["files"] = files
+        entry["outputs"] = {
+            name: output
+            for kind, name, output in zip(steps[-1].node_cls.RETURN_TYPES, steps[-1].node_cls.RETURN_NAMES, outputs)
+            if kind != "IMAGE"
+        }
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["status"] = "failed"
+        entry["error"] = str(e)
+    entry["seconds"] = time.perf_counter() - started
+    return entry
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def print_summary(results, skipped, wall, steps):
+    ok = [entry for entry in results if entry["status"] == "ok"]
+    failed = [entry for entry in results if entry["status"] != "ok"]
+    print()
+    print(f"Rows: {len(results)} processed, {len(ok)} ok, {len(failed)} failed, {skipped} skipped (already done)")
+    if results:
+        latencies = [entry["seconds"] for entry in results]
+        print(
+            f"Wall time {wall:.1f}s, throughput {len(ok) / wall:.2f} rows/s "
+            f"({len(ok) * 3600 / wall:.0f} rows/h), row latency p50={statistics.median(latencies):.1f}s "
+            f"p95={_percentile(latencies, 0.95):.1f}s"
+        )
+    for step in steps:
+        seconds = [entry["steps"][step.name] for entry in ok if step.name in entry["steps"]]
+        if seconds:
+            print(f"  {step.name:<28} mean {statistics.mean(seconds):6.2f}s  p95 {_percentile(seconds, 0.95):6.2f}s")
+    for entry in failed[:10]:
+        print(f"  failed {entry['id']}: {entry['error']}")
+    if len(failed) > 10:
+        print(f"  ... and {len(failed) - 10} more, see the checkpoint file")
+
+
+def run(args):
+    package = load_package(args.comfyui or os.environ.get("COMFYUI_PATH"))
+    common = sys.modules["comfyui_bria_api.nodes.common"]
+    codec = sys.modules["comfyui_bria_api.nodes.utils.image_codec"]
+
+    api_key = args.api_key or os.environ.get("BRIA_API_KEY", "")
+    if not api_key:
+        sys.exit("No API key: pass --api-key or set BRIA_API_KEY.")
+    # Nodes substitute a placeholder (e.g. the input image) for a failed image; here that must fail the row.
+    common.configure_batch(strict=True)
+
+    steps = []
+    for name in args.pipeline.split(","):
+        name = name.strip()
+        if name not in package.NODE_CLASS_MAPPINGS:
+            sys.exit(f"Unknown node '{name}'")
+        steps.append(Step(name, package.NODE_CLASS_MAPPINGS[name]))
+
+    params = {}
+    for assignment in args.set or []:
+        key, _, value = assignment.partition("=")
+        params[key.strip()] = value
+
+    rows = read_manifest(args.manifest)
+    args.base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    os.makedirs(args.out, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.out, "checkpoint.jsonl"))
+    pending = [row for row in rows if not checkpoint.is_done(row["id"])]
+    skipped = len(rows) - len(pending)
+    print(f"{len(pending)} of {len(rows)} rows to run through {' -> '.join(step.name for step in steps)}")
+
+    results = []
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency))
+    futures = [executor.submit(run_row, row, steps, api_key, params, args, codec, common.download) for row in pending]
+
+    def finish(future):
+        entry = future.result()
+        checkpoint.record(entry)
+        results.append(entry)
+        state = entry["status"] if entry["status"] == "ok" else f"failed: {entry['error']}"
+        print(f"[{len(results)}/{len(pending)}] {entry['id']} {state} ({entry['seconds']:.1f}s)", flush=True)
+
+    try:
+        for future in as_completed(futures):
+            finish(future)
+    except KeyboardInterrupt:
+        print("Interrupted: finishing the rows in flight (Ctrl-C again to abort); the rest resume on the next run")
+        recorded = {entry["id"] for entry in results}
+        running = [future for future in futures if not future.cancel()]
+        for row, future in zip(pending, futures):
+            if future in running and row["id"] not in recorded:
+                finish(future)
+    finally:
+        executor.shutdown(wait=False)
+    print_summary(results, skipped, time.perf_counter() - started, steps)
+    return 1 if any(entry["status"] != "ok" for entry in results) else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Bria nodes over a CSV/JSONL manifest of images")
+    parser.add_argument("manifest", help="CSV or JSONL file with an 'image' column")
+    parser.add_argument("--out", required=True, help="Directory for the output images and the checkpoint")
+    parser.add_argument("--pipeline", default="RmbgNode", help="Comma-separated node names, run in order per row")
+    parser.add_argument("--set", action="append", metavar="[NODE.]INPUT=VALUE", help="Node input for all rows")
+    parser.add_argument("--concurrency", type=int, default=8, help="Rows processed at the same time")
+    parser.add_argument("--api-key", help="Bria API key (defaults to $BRIA_API_KEY)")
+    parser.add_argument("--checkpoint", help="Checkpoint file (defaults to <out>/checkpoint.jsonl)")
+    parser.add_argument("--comfyui", help="Path to a ComfyUI checkout (defaults to $COMFYUI_PATH)")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()